@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Compares the cost of parsing job colors with the lookup table to the
+string matching colorToJenkinsState did before, over a number of colors
+distributed like the ones of a large jenkins master.
+
+Usage: python -m jenkinstray.bench.benchcolors [numCalls]
+"""
+
+from jenkinstray.bench.fixtures import jobColors
+from jenkinstray.jenkinsjob import JenkinsState, parseColor, COLOR_STATES, UNKNOWN_COLOR_STATE
+import sys
+import timeit
+
+def matchColor(colorstr):
+    """colorToJenkinsState as it used to be, for reference"""
+    assert(len(filter(lambda color: color in colorstr, ["blue", "yellow", "red", "disabled", "notbuilt", "aborted"])) == 1)
+    if colorstr.startswith("blue"):
+        return JenkinsState.Successful
+    elif colorstr.startswith("yellow"):
+        return JenkinsState.Unstable
+    elif colorstr.startswith("disabled") or colorstr.startswith("notbuilt") or colorstr.startswith("aborted"):
+        return JenkinsState.Disabled
+    elif colorstr.startswith("red"):
+        return JenkinsState.Failed
+    else:
+        return JenkinsState.Unknown
+
+def inlineLookup(colors):
+    colorStates = COLOR_STATES
+    for color in colors:
+        colorStates.get(color, UNKNOWN_COLOR_STATE)
+
+def run(numCalls):
+    colors = jobColors(numCalls)
+    candidates = [("string matching", lambda: map(matchColor, colors)),
+                  ("parseColor", lambda: map(parseColor, colors)),
+                  ("inline lookup", lambda: inlineLookup(colors))]
+    print "%-16s %12s %12s" % ("", "%d calls" % numCalls, "per call")
+    baseline = None
+    for (name, parse) in candidates:
+        elapsed = min(timeit.repeat(parse, number=1, repeat=5))
+        baseline = baseline or elapsed
+        print "%-16s %10.2fms %10.3fus %6.1fx" % (name, elapsed * 1000, elapsed * 1000000 / numCalls, baseline / elapsed)
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Polls a simulated fleet of jenkins masters (see fleet.py) for a number of
+rounds and reports throughput, latency percentiles, object growth and peak
+memory. By default every round runs through the tray: the refresh engine,
+refreshMonitors and JenkinsTray.updateUiFromMonitors, with Qt on the
+offscreen platform (use xvfb-run with Qt builds that lack it). With --no-ui
+only the monitors are refreshed.
+
+Each run is appended as a json line to the results file together with the
+current git revision, and compared to the last run with the same parameters.
+
+Usage: python -m jenkinstray.bench.benchfleet [--servers N] [--jobs M] [--latency S]
+           [--churn F] [--rounds R] [--workers W] [--no-ui] [--results FILE]
+"""
+
+from jenkinstray.bench.fleet import SimulatedFleet
+from jenkinstray.jenkinsmonitor import JenkinsMonitor
+from jenkinstray.jenkinsjob import JenkinsJob, JenkinsState
+from jenkinstray.refreshengine import RefreshEngine
+from jenkinstray.httptransport import sharedTransport
+from jenkinstray.instrumentation import instrumentation, RollingStats
+from jenkinstray.gui import mem
+import argparse
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+RESULTS_FILENAME = "benchfleet.jsonl"
+# metrics that are compared between runs, lower is better for all of them
+COMPARED_METRICS = ["initialMs", "cycleP50Ms", "cycleP90Ms", "cycleP99Ms", "objectGrowth", "peakMemoryMB"]
+
+class MonitorDriver(object):
+    """
+    Refreshes the monitors of the fleet without any ui.
+    """
+    def __init__(self, settings, workers):
+        self.refreshEngine = RefreshEngine(workers)
+        self.monitors = []
+        for server in settings["servers"]:
+            monitor = JenkinsMonitor(server["url"])
+            for name in server["monitored"]:
+                monitor.jobs.append(JenkinsJob(name, True, "Unknown", JenkinsState.Unknown))
+            self.monitors.append(monitor)
+
+    def cycle(self):
+        return self.refreshEngine.refresh(self.monitors)
+
+class TrayDriver(object):
+    """
+    Refreshes the monitors of a JenkinsTray configured for the fleet and
+    updates its menu and icon like the background refresh does.
+    """
+    def __init__(self, settings, workers):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        # keep the configuration of the user out of the benchmark
+        os.environ["XDG_CONFIG_HOME"] = tempfile.mkdtemp()
+        from jenkinstray.initsip import setupSipApi
+        setupSipApi()
+        from PyQt4 import QtGui
+        from jenkinstray.gui.jenkinstray import JenkinsTray, refreshMonitors
+        try:
+            from jenkinstray import rcc_jenkinstray
+        except ImportError:
+            pass
+        self.refreshMonitors = refreshMonitors
+        self.app = QtGui.QApplication(sys.argv)
+        self.tray = JenkinsTray(self.app)
+        self.tray.refreshEngine = RefreshEngine(workers)
+        self.tray.updateFromSettings(settings)
+        self.tray.timer.stop()
+
+    def cycle(self):
+        results = self.tray.refreshEngine.refresh(self.tray.monitors)
+        self.refreshMonitors(self.tray, results)
+        self.app.processEvents()
+        self.tray.timer.stop()
+        return results
+
+def maxRss():
+    # kilobytes on linux, bytes on mac os
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss * 1024 if sys.platform.startswith("linux") else maxrss
+
+def gitRevision():
+    try:
+        with open(os.devnull, "w") as devnull:
+            return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(options):
+    params = {"servers": options.servers, "jobs": options.jobs, "latency": options.latency,
+              "churn": options.churn, "rounds": options.rounds, "workers": options.workers, "ui": options.ui}
+    with SimulatedFleet(options.servers, options.jobs, options.latency, options.churn) as fleet:
+        settings = fleet.settings()
+        driver = TrayDriver(settings, options.workers) if options.ui else MonitorDriver(settings, options.workers)
+        start = time.time()
+        driver.cycle()
+        initial = time.time() - start
+
+        cycles = RollingStats(options.rounds)
+        transitions = 0
+        errors = 0
+        peakMemory = mem.memory()
+        gc.collect()
+        objectsBefore = len(gc.get_objects())
+        histogramBefore = mem.gc_histogram() if options.verbose else None
+        measured = time.time()
+        for _ in range(options.rounds):
+            start = time.time()
+            results = driver.cycle()
+            cycles.add(time.time() - start)
+            for (monitor, changes, error) in results:
+                if error is not None:
+                    errors += 1
+                elif changes:
+                    transitions += len(changes.transitions)
+            peakMemory = max(peakMemory, mem.memory())
+        measured = time.time() - measured
+        gc.collect()
+        objectGrowth = len(gc.get_objects()) - objectsBefore
+        if histogramBefore is not None:
+            mem.diff_hists(histogramBefore, mem.gc_histogram())
+        # lets the masters finish the kept alive connections before they stop
+        sharedTransport().close()
+
+    percentiles = cycles.percentiles()
+    metrics = {"initialMs": initial * 1000,
+               "cycleP50Ms": percentiles[50] * 1000,
+               "cycleP90Ms": percentiles[90] * 1000,
+               "cycleP99Ms": percentiles[99] * 1000,
+               "jobsPerSecond": options.servers * options.jobs * options.rounds / measured,
+               "transitionsPerSecond": transitions / measured,
+               "errors": errors,
+               "objectGrowth": objectGrowth,
+               "peakMemoryMB": peakMemory,
+               "maxRssMB": maxRss() / float(1024 ** 2),
+               "phases": dict((name, dict((str(percent), seconds * 1000) for (percent, seconds) in phasePercentiles.iteritems()))
+                              for (name, phasePercentiles) in instrumentation().phasePercentiles().iteritems())}
+    result = {"revision": gitRevision(), "time": time.time(), "params": params, "metrics": metrics}
+    report(result)
+    compare(result, previousResult(options.results, params))
+    if options.results:
+        with open(options.results, "a") as results:
+            results.write(json.dumps(result, sort_keys=True) + "\n")
+    return result
+
+def report(result):
+    metrics = result["metrics"]
+    print "%(servers)d servers, %(jobs)d jobs each, %(latency)gs latency, %(churn)g churn, %(rounds)d rounds, %(workers)d workers, ui: %(ui)s" % result["params"]
+    print "initial refresh      %10.2fms" % metrics["initialMs"]
+    print "refresh cycle        %10.2fms p50 %10.2fms p90 %10.2fms p99" % (metrics["cycleP50Ms"], metrics["cycleP90Ms"], metrics["cycleP99Ms"])
+    print "throughput           %10.0f jobs/s %8.1f transitions/s" % (metrics["jobsPerSecond"], metrics["transitionsPerSecond"])
+    print "failed refreshes     %10d" % metrics["errors"]
+    print "object growth        %10d objects" % metrics["objectGrowth"]
+    print "peak memory          %10.1fMB (max rss %.1fMB)" % (metrics["peakMemoryMB"], metrics["maxRssMB"])
+    for name in sorted(metrics["phases"]):
+        phase = metrics["phases"][name]
+        print "phase %-14s %10.2fms p50 %10.2fms p90 %10.2fms p99" % (name, phase["50"], phase["90"], phase["99"])
+
+def previousResult(filename, params):
+    """
+    The last result in filename that was measured with params, None if there
+    is none.
+    """
+    previous = None
+    if filename and os.path.exists(filename):
+        with open(filename, "r") as results:
+            for line in results:
+                result = json.loads(line)
+                if result["params"] == params:
+                    previous = result
+    return previous
+
+def compare(result, previous):
+    if previous is None:
+        return
+    print "compared to %s:" % (previous["revision"] or "the previous run")
+    for name in COMPARED_METRICS:
+        (old, new) = (previous["metrics"][name], result["metrics"][name])
+        change = (new - old) * 100.0 / old if old else 0.0
+        print "  %-18s %12.2f -> %12.2f (%+.1f%%)" % (name, old, new, change)
+
+def parseArgs(args):
+    parser = argparse.ArgumentParser(description="Benchmark polling a simulated jenkins fleet")
+    parser.add_argument("--servers", type=int, default=4, help="number of simulated masters")
+    parser.add_argument("--jobs", type=int, default=1000, help="jobs per master")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds each master takes to answer")
+    parser.add_argument("--churn", type=float, default=0.01, help="fraction of jobs changing their state per poll")
+    parser.add_argument("--rounds", type=int, default=20, help="measured refresh cycles")
+    parser.add_argument("--workers", type=int, default=4, help="refresh worker threads")
+    parser.add_argument("--no-ui", dest="ui", action="store_false", help="refresh the monitors only")
+    parser.add_argument("--results", default=RESULTS_FILENAME, help="file the results are appended to, empty to not save them")
+    parser.add_argument("--verbose", action="store_true", help="print the object growth per type")
+    return parser.parse_args(args)
+
+if __name__ == "__main__":
+    run(parseArgs(sys.argv[1:]))
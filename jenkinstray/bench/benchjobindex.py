@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Measures how the cost of JenkinsMonitor._refreshFromDict scales with the
+number of jobs, for a refresh that changes one job and removes another.
+
+Usage: python -m jenkinstray.bench.benchjobindex [numJobs...]
+"""
+
+from jenkinstray.bench.fixtures import projectedDocument
+from jenkinstray.jenkinsmonitor import JenkinsMonitor
+import sys
+import timeit
+
+SERVERURL = "http://jenkins.example.com"
+
+def refreshTime(numJobs, repeat=3):
+    document = projectedDocument(SERVERURL, numJobs)
+    changed = projectedDocument(SERVERURL, numJobs)
+    changed["jobs"][0]["color"] = "red" if changed["jobs"][0]["color"] != "red" else "blue"
+    del changed["jobs"][-1]
+    def refresh():
+        monitor = JenkinsMonitor(SERVERURL)
+        monitor._refreshFromDict(document)
+        monitor._refreshFromDict(changed)
+    return min(timeit.repeat(refresh, number=1, repeat=repeat))
+
+def run(jobCounts):
+    print "%8s %12s %12s" % ("jobs", "refresh", "per job")
+    for numJobs in jobCounts:
+        elapsed = refreshTime(numJobs)
+        print "%8d %10.2fms %10.2fus" % (numJobs, elapsed * 1000, elapsed * 1000000 / (2 * numJobs))
+
+if __name__ == "__main__":
+    run(map(int, sys.argv[1:]) or [100, 1000, 10000, 50000])
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Measures the memory used by the jobs of a monitor after refreshing it from
+a job list with numJobs jobs, with mem.memory() and mem.gc_histogram(). The
+job list is decoded beforehand, so the names and urls shared with the jobs
+are not part of the result.
+
+Usage: python -m jenkinstray.bench.benchjobmemory [numJobs]
+"""
+
+from jenkinstray.bench.fixtures import projectedDocument
+from jenkinstray.jenkinsmonitor import JenkinsMonitor
+from jenkinstray.gui import mem
+import gc
+import json
+import sys
+
+SERVERURL = "http://jenkins.example.com"
+
+def run(numJobs):
+    dictobj = json.loads(json.dumps(projectedDocument(SERVERURL, numJobs)))
+    gc.collect()
+    before = mem.memory()
+    histogram = mem.gc_histogram()
+    monitor = JenkinsMonitor(SERVERURL)
+    monitor._refreshFromDict(dictobj)
+    gc.collect()
+    used = mem.memory(before)
+    print "%d jobs: %.2fMB, %.1f bytes per job" % (numJobs, used, used * 1024 ** 2 / numJobs)
+    newHistogram = mem.gc_histogram()
+    mem.diff_hists(histogram, newHistogram)
+    for (objtype, count) in newHistogram.iteritems():
+        if objtype not in histogram:
+            print "%s: %d" % (objtype, count)
+    return monitor
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 60000)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Counts the QActions JobMenu allocates per refresh and measures the time of
+an update, for a number of monitored jobs of which a few change their state
+between refreshes. Needs a display, use xvfb-run on headless machines.
+
+Usage: python -m jenkinstray.bench.benchjobmenu [numJobs] [numChanges] [numRefreshes]
+"""
+
+import sys
+import time
+import random
+from jenkinstray.initsip import setupSipApi
+setupSipApi()
+from PyQt4 import QtGui
+from jenkinstray.jenkinsjob import JenkinsState
+from jenkinstray.gui.jobmenu import JobMenu
+
+STATES = [JenkinsState.Successful, JenkinsState.Failed, JenkinsState.Unstable, JenkinsState.Disabled]
+
+def run(numJobs, numChanges, numRefreshes, numServers=2):
+    app = QtGui.QApplication(sys.argv)
+    menu = QtGui.QMenu()
+    separator = menu.addSeparator()
+    icons = dict((state, QtGui.QIcon()) for state in JenkinsState)
+    jobMenu = JobMenu(menu, separator, lambda state: icons[state], lambda serverurl, jobname: None)
+    rnd = random.Random(0)
+    jobs = [["http://jenkins%s.example.com" % (idx % numServers), "job-%05d" % idx, rnd.choice(STATES)] for idx in range(numJobs)]
+
+    start = time.time()
+    jobMenu.update(jobs)
+    print "initial: %d actions created in %.2fms" % (jobMenu.actionsCreated, (time.time() - start) * 1000)
+    for refresh in range(numRefreshes):
+        for job in rnd.sample(jobs, numChanges):
+            job[2] = rnd.choice(STATES)
+        (created, removed) = (jobMenu.actionsCreated, jobMenu.actionsRemoved)
+        start = time.time()
+        jobMenu.update(jobs)
+        app.processEvents()
+        print "refresh %d: %d actions created, %d removed in %.2fms" % (refresh + 1,
+                                                                     jobMenu.actionsCreated - created,
+                                                                     jobMenu.actionsRemoved - removed,
+                                                                     (time.time() - start) * 1000)
+
+if __name__ == "__main__":
+    args = map(int, sys.argv[1:])
+    run(*(args + [800, 10, 10][len(args):]))
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Compares matching job names against auto-monitor rules compiled into one
+expression to checking every rule on its own with fnmatch and re, over
+job names shaped like those of a master creating many branch jobs, and
+shows what applying the rules to the jobs added by a refresh costs
+compared to rescanning all jobs.
+
+Usage: python -m jenkinstray.bench.benchrules [numJobs] [numAdded]
+"""
+
+from jenkinstray.bench.fixtures import jobName
+from jenkinstray.jenkinsjob import JenkinsJob, JenkinsState
+from jenkinstray.rules import RuleSet
+import fnmatch
+import random
+import re
+import sys
+import timeit
+
+INCLUDE = ["release-*", "*-nightly", "hotfix/*", "re:^project-\\d*7-build$", "re:/PR-\\d+$", "deploy-[ps]*"]
+EXCLUDE = ["*-wip", "*/experimental-*", "re:^sandbox"]
+
+def branchNames(numJobs, seed=0):
+    rnd = random.Random(seed)
+    kinds = [lambda idx: jobName(idx),
+             lambda idx: "service-%d/PR-%d" % (idx % 97, idx),
+             lambda idx: "service-%d/feature-%d-wip" % (idx % 97, idx),
+             lambda idx: "release-%d.%d" % (idx % 13, idx),
+             lambda idx: "sandbox-%d" % idx]
+    return [rnd.choice(kinds)(idx) for idx in range(numJobs)]
+
+def ruleByRule(names):
+    """every rule checked on its own, for reference"""
+    def matches(rules, name):
+        for rule in rules:
+            if rule.startswith("re:"):
+                if re.search(rule[3:], name):
+                    return True
+            elif fnmatch.fnmatchcase(name, rule):
+                return True
+        return False
+    return [name for name in names if matches(INCLUDE, name) and not matches(EXCLUDE, name)]
+
+def run(numJobs, numAdded):
+    names = branchNames(numJobs)
+    rules = RuleSet(INCLUDE, EXCLUDE)
+    assert ruleByRule(names) == [name for name in names if rules.matches(name)]
+    jobs = [JenkinsJob(name, False, "Url", JenkinsState.Successful) for name in names]
+    added = jobs[-numAdded:]
+    def apply(jobs):
+        for job in jobs:
+            job.disableMonitoring()
+        rules.apply(jobs)
+    candidates = [("rule by rule", lambda: ruleByRule(names)),
+                  ("compiled", lambda: [name for name in names if rules.matches(name)]),
+                  ("apply to all", lambda: apply(jobs)),
+                  ("apply to added", lambda: apply(added))]
+    print "%d jobs, %d added, %d include and %d exclude rules" % (numJobs, numAdded, len(INCLUDE), len(EXCLUDE))
+    print "%-16s %12s %12s" % ("", "total", "per job")
+    baseline = None
+    for (name, candidate) in candidates:
+        elapsed = min(timeit.repeat(candidate, number=1, repeat=5))
+        count = numAdded if name == "apply to added" else numJobs
+        baseline = baseline or elapsed
+        print "%-16s %10.2fms %10.3fus %6.1fx" % (name, elapsed * 1000, elapsed * 1000000 / count, baseline / elapsed)
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50000, int(sys.argv[2]) if len(sys.argv) > 2 else 500)
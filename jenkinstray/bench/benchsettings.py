@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Compares size, save and load time of the settings file in the format that
+listed every job with its monitoring flag, written with indent=4, to the
+compact format of SettingsStore that lists the monitored job names only.
+
+Usage: python -m jenkinstray.bench.benchsettings [numJobs] [monitoredFraction] [numServers]
+"""
+
+from jenkinstray.bench.fixtures import jobName
+from jenkinstray.settingsstore import SettingsStore
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import timeit
+
+def fullSettings(numJobs, monitoredFraction, numServers):
+    rnd = random.Random(0)
+    return {"refreshInterval": 60, "notificationTimeout": 10,
+            "servers": [{"url": "http://jenkins%d.example.com" % server,
+                         "jobs": [{"name": jobName(idx), "monitored": rnd.random() < monitoredFraction}
+                                  for idx in range(numJobs / numServers)]}
+                        for server in range(numServers)]}
+
+def run(numJobs, monitoredFraction, numServers):
+    directory = tempfile.mkdtemp()
+    try:
+        settings = fullSettings(numJobs, monitoredFraction, numServers)
+        fullname = os.path.join(directory, "full.json")
+        def saveFull():
+            with open(fullname, "w") as settingsfile:
+                json.dump(settings, settingsfile, indent=4, separators=(",", ": "))
+        def loadFull():
+            with open(fullname, "r") as settingsfile:
+                json.load(settingsfile)
+        store = SettingsStore(os.path.join(directory, "compact.json"))
+        store.save(settings)
+        compact = store.settings()
+        def saveCompact():
+            store.save(compact)
+        def loadCompact():
+            SettingsStore(store.filename).settings()
+        saveFull()
+
+        print "%d jobs on %d servers, %d%% monitored" % (numJobs, numServers, monitoredFraction * 100)
+        print "%-8s %10s %12s %12s" % ("format", "size", "save", "load")
+        for (name, filename, save, load) in [("full", fullname, saveFull, loadFull),
+                                             ("compact", store.filename, saveCompact, loadCompact)]:
+            print "%-8s %9dK %10.2fms %10.2fms" % (name, os.path.getsize(filename) / 1024,
+                                                   min(timeit.repeat(save, number=1, repeat=5)) * 1000,
+                                                   min(timeit.repeat(load, number=1, repeat=5)) * 1000)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    run(int(args[0]) if len(args) > 0 else 50000,
+        float(args[1]) if len(args) > 1 else 0.1,
+        int(args[2]) if len(args) > 2 else 5)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Measures the import time of the tray modules and the time until the tray
+icon is shown, each in a fresh interpreter, and lists the modules loaded on
+the way that are only meant to be loaded on demand. The first icon needs a
+display, use xvfb-run on headless machines.
+
+Usage: python -m jenkinstray.bench.benchstartup [repeat]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MODULES = ["jenkinstray.jenkinsmonitor", "jenkinstray.gui.jenkinstray", "main"]
+# modules the startup path should not load
+DEFERRED_MODULES = ["PyQt4.uic", "jenkinstray.gui.settings", "jenkinstray.gui.mem", "psutil", "cProfile", "pstats"]
+
+def loadedDeferredModules():
+    return [module for module in DEFERRED_MODULES if sys.modules.get(module) is not None]
+
+def measureImport(module):
+    """Runs in the child process, prints the import time and deferred modules"""
+    start = time.time()
+    __import__(module)
+    print "%f %s" % (time.time() - start, ",".join(loadedDeferredModules()))
+
+def measureFirstIcon():
+    """Runs in the child process, prints the time until the icon is shown and deferred modules"""
+    start = time.time()
+    import main
+    (app, tray) = main.createTray([sys.argv[0]])
+    app.processEvents()
+    print "%f %s" % (time.time() - start, ",".join(loadedDeferredModules()))
+
+def runChild(args):
+    """
+    Returns the time the child reported, the wall time of the child including
+    the interpreter startup and the deferred modules it loaded. Raises
+    RuntimeError with the last line of the error output if the child failed.
+    """
+    env = dict(os.environ, XDG_CONFIG_HOME=tempfile.mkdtemp())
+    start = time.time()
+    child = subprocess.Popen([sys.executable, "-m", "jenkinstray.bench.benchstartup"] + args,
+                             cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    (output, errors) = child.communicate()
+    wall = time.time() - start
+    if child.returncode != 0:
+        raise RuntimeError((errors.strip().splitlines() or ["exit code %s" % child.returncode])[-1])
+    (elapsed, modules) = (output.strip().split(" ") + [""])[:2]
+    return (float(elapsed), wall, modules)
+
+def run(repeat):
+    print "%-30s %12s %12s  %s" % ("", "in process", "wall", "deferred modules loaded")
+    for (name, args) in [(module, ["--import", module]) for module in MODULES] + [("first tray icon", ["--first-icon"])]:
+        try:
+            results = [runChild(args) for _ in range(repeat)]
+        except RuntimeError, e:
+            print "%-30s failed: %s" % (name, e)
+            continue
+        print "%-30s %10.2fms %10.2fms  %s" % (name, min(result[0] for result in results) * 1000,
+                                               min(result[1] for result in results) * 1000,
+                                               results[0][2] or "none")
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--import":
+        measureImport(sys.argv[2])
+    elif len(sys.argv) == 2 and sys.argv[1] == "--first-icon":
+        measureFirstIcon()
+    else:
+        run(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Compares peak memory and wall time of refreshing a monitor from a job list
+decoded with json.load and from one decoded incrementally with iterJobList.
+Every measurement runs in its own process, the peak memory is the growth of
+the maximum resident set size while refreshing.
+
+Usage: python -m jenkinstray.bench.benchstreaming [numJobs...]
+"""
+
+from jenkinstray.bench.fixtures import projectedDocument
+from jenkinstray.jenkinsmonitor import JenkinsMonitor
+from jenkinstray.jenkinsapi import iterJobList
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVERURL = "http://jenkins.example.com"
+
+def maxRss():
+    # kilobytes on linux, bytes on mac os
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss * 1024 if sys.platform.startswith("linux") else maxrss
+
+def measure(mode, filename):
+    """Runs in the child process, prints peak memory growth and wall time"""
+    monitor = JenkinsMonitor(SERVERURL)
+    before = maxRss()
+    start = time.time()
+    with open(filename, "rb") as payload:
+        if mode == "load":
+            monitor._refreshFromDict(json.load(payload))
+        else:
+            monitor._refreshFromJobs(iterJobList(payload))
+    print "%d %f" % (maxRss() - before, time.time() - start)
+
+def run(jobCounts):
+    print "%8s %10s %12s %12s %12s %12s" % ("jobs", "payload", "load mem", "load time", "stream mem", "stream time")
+    for numJobs in jobCounts:
+        (fd, filename) = tempfile.mkstemp(suffix=".json")
+        try:
+            with os.fdopen(fd, "wb") as payload:
+                json.dump(projectedDocument(SERVERURL, numJobs), payload)
+            results = []
+            for mode in ["load", "stream"]:
+                output = subprocess.check_output([sys.executable, "-m", "jenkinstray.bench.benchstreaming", "--measure", mode, filename])
+                results.extend(map(float, output.split()))
+            print "%8d %9dK %10.1fMB %10.2fms %10.1fMB %10.2fms" % (numJobs, os.path.getsize(filename) / 1024,
+                                                                     results[0] / 1024 ** 2, results[1] * 1000,
+                                                                     results[2] / 1024 ** 2, results[3] * 1000)
+        finally:
+            os.remove(filename)
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--measure":
+        measure(sys.argv[2], sys.argv[3])
+    else:
+        run(map(int, sys.argv[1:]) or [1000, 10000, 100000])
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Compares the payload size and json parse time of the unfiltered job list
+with the one fetched through the tree parameter.
+
+Usage: python -m jenkinstray.bench.benchtreequery [numJobs...]
+"""
+
+from jenkinstray.bench.fixtures import fullDocument, projectedDocument
+from jenkinstray.jenkinsmonitor import JenkinsMonitor
+import json
+import sys
+import timeit
+
+SERVERURL = "http://jenkins.example.com"
+
+def parseTime(payload, repeat=5):
+    return min(timeit.repeat(lambda: json.loads(payload), number=1, repeat=repeat))
+
+def refreshTime(payload, repeat=5):
+    def refresh():
+        JenkinsMonitor(SERVERURL)._refreshFromDict(json.loads(payload))
+    return min(timeit.repeat(refresh, number=1, repeat=repeat))
+
+def run(jobCounts):
+    print "%8s %10s %12s %12s %10s %12s %12s" % ("jobs", "full", "parse", "refresh", "tree", "parse", "refresh")
+    for numJobs in jobCounts:
+        full = json.dumps(fullDocument(SERVERURL, numJobs))
+        projected = json.dumps(projectedDocument(SERVERURL, numJobs))
+        print "%8d %9dK %10.2fms %10.2fms %9dK %10.2fms %10.2fms" % (numJobs,
+                                                                   len(full) / 1024, parseTime(full) * 1000, refreshTime(full) * 1000,
+                                                                   len(projected) / 1024, parseTime(projected) * 1000, refreshTime(projected) * 1000)
+
+if __name__ == "__main__":
+    run(map(int, sys.argv[1:]) or [100, 1000, 4000])
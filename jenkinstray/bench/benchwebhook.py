@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Measures how long job events posted to the webhook receiver take until
+they are shown. By default the events go through a JenkinsTray on the
+offscreen Qt platform and the latency is taken from the arrival of an event
+until the tray icon was updated. With --no-ui the events are applied to a
+JenkinsMonitor in the receiving thread instead. For comparison, polling
+shows a change after half the refresh interval on average.
+
+Usage: python -m jenkinstray.bench.benchwebhook [--jobs N] [--builds B] [--no-ui]
+"""
+
+from jenkinstray.bench.events import EventSource
+from jenkinstray.bench.fixtures import jobName
+from jenkinstray.jenkinsmonitor import JenkinsMonitor
+from jenkinstray.jenkinsjob import JenkinsJob, JenkinsState
+from jenkinstray.webhook import WebhookReceiver
+from jenkinstray.instrumentation import instrumentation, RollingStats
+from threading import Thread
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+SERVER_URL = "http://jenkins.example.com"
+
+class MonitorDriver(object):
+    """
+    Applies the events to a monitor right in the receiving thread.
+    """
+    def __init__(self, numJobs):
+        self.monitor = JenkinsMonitor(SERVER_URL)
+        for idx in range(numJobs):
+            self.monitor.jobs.append(JenkinsJob(jobName(idx), True, "Unknown", JenkinsState.Successful))
+        self.receiver = WebhookReceiver(self.eventReceived, ("localhost", 0))
+        self.receiver.start()
+
+    def eventReceived(self, event):
+        self.monitor.applyEvent(event)
+        instrumentation().record("event to icon", time.time() - event.received)
+
+    def waitForEvents(self, count):
+        while instrumentation().phaseCount("event to icon") < count:
+            time.sleep(0.001)
+
+    def stop(self):
+        self.receiver.stop()
+
+class TrayDriver(object):
+    """
+    Lets a JenkinsTray monitoring every job receive the events.
+    """
+    def __init__(self, numJobs):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        # keep the configuration of the user out of the benchmark
+        os.environ["XDG_CONFIG_HOME"] = tempfile.mkdtemp()
+        from jenkinstray.initsip import setupSipApi
+        setupSipApi()
+        from PyQt4 import QtGui
+        from jenkinstray.gui.jenkinstray import JenkinsTray
+        try:
+            from jenkinstray import rcc_jenkinstray
+        except ImportError:
+            pass
+        self.app = QtGui.QApplication(sys.argv)
+        self.tray = JenkinsTray(self.app)
+        self.tray.updateFromSettings({"refreshInterval": 60, "notificationTimeout": 1, "webhookPort": 0,
+                                      "servers": [{"url": SERVER_URL, "monitored": [jobName(idx) for idx in range(numJobs)]}]})
+        self.tray.timer.stop()
+        self.receiver = self.tray.webhookReceiver
+
+    def waitForEvents(self, count):
+        while instrumentation().phaseCount("event to icon") < count:
+            self.app.processEvents()
+
+    def stop(self):
+        self.tray.stopWebhookReceiver()
+
+def run(options):
+    driver = TrayDriver(options.jobs) if options.ui else MonitorDriver(options.jobs)
+    source = EventSource(driver.receiver.url(), SERVER_URL, options.jobs)
+    postLatencies = RollingStats(options.builds * 2)
+    def post():
+        for _ in range(options.builds):
+            start = time.time()
+            source.build()
+            postLatencies.add((time.time() - start) / 2)
+    start = time.time()
+    poster = Thread(target=post, name="EventSource")
+    poster.daemon = True
+    poster.start()
+    driver.waitForEvents(options.builds * 2)
+    elapsed = time.time() - start
+    poster.join()
+    driver.stop()
+    latencies = instrumentation().phasePercentiles()["event to icon"]
+    posts = postLatencies.percentiles()
+    print "%d jobs, %d builds, ui: %s" % (options.jobs, options.builds, options.ui)
+    print "events               %10.0f events/s" % (options.builds * 2 / elapsed)
+    print "post                 %10.2fms p50 %10.2fms p90 %10.2fms p99" % (posts[50] * 1000, posts[90] * 1000, posts[99] * 1000)
+    print "event to icon        %10.2fms p50 %10.2fms p90 %10.2fms p99" % (latencies[50] * 1000, latencies[90] * 1000, latencies[99] * 1000)
+    print "%-20s %10.2fms average" % ("polling every %ds" % options.interval, options.interval * 500.0)
+
+def parseArgs(args):
+    parser = argparse.ArgumentParser(description="Benchmark the latency of webhook job events")
+    parser.add_argument("--jobs", type=int, default=1000, help="monitored jobs")
+    parser.add_argument("--builds", type=int, default=500, help="builds whose start and completion are posted")
+    parser.add_argument("--interval", type=int, default=60, help="refresh interval polling is compared with")
+    parser.add_argument("--no-ui", dest="ui", action="store_false", help="apply the events to a monitor only")
+    return parser.parse_args(args)
+
+if __name__ == "__main__":
+    run(parseArgs(sys.argv[1:]))
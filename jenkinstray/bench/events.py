@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A local stand-in for jenkins posting notification plugin events to a
+webhook receiver, see webhook.py.
+"""
+
+from jenkinstray.bench.fixtures import jobName
+import httplib
+import json
+import random
+import time
+import urlparse
+
+STATUSES = ["SUCCESS", "SUCCESS", "SUCCESS", "FAILURE", "UNSTABLE", "ABORTED"]
+
+def notification(url, phase, status=None, number=1, serverurl="http://jenkins"):
+    """
+    The event the notification plugin posts for a build phase of the job at
+    url, relative to the jenkins root like job/folder/job/job/.
+    """
+    build = {"full_url": "%s/%s%d/" % (serverurl, url, number), "number": number, "phase": phase}
+    if status is not None:
+        build["status"] = status
+    return {"name": url.rstrip("/").rpartition("/")[2], "url": url, "build": build}
+
+class EventSource(object):
+    """
+    Posts random build events of numJobs jobs of the server at serverurl to
+    the receiver at receiverurl, every build is started and completed.
+    """
+    def __init__(self, receiverurl, serverurl, numJobs, seed=0):
+        (self.host, self.port) = urlparse.urlparse(receiverurl)[1].split(":")
+        self.serverurl = serverurl
+        self.numJobs = numJobs
+        self.rnd = random.Random(seed)
+        self.number = 0
+
+    def post(self, dictobj, timeout=10):
+        """
+        Posts one event and returns the time.time() it was sent at.
+        """
+        body = json.dumps(dictobj)
+        connection = httplib.HTTPConnection(self.host, int(self.port), timeout=timeout)
+        try:
+            sent = time.time()
+            connection.request("POST", "/", body, {"content-type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 300:
+                raise IOError("Event rejected: %s %s" % (response.status, response.reason))
+            return sent
+        finally:
+            connection.close()
+
+    def build(self):
+        """
+        Posts the start and the completion of a build of a random job, returns
+        the (name, status) of the build.
+        """
+        name = jobName(self.rnd.randrange(self.numJobs))
+        status = self.rnd.choice(STATUSES)
+        self.number += 1
+        url = "job/%s/" % name
+        self.post(notification(url, "STARTED", number=self.number, serverurl=self.serverurl))
+        self.post(notification(url, "COMPLETED", status, self.number, self.serverurl))
+        return (name, status)
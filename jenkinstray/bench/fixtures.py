@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Synthetic jenkins api documents shaped like the ones recorded from a large
+jenkins master, used by the benchmarks.
+"""
+
+import random
+
+COLORS = ["blue", "blue", "blue", "red", "yellow", "disabled", "notbuilt", "aborted", "blue_anime", "red_anime"]
+
+def jobName(idx):
+    return "project-%05d-build" % idx
+
+def jobUrl(serverurl, name):
+    return "%s/job/%s/" % (serverurl, name)
+
+def fullJob(serverurl, idx, color):
+    """A job entry as returned by /api/json?depth=1 without a tree filter"""
+    name = jobName(idx)
+    return {"_class": "hudson.model.FreeStyleProject",
+            "name": name,
+            "url": jobUrl(serverurl, name),
+            "color": color,
+            "description": "Builds and tests %s on all supported platforms." % name,
+            "displayName": name,
+            "fullName": name,
+            "fullDisplayName": name,
+            "buildable": color != "disabled",
+            "concurrentBuild": False,
+            "inQueue": False,
+            "keepDependencies": False,
+            "nextBuildNumber": idx + 101,
+            "healthReport": [{"description": "Build stability: No recent builds failed.",
+                              "iconClassName": "icon-health-80plus",
+                              "iconUrl": "health-80plus.png",
+                              "score": 100}],
+            "lastBuild": {"_class": "hudson.model.FreeStyleBuild", "number": idx + 100, "url": "%s%s/" % (jobUrl(serverurl, name), idx + 100)},
+            "lastCompletedBuild": {"_class": "hudson.model.FreeStyleBuild", "number": idx + 100, "url": "%s%s/" % (jobUrl(serverurl, name), idx + 100)},
+            "property": [],
+            "scm": {"_class": "hudson.plugins.git.GitSCM"},
+            "upstreamProjects": [],
+            "downstreamProjects": []}
+
+def jobColors(numJobs, seed=0):
+    rnd = random.Random(seed)
+    return [rnd.choice(COLORS) for _ in range(numJobs)]
+
+def fullDocument(serverurl, numJobs, seed=0):
+    """The unfiltered top level object of a jenkins master with numJobs jobs"""
+    jobs = [fullJob(serverurl, idx, color) for (idx, color) in enumerate(jobColors(numJobs, seed))]
+    return {"_class": "hudson.model.Hudson",
+            "assignedLabels": [{}],
+            "mode": "NORMAL",
+            "nodeDescription": "the master Jenkins node",
+            "nodeName": "",
+            "numExecutors": 8,
+            "description": "Continuous integration for all products",
+            "jobs": jobs,
+            "overallLoad": {},
+            "primaryView": {"_class": "hudson.model.AllView", "name": "all", "url": serverurl + "/"},
+            "quietingDown": False,
+            "slaveAgentPort": 50000,
+            "unlabeledLoad": {"_class": "jenkins.model.UnlabeledLoadStatistics"},
+            "useCrumbs": True,
+            "useSecurity": True,
+            "views": [{"_class": "hudson.model.AllView", "name": "all", "url": serverurl + "/"},
+                      {"_class": "hudson.model.ListView", "name": "nightly", "url": serverurl + "/view/nightly/"}]}
+
+def projectedDocument(serverurl, numJobs, seed=0):
+    """The same master as fullDocument, fetched with the tree=jobs[name,url,color] filter"""
+    return {"_class": "hudson.model.Hudson",
+            "jobs": [{"_class": "hudson.model.FreeStyleProject", "name": jobName(idx), "url": jobUrl(serverurl, jobName(idx)), "color": color}
+                     for (idx, color) in enumerate(jobColors(numJobs, seed))]}
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A simulated fleet of jenkins masters on localhost. Every master serves the
+projected job list with an ETag, answers after a configurable latency and
+changes the color of a fraction of its jobs on every poll.
+"""
+
+from jenkinstray.bench.fixtures import COLORS, jobName, jobUrl, jobColors
+import json
+import random
+import time
+from threading import Thread, Lock
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+class FleetRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        master = self.server.master
+        time.sleep(master.latency)
+        (body, etag) = master.poll()
+        if self.headers.getheader("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("etag", etag)
+            self.send_header("content-length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.send_header("etag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class FleetHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class SimulatedMaster(object):
+    """
+    One jenkins master with numJobs jobs. churn is the fraction of jobs whose
+    color changes before each poll is answered.
+    """
+    def __init__(self, numJobs, latency=0.0, churn=0.0, seed=0):
+        self.latency = latency
+        self.churn = churn
+        self.rnd = random.Random(seed)
+        self.colors = jobColors(numJobs, seed)
+        self.lock = Lock()
+        self.generation = 0
+        self.polls = 0
+        self.transitions = 0
+        self.body = None
+        self.server = FleetHTTPServer(("localhost", 0), FleetRequestHandler)
+        self.server.master = self
+        self.url = "http://localhost:%s" % self.server.server_address[1]
+        self.thread = None
+
+    def start(self):
+        self.thread = Thread(target=self.server.serve_forever, name=str(self.url))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def jobNames(self):
+        return [jobName(idx) for idx in range(len(self.colors))]
+
+    def poll(self):
+        """
+        Applies the churn of one poll and returns the body and ETag to answer
+        it with.
+        """
+        with self.lock:
+            self.polls += 1
+            numChanges = int(round(self.churn * len(self.colors)))
+            if numChanges > 0 or self.body is None:
+                for idx in self.rnd.sample(xrange(len(self.colors)), numChanges):
+                    self.colors[idx] = self.rnd.choice([color for color in COLORS if color != self.colors[idx]])
+                self.transitions += numChanges
+                self.generation += 1
+                self.body = json.dumps({"_class": "hudson.model.Hudson",
+                                        "jobs": [{"_class": "hudson.model.FreeStyleProject",
+                                                  "name": jobName(idx),
+                                                  "url": jobUrl(self.url, jobName(idx)),
+                                                  "color": color} for (idx, color) in enumerate(self.colors)]})
+            return (self.body, '"%s"' % self.generation)
+
+class SimulatedFleet(object):
+    """
+    numServers masters with numJobs jobs each, see SimulatedMaster.
+    """
+    def __init__(self, numServers, numJobs, latency=0.0, churn=0.0, seed=0):
+        self.masters = [SimulatedMaster(numJobs, latency, churn, seed + idx) for idx in range(numServers)]
+
+    def __enter__(self):
+        for master in self.masters:
+            master.start()
+        return self
+
+    def __exit__(self, *args):
+        for master in self.masters:
+            master.stop()
+
+    def urls(self):
+        return [master.url for master in self.masters]
+
+    def settings(self, refreshInterval=60):
+        """
+        Tray settings monitoring every job of the fleet.
+        """
+        return {"refreshInterval": refreshInterval,
+                "notificationTimeout": 10,
+                "servers": [{"url": master.url,
+                             "monitored": master.jobNames()}
+                            for master in self.masters]}
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Folders, multibranch projects and organization folders show up in the job
+lists of jenkins as entries without a color, their jobs are listed one
+level deeper. The jobs inside them are named by their full path, like
+folder/project/branch.
+"""
+
+from threading import Thread, Lock
+from Queue import Queue
+from jenkinsapi import fetchJobList
+
+# number of folder levels below the top level that are looked into
+DEFAULT_FOLDER_DEPTH = 2
+CRAWL_WORKERS = 4
+# a request to a folder is assumed to cost as much as transferring this
+# many job entries as part of a larger job list
+REQUEST_COST = 200
+# every n-th refresh fetches the whole tree, so jobs added to folders the
+# crawls skip are found
+FULL_REFRESH_EVERY = 10
+
+class Container(object):
+    """
+    A folder found by a crawl, with the number of jobs found below it.
+    """
+    __slots__ = ("url", "numJobs")
+
+    def __init__(self, url, numJobs=0):
+        self.url = url
+        self.numJobs = numJobs
+
+def ancestorPaths(name):
+    """
+    Returns the paths of the folders containing the job name, outermost first.
+    """
+    parts = name.split("/")
+    return ["/".join(parts[:idx]) for idx in range(1, len(parts))]
+
+def monitoredAncestors(names):
+    """
+    Returns the set of the paths of all folders holding one of the jobs names.
+    """
+    ancestors = set()
+    for name in names:
+        ancestors.update(ancestorPaths(name))
+    return ancestors
+
+def countJobs(containers, names):
+    for name in names:
+        for path in ancestorPaths(name):
+            container = containers.get(path)
+            if container is not None:
+                container.numJobs += 1
+
+def flattenJobs(jobinfos, containers=None, prefix="", ancestors=()):
+    """
+    Yields the jobs in jobinfos and in the jobs arrays of the folders among
+    them, named by their full path. If containers is given the folders are
+    added to it by their full path, counting the jobs found below them.
+    """
+    for jobinfo in jobinfos:
+        name = prefix + jobinfo["name"]
+        if "color" in jobinfo:
+            for container in ancestors:
+                container.numJobs += 1
+            yield dict(jobinfo, name=name) if prefix else jobinfo
+        else:
+            container = Container(jobinfo.get("url"))
+            if containers is not None:
+                containers[name] = container
+            for job in flattenJobs(jobinfo.get("jobs", ()), containers, name + "/", ancestors + (container,)):
+                yield job
+
+def planCrawl(containers, monitoredNames, folderDepth):
+    """
+    Decides from the folders found by the last refresh whether requesting
+    the jobs of the folders holding monitored jobs one by one is cheaper than
+    a single request for the whole tree. Returns the paths of the folders
+    the crawl skips, None if the single request is cheaper.
+    """
+    if not containers or folderDepth == 0:
+        return None
+    ancestors = monitoredAncestors(monitoredNames)
+    requests = 0
+    skippedJobs = 0
+    skipped = []
+    for (path, container) in containers.iteritems():
+        parents = ancestorPaths(path)
+        if len(parents) >= folderDepth or (len(parents) > 0 and parents[-1] not in ancestors):
+            # not looked into anyway, or inside a skipped folder
+            continue
+        if path in ancestors:
+            requests += 1
+        else:
+            skipped.append(path)
+            skippedJobs += container.numJobs
+    if skippedJobs <= REQUEST_COST * requests:
+        return None
+    return skipped
+
+class FolderCrawler(object):
+    """
+    Fetches the top level jobs of a server and, concurrently, the jobs of
+    the folders up to folderDepth levels below that hold monitored jobs.
+    Folders without monitored jobs are skipped, so new jobs in them are only
+    found by the next refresh of the whole tree.
+    """
+    def __init__(self, serverurl, folderDepth, monitoredNames, timeout=None, maxWorkers=CRAWL_WORKERS):
+        self.serverurl = serverurl
+        self.folderDepth = folderDepth
+        self.ancestors = monitoredAncestors(monitoredNames)
+        self.timeout = timeout
+        self.maxWorkers = maxWorkers
+        self.lock = Lock()
+        self.error = None
+        self.containers = {}
+        self.skipped = []
+        self.jobsByFolder = {}
+
+    def crawl(self):
+        """
+        Returns the jobs found, named by their full path. Raises the first
+        error one of the requests ran into.
+        """
+        pending = Queue()
+        self._visit("", fetchJobList(self.serverurl, timeout=self.timeout)["jobs"], 0, pending)
+        workers = [Thread(target=self._work, args=(pending,), name="FolderCrawler") for _ in range(self.maxWorkers)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        pending.join()
+        for worker in workers:
+            pending.put(None)
+        for worker in workers:
+            worker.join()
+        if self.error is not None:
+            raise self.error
+        jobs = [job for path in sorted(self.jobsByFolder) for job in self.jobsByFolder[path]]
+        countJobs(self.containers, (job["name"] for job in jobs))
+        return jobs
+
+    def _visit(self, path, jobinfos, level, pending):
+        prefix = path + "/" if path else ""
+        jobs = []
+        for jobinfo in jobinfos:
+            name = prefix + jobinfo["name"]
+            if "color" in jobinfo:
+                jobs.append(dict(jobinfo, name=name) if prefix else jobinfo)
+                continue
+            with self.lock:
+                self.containers[name] = Container(jobinfo.get("url"))
+            if level >= self.folderDepth:
+                continue
+            if name in self.ancestors:
+                pending.put((name, jobinfo["url"], level + 1))
+            else:
+                with self.lock:
+                    self.skipped.append(name)
+        with self.lock:
+            self.jobsByFolder[path] = jobs
+
+    def _work(self, pending):
+        while True:
+            task = pending.get()
+            try:
+                if task is None:
+                    return
+                (path, url, level) = task
+                if self.error is None:
+                    self._visit(path, fetchJobList(url, timeout=self.timeout)["jobs"], level, pending)
+            except Exception, e:
+                # a worker has to keep draining the queue whatever went wrong, or crawl waits forever
+                with self.lock:
+                    self.error = self.error or e
+            finally:
+                pending.task_done()
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Headless polling daemon for sharing the polls of a jenkins server between
+many trays. It refreshes a JenkinsMonitor per server without Qt, caches the
+job lists and serves each of them below http://host:port/<name>, which trays
+use as their server url like that of a jenkins server. Clients that send the
+generation of the job list they know get only the jobs changed since.
+
+    python -m jenkinstray.daemon --port 8090 main=https://jenkins.example.com
+"""
+
+from jenkinsjob import stateToColor
+from jenkinsmonitor import JenkinsMonitor, GENERATION_HEADER, DELTA_HEADER
+from refreshengine import RefreshEngine, DEFAULT_MAX_WORKERS, DEFAULT_TIMEOUT
+from scheduler import PollScheduler
+from crawler import DEFAULT_FOLDER_DEPTH
+from collections import deque
+from threading import Thread, Lock, Event
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+import argparse
+import json
+import socket
+import sys
+import time
+import urllib
+import urlparse
+
+DEFAULT_PORT = 8090
+DEFAULT_INTERVAL = 60
+# number of generations deltas can be served for, older clients get everything
+MAX_DELTAS = 64
+
+class ServerCache(object):
+    """
+    The job list of one server as last published from its monitor. Every
+    change of the job list starts a new generation, the changes of the last
+    MAX_DELTAS generations are kept to answer clients with deltas. Tokens
+    name a generation of this process, so clients of a restarted daemon get
+    the whole job list again.
+    """
+    def __init__(self, name, monitor, epoch):
+        self.name = name
+        self.monitor = monitor
+        self.epoch = epoch
+        self.lock = Lock()
+        self.generation = 0
+        self.published = False
+        # the error of the last refresh, None if it succeeded
+        self.error = None
+        # job name -> (url, color), in the order of the monitor
+        self.entries = {}
+        self.order = []
+        # (generation, changed names, removed names) of the last generations
+        self.changeLog = deque(maxlen=MAX_DELTAS)
+        self.fullBody = None
+        self.deltaBodies = {}
+
+    def token(self):
+        return "%s-%d" % (self.epoch, self.generation)
+
+    def publish(self):
+        """
+        Takes over the jobs of the monitor after a successful refresh.
+        Returns True if the job list changed.
+        """
+        entries = {}
+        order = []
+        for job in self.monitor.jobs:
+            # the daemon watches everything, this keeps the whole job list in each refresh
+            if not job.monitored:
+                job.monitored = True
+            entries[job.name] = (job.url, stateToColor(job.state, job.building))
+            order.append(job.name)
+        with self.lock:
+            self.error = None
+            old = self.entries
+            changed = [name for name in order if old.get(name) != entries[name]]
+            removed = [name for name in old if name not in entries]
+            if self.published and not changed and not removed:
+                return False
+            self.generation += 1
+            self.changeLog.append((self.generation, changed, removed))
+            self.entries = entries
+            self.order = order
+            self.fullBody = None
+            self.deltaBodies = {}
+            self.published = True
+            return True
+
+    def publishError(self, error):
+        with self.lock:
+            self.error = error
+
+    def document(self, since=None):
+        """
+        Returns (token, body, isDelta) for a client knowing the generation
+        named by the token since. The body lists the changed jobs and the
+        names of the removed ones if the generation is recent enough and the
+        delta is smaller than the whole job list, otherwise all jobs.
+        Returns None if the server was not polled successfully yet.
+        """
+        with self.lock:
+            if not self.published:
+                return None
+            body = self._deltaBody(since)
+            if body is not None:
+                return (self.token(), body, True)
+            if self.fullBody is None:
+                self.fullBody = json.dumps({"jobs": [self._jobInfo(name) for name in self.order]}, separators=(",", ":"))
+            return (self.token(), self.fullBody, False)
+
+    def _deltaBody(self, since):
+        sinceGeneration = self._parseToken(since)
+        if sinceGeneration is None or not self.changeLog or sinceGeneration < self.changeLog[0][0] - 1:
+            return None
+        body = self.deltaBodies.get(sinceGeneration)
+        if body is not None:
+            return body
+        changed = set()
+        removed = set()
+        for (generation, changedNames, removedNames) in self.changeLog:
+            if generation <= sinceGeneration:
+                continue
+            changed.update(changedNames)
+            removed.difference_update(changedNames)
+            changed.difference_update(removedNames)
+            removed.update(removedNames)
+        if len(changed) + len(removed) > len(self.order) / 2:
+            return None
+        body = json.dumps({"jobs": [self._jobInfo(name) for name in self.order if name in changed],
+                           "removed": sorted(removed)}, separators=(",", ":"))
+        self.deltaBodies[sinceGeneration] = body
+        return body
+
+    def _parseToken(self, token):
+        if token is None:
+            return None
+        (epoch, _, generation) = token.rpartition("-")
+        if epoch != self.epoch or not generation.isdigit() or int(generation) > self.generation:
+            return None
+        return int(generation)
+
+    def _jobInfo(self, name):
+        (url, color) = self.entries[name]
+        return {"name": name, "url": url, "color": color}
+
+class StatusRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        (path, _, query) = self.path.partition("?")
+        parts = [urllib.unquote(part) for part in path.strip("/").split("/")]
+        if parts == [""]:
+            self._sendJson(200, {"servers": [{"name": cache.name, "url": cache.monitor.serverurl}
+                                             for cache in self.server.daemon.caches.itervalues()]})
+            return
+        cache = self.server.daemon.caches.get(parts[0])
+        if cache is None or parts[1:] != ["api", "json"]:
+            self._sendJson(404, {"error": "no such server"})
+            return
+        with cache.lock:
+            error = cache.error
+        if error is not None:
+            self._sendJson(502, {"error": str(error)})
+            return
+        since = urlparse.parse_qs(query).get("since", [None])[0]
+        document = cache.document(since)
+        if document is None:
+            self._sendJson(503, {"error": "not polled yet"})
+            return
+        (token, body, isDelta) = document
+        etag = '"%s"' % token
+        if self.headers.getheader("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("etag", etag)
+            self.send_header("content-length", "0")
+            self.end_headers()
+            return
+        headers = [("etag", etag), (GENERATION_HEADER, token)]
+        if isDelta:
+            headers.append((DELTA_HEADER, "1"))
+        self._send(200, body, headers)
+
+    def _sendJson(self, status, dictobj):
+        self._send(status, json.dumps(dictobj))
+
+    def _send(self, status, body, headers=()):
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        for (name, value) in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class StatusHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # trays closing their kept alive connections are nothing to report
+        if not isinstance(sys.exc_info()[1], socket.error):
+            HTTPServer.handle_error(self, request, client_address)
+
+class PollingDaemon(object):
+    """
+    Polls the servers, given as (name, serverurl) pairs, on the schedule of
+    a PollScheduler and serves their job lists on address. Port 0 picks a
+    free port, see url().
+    """
+    def __init__(self, servers, interval=DEFAULT_INTERVAL, timeout=DEFAULT_TIMEOUT, folderDepth=DEFAULT_FOLDER_DEPTH,
+                 address=("localhost", DEFAULT_PORT), maxWorkers=DEFAULT_MAX_WORKERS):
+        epoch = "%x" % int(time.time() * 1000)
+        self.caches = {}
+        for (name, serverurl) in servers:
+            monitor = JenkinsMonitor(serverurl)
+            monitor.folderDepth = folderDepth
+            self.caches[name] = ServerCache(name, monitor, epoch)
+        self.cachesByMonitor = dict((cache.monitor, cache) for cache in self.caches.itervalues())
+        self.scheduler = PollScheduler(interval)
+        for cache in self.caches.itervalues():
+            self.scheduler.add(cache.monitor)
+        self.engine = RefreshEngine(maxWorkers, timeout)
+        self.server = StatusHTTPServer(address, StatusRequestHandler)
+        self.server.daemon = self
+        self.stopped = Event()
+        self.threads = []
+
+    def url(self):
+        return "http://%s:%s" % self.server.server_address[:2]
+
+    def poll(self, force=False):
+        """
+        Refreshes the servers that are due, or all of them if force is set,
+        and publishes the results. Returns the RefreshEngine results.
+        """
+        monitors = self.cachesByMonitor.keys() if force else self.scheduler.dueMonitors()
+        results = self.engine.refresh(monitors)
+        for (monitor, changes, error) in results:
+            cache = self.cachesByMonitor[monitor]
+            if error is None:
+                cache.publish()
+            else:
+                print "Error refreshing %s: %s" % (cache.name, error)
+                cache.publishError(error)
+            self.scheduler.reschedule(monitor, changes, error)
+        return results
+
+    def start(self, polling=True):
+        """
+        Starts serving the job lists and, unless polling is False, polling
+        the servers in the background.
+        """
+        self.stopped.clear()
+        self.threads = [Thread(target=self.server.serve_forever, name="StatusServer")]
+        if polling:
+            self.threads.append(Thread(target=self._pollLoop, name="JenkinsPoll"))
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.threads:
+            self.server.shutdown()
+        self.server.server_close()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def _pollLoop(self):
+        while not self.stopped.is_set():
+            self.poll()
+            self.stopped.wait(self.scheduler.nextDueIn())
+
+def parseServer(spec):
+    """
+    Parses a server given as name=url, or only as url named by its host.
+    """
+    (name, sep, serverurl) = spec.partition("=")
+    if not sep:
+        serverurl = spec
+        name = urlparse.urlparse(spec).hostname
+    if not name or not serverurl:
+        raise argparse.ArgumentTypeError("not a server url: %s" % spec)
+    return (name, serverurl)
+
+def parseArgs(args):
+    parser = argparse.ArgumentParser(description="Poll jenkins servers once for many jenkinstray clients")
+    parser.add_argument("servers", nargs="+", type=parseServer, metavar="[NAME=]URL", help="jenkins server to poll, served below /NAME")
+    parser.add_argument("--bind", default="localhost", help="address to serve the job lists on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to serve the job lists on")
+    parser.add_argument("--interval", type=int, default=DEFAULT_INTERVAL, help="polling interval in seconds")
+    parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT, help="timeout in seconds for requests to a server")
+    parser.add_argument("--folder-depth", dest="folderDepth", type=int, default=DEFAULT_FOLDER_DEPTH, help="folder levels whose jobs are polled")
+    return parser.parse_args(args)
+
+def main(args):
+    args = parseArgs(args)
+    daemon = PollingDaemon(args.servers, args.interval, args.timeout, args.folderDepth, (args.bind, args.port))
+    daemon.start()
+    for (name, serverurl) in args.servers:
+        print "Serving %s as %s/%s" % (serverurl, daemon.url(), name)
+    try:
+        while not daemon.stopped.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    daemon.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from threading import Thread, Lock
+from Queue import Queue, Empty
+from jenkinsapi import openJobList, iterJobList
+from crawler import DEFAULT_FOLDER_DEPTH, flattenJobs
+from refreshengine import DEFAULT_MAX_WORKERS, DEFAULT_TIMEOUT
+
+def fetchJobNames(serverurl, timeout=None, folderDepth=DEFAULT_FOLDER_DEPTH):
+    """
+    Returns the names of the jobs on a server, jobs in folders up to
+    folderDepth levels deep by their full path. The job list is decoded
+    while it is downloaded.
+    """
+    (response, etag, lastModified) = openJobList(serverurl, folderDepth, timeout)
+    try:
+        return [job["name"] for job in flattenJobs(iterJobList(response))]
+    finally:
+        response.close()
+
+def mergeJobs(jobs, names):
+    """
+    Returns the {"name": ..., "monitored": ...} entries for the job names
+    found on a server, keeping the monitoring flags of the known jobs.
+    """
+    monitored = dict((job["name"], job["monitored"]) for job in jobs)
+    return [{"name": name, "monitored": monitored.get(name, False)} for name in names]
+
+class JobDiscovery(object):
+    """
+    Fetches the job names of a number of servers concurrently. Every server
+    is reported to serverDone(serverurl, names, error) from a worker thread
+    as soon as it is done, where error is None if the job list was
+    fetched. Servers listed in knownJobs are reported with these names
+    without asking them again. folderDepths maps server urls to the number
+    of folder levels looked into, DEFAULT_FOLDER_DEPTH for servers not in
+    it. After cancel() no further server is asked or reported.
+    """
+    def __init__(self, serverurls, serverDone, knownJobs=None, folderDepths=None, maxWorkers=DEFAULT_MAX_WORKERS, timeout=DEFAULT_TIMEOUT):
+        self.serverurls = list(serverurls)
+        self.serverDone = serverDone
+        self.knownJobs = knownJobs or {}
+        self.folderDepths = folderDepths or {}
+        self.maxWorkers = maxWorkers
+        self.timeout = timeout
+        self.lock = Lock()
+        self.cancelled = False
+        self.workers = []
+
+    def start(self):
+        pending = Queue()
+        for serverurl in self.serverurls:
+            if serverurl in self.knownJobs:
+                self._report(serverurl, self.knownJobs[serverurl], None)
+            else:
+                pending.put(serverurl)
+        self.workers = [Thread(target=self._work, args=(pending,), name="JobDiscovery") for _ in range(min(self.maxWorkers, pending.qsize()))]
+        for worker in self.workers:
+            worker.daemon = True
+            worker.start()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+
+    def isCancelled(self):
+        with self.lock:
+            return self.cancelled
+
+    def wait(self):
+        for worker in self.workers:
+            worker.join()
+
+    def _work(self, pending):
+        while not self.isCancelled():
+            try:
+                serverurl = pending.get_nowait()
+            except Empty:
+                return
+            try:
+                names = fetchJobNames(serverurl, self.timeout, self.folderDepths.get(serverurl, DEFAULT_FOLDER_DEPTH))
+                self._report(serverurl, names, None)
+            except Exception, e:
+                # every server has to be reported, the settings wait for all of them
+                self._report(serverurl, None, e)
+
+    def _report(self, serverurl, names, error):
+        # holding the lock makes sure nothing is reported after cancel returned
+        with self.lock:
+            if not self.cancelled:
+                self.serverDone(serverurl, names, error)
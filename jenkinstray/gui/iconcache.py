@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from PyQt4 import QtCore, QtGui
+from collections import OrderedDict
+from ..jenkinsjob import JenkinsState
+
+def iconNameForJobState(jobState):
+    if jobState == JenkinsState.Failed:
+        return ":///images/jenkinstray_failed.png"
+    elif jobState == JenkinsState.Disabled:
+        return ":///images/jenkinstray_disabled.png"
+    elif jobState == JenkinsState.Unstable:
+        return ":///images/jenkinstray_unstable.png"
+    elif jobState == JenkinsState.Successful:
+        return ":///images/jenkinstray_success.png"
+    else:
+        return ":///images/jenkinstray.png"
+
+def addCountToImage(image, number):
+    painter = QtGui.QPainter(image)
+    font = painter.font()
+    maxwidth = image.width() - round(image.width() * .3)
+    maxheight = image.height() - round(image.height() * .3)
+    metrics = QtGui.QFontMetrics(font)
+    text = str(number)
+    while metrics.width(text) < maxwidth and metrics.height() < maxheight:
+        font.setPointSize(font.pointSize() + 1)
+        metrics = QtGui.QFontMetrics(font)
+
+    painter.setFont(font)
+    painter.drawText(image.rect(), QtCore.Qt.AlignVCenter | QtCore.Qt.AlignCenter, text)
+    painter.end()
+
+class IconCache(object):
+    """
+    Decodes the icon of each job state only once and keeps the most recently
+    used tray icons, keyed by state and the count painted onto them.
+    """
+    def __init__(self, maxTrayIcons=16):
+        self.maxTrayIcons = maxTrayIcons
+        self.stateIcons = {}
+        self.trayIcons = OrderedDict()
+        self.renderCount = 0
+
+    def iconForState(self, jobState):
+        icon = self.stateIcons.get(jobState)
+        if icon is None:
+            icon = QtGui.QIcon(iconNameForJobState(jobState))
+            self.stateIcons[jobState] = icon
+        return icon
+
+    def trayIcon(self, jobState, count=0):
+        """
+        Returns the tray icon for jobState, with count painted onto it unless
+        it is 0.
+        """
+        key = (jobState, count)
+        icon = self.trayIcons.pop(key, None)
+        if icon is None:
+            image = QtGui.QImage(iconNameForJobState(jobState))
+            assert(not image.isNull())
+            if count > 0:
+                addCountToImage(image, count)
+            icon = QtGui.QIcon(QtGui.QPixmap.fromImage(image))
+            self.renderCount += 1
+            if len(self.trayIcons) >= self.maxTrayIcons:
+                self.trayIcons.popitem(last=False)
+        self.trayIcons[key] = icon
+        return icon
@@ -24,44 +24,88 @@
 
 from PyQt4 import QtCore, QtGui
 
-from settings import SettingsWidget
+from jobmenu import JobMenu
+from iconcache import IconCache
 from appdirs import user_config_dir
 import os
-import json
-import threading
-import traceback
 import sys
+import time
 from ..jenkinsmonitor import JenkinsMonitor
+from ..crawler import DEFAULT_FOLDER_DEPTH
+from ..refreshengine import RefreshEngine, DEFAULT_TIMEOUT
+from ..scheduler import PollScheduler, DEFAULT_JITTER
+from ..instrumentation import instrumentation, Profiler
+from ..settingsstore import SettingsStore, compactSettings
+from ..snapshot import StateSnapshot
+from ..history import HistoryStore
+from ..webhook import WebhookReceiver, DEFAULT_RECONCILE_INTERVAL
+from ..rules import ruleSetFromSettings
 from ..jenkinsjob import JenkinsJob, JenkinsState
 
-import mem
-
 last_histogram = None
 
 CONFIG_FILENAME = "jenkinstray.json"
+PROFILE_FILENAME = "jenkinstray.prof"
+STATE_FILENAME = "jenkinstray.state"
+HISTORY_FILENAME = "jenkinstray.history"
+# milliseconds changed settings are held back to write bursts of changes once
+SAVE_DELAY = 1000
+# milliseconds changed job states are held back, so they are written at most
+# once in this time however often the jobs change
+SNAPSHOT_DELAY = 60 * 1000
+
+def profileCyclesFromArgs(args):
+    """
+    Number of refresh cycles to profile as given with --profile N, 0 if
+    profiling is not requested.
+    """
+    if "--profile" in args:
+        idx = args.index("--profile")
+        if idx + 1 < len(args) and args[idx + 1].isdigit():
+            return int(args[idx + 1])
+        return 1
+    return 0
 
-def refreshMonitors(trayObject):
+def refreshMonitors(trayObject, results):
+    """
+    Updates the connectivity problems and the polling schedule from the
+    results of a refresh, called on the GUI thread.
+    """
     errors = []
-    for monitor in trayObject.monitors:
-        try:
-            monitor.refreshFromServer()
+    changes = []
+    for (monitor, monitorChanges, error) in results:
+        if monitorChanges:
+            changes.append((monitor, monitorChanges))
+        if error is None:
             if monitor in trayObject.monitorsWithConnectivityProblems:
                 trayObject.monitorsWithConnectivityProblems.remove(monitor)
-        except Exception, e:
+        else:
             if monitor not in trayObject.monitorsWithConnectivityProblems:
-                errors.append(str(e))
-            trayObject.monitorsWithConnectivityProblems.append(monitor)
-            print "Error refreshing jenkins server %s: %s" % (monitor.serverurl, traceback.format_exc())
-    trayObject.serverInfoUpdated.emit(errors)
+                errors.append(str(error))
+                trayObject.monitorsWithConnectivityProblems.append(monitor)
+            print "Error refreshing jenkins server %s: %s" % (monitor.serverurl, error)
+        trayObject.scheduler.reschedule(monitor, monitorChanges, error)
+    if len(changes) > 0 or len(errors) > 0:
+        trayObject.serverInfoUpdated.emit(errors, changes)
 
 class JenkinsTray(QtCore.QObject):
 
-    serverInfoUpdated = QtCore.pyqtSignal(list)
+    # emitted with the new connectivity errors and a list of
+    # (monitor, JobChanges) tuples for the servers that changed
+    serverInfoUpdated = QtCore.pyqtSignal(list, list)
+    # emitted with the results of each refresh cycle, from the refreshing
+    # thread, so they are handled on the GUI thread
+    refreshFinished = QtCore.pyqtSignal(list)
+    # emitted with each webhook.JobEvent, from the receiving thread
+    jobEventReceived = QtCore.pyqtSignal(object)
 
     def __init__(self, parent):
         QtCore.QObject.__init__(self, parent)
         self.monitors = []
+        self.monitorsByUrl = {}
         self.monitorsWithConnectivityProblems = []
+        # server url -> autoMonitor settings the rules of the monitor were compiled from
+        self.autoMonitorRules = {}
         self.trayicon = QtGui.QSystemTrayIcon(self)
         self.menu = QtGui.QMenu()
         self.settingsAct = QtGui.QAction("Settings...", self.menu)
@@ -79,18 +123,206 @@ class JenkinsTray(QtCore.QObject):
         self.menu.addAction(self.aboutQtAct)
         self.menu.addSeparator()
         self.menu.addAction(self.quitAct)
-        self.jobActionsTree = {}
+        self.iconCache = IconCache()
+        self.jobMenu = JobMenu(self.menu, self.jobSeparator, self.iconCache.iconForState, self.activateJobAction)
         self.trayicon.setContextMenu(self.menu)
-        self.image = QtGui.QImage(":///images/jenkinstray.png")
-        assert(not self.image.isNull())
-        self.trayicon.setIcon(QtGui.QIcon(QtGui.QPixmap.fromImage(self.image)))
+        self.trayIconKey = (JenkinsState.Unknown, 0)
+        self.trayicon.setIcon(self.iconCache.trayIcon(*self.trayIconKey))
         self.trayicon.setVisible(True)
         self.cfgDir = user_config_dir("jenkinstray", appauthor="jenkinstray", version="0.1")
+        self.settingsStore = SettingsStore(os.path.join(self.cfgDir, CONFIG_FILENAME))
+        self.saveTimer = QtCore.QTimer(self)
+        self.saveTimer.setSingleShot(True)
+        self.saveTimer.setInterval(SAVE_DELAY)
+        self.saveTimer.timeout.connect(self.settingsStore.flush)
+        QtGui.qApp.aboutToQuit.connect(self.settingsStore.flush)
+        self.snapshot = StateSnapshot(os.path.join(self.cfgDir, STATE_FILENAME))
+        self.snapshotDirty = False
+        self.historyStore = HistoryStore(os.path.join(self.cfgDir, HISTORY_FILENAME))
+        self.snapshotTimer = QtCore.QTimer(self)
+        self.snapshotTimer.setSingleShot(True)
+        self.snapshotTimer.setInterval(SNAPSHOT_DELAY)
+        self.snapshotTimer.timeout.connect(self.saveStates)
+        QtGui.qApp.aboutToQuit.connect(self.saveStates)
         self.timer = QtCore.QTimer(self)
-        self.timer.timeout.connect(lambda: threading.Thread(target=refreshMonitors(self)).start())
-        self.serverInfoUpdated.connect(self.updateUiFromMonitors)
+        self.timer.setSingleShot(True)
+        self.refreshEngine = RefreshEngine()
+        self.scheduler = PollScheduler()
+        self.timer.timeout.connect(self.startRefresh)
+        self.profiler = None
+        self.profileCycles = profileCyclesFromArgs(sys.argv)
+        if self.profileCycles > 0:
+            self.profiler = Profiler()
+            self.refreshEngine.profiler = self.profiler
+        self.serverInfoUpdated.connect(self.updateUiFromServerInfo)
+        self.refreshFinished.connect(self.refreshCycleFinished)
+        # events arriving while the monitors refresh are applied afterwards
+        self.refreshing = False
+        self.pendingEvents = []
+        # settings accepted in the dialog while the monitors refresh
+        self.pendingSettings = None
+        self.webhookReceiver = None
+        self.webhookAddress = None
+        self.jobEventReceived.connect(self.applyJobEvent)
+        QtGui.qApp.aboutToQuit.connect(self.stopWebhookReceiver)
         self.updateFromSettings(self.readSettings())
-        self.timer.start()
+        self.restoreSnapshot()
+        self.restoreHistory()
+        self.updateUiFromMonitors([], None)
+
+    def startRefresh(self):
+        """
+        Refreshes the monitors that are due, the next refresh is scheduled
+        once the refresh finished.
+        """
+        due = self.scheduler.dueMonitors()
+        if len(due) == 0:
+            self.scheduleRefresh()
+        elif self.refreshEngine.refreshAsync(due, self.refreshFinished.emit):
+            self.refreshing = True
+
+    def refreshCycleFinished(self, results):
+        self.refreshing = False
+        refreshMonitors(self, results)
+        if self.pendingSettings is not None:
+            settings = self.pendingSettings
+            self.pendingSettings = None
+            self.applySettings(settings)
+        pendingEvents = self.pendingEvents
+        self.pendingEvents = []
+        for event in pendingEvents:
+            self.applyJobEvent(event)
+        if self.profiler is not None:
+            self.profileCycles -= 1
+            if self.profileCycles == 0:
+                self.refreshEngine.profiler = None
+                self.profiler.dump(PROFILE_FILENAME, sys.stdout)
+                self.profiler = None
+                print instrumentation().report()
+                print "Profile written to %s" % os.path.abspath(PROFILE_FILENAME)
+        if self.snapshotDirty and not self.snapshotTimer.isActive():
+            # the timer ran out during the refresh
+            self.snapshotTimer.start()
+        self.scheduleRefresh()
+
+    def restoreSnapshot(self):
+        """
+        Shows the job states saved by the last run until the servers answer.
+        Monitors with autoMonitor rules get no unmonitored jobs back, so the
+        first refresh reports them as added and the rules look at them.
+        """
+        with instrumentation().phase("snapshot load"):
+            states = self.snapshot.load()
+            for monitor in self.monitors:
+                if monitor.serverurl in states:
+                    monitor.restoreState(states[monitor.serverurl], addJobs=monitor.autoMonitor is None)
+
+    def saveStates(self):
+        """
+        Saves the job states and histories if they changed. Nothing is saved
+        while the monitors refresh, refreshCycleFinished tries again.
+        """
+        if self.snapshotDirty and not self.refreshing:
+            self.saveSnapshot()
+            self.saveHistory()
+
+    def saveSnapshot(self):
+        """
+        Saves the job states, called between refreshes so no monitor is
+        changed while it is saved.
+        """
+        self.snapshotDirty = False
+        try:
+            with instrumentation().phase("snapshot save"):
+                self.snapshot.save(self.monitors)
+        except (IOError, OSError), e:
+            print "Failed to save job states to %s: %s" % (self.snapshot.filename, e)
+
+    def restoreHistory(self):
+        histories = self.historyStore.load()
+        for monitor in self.monitors:
+            if monitor.serverurl in histories:
+                try:
+                    monitor.history.restore(histories[monitor.serverurl])
+                except (ValueError, KeyError, TypeError), e:
+                    print "Failed to restore the job history of %s: %s" % (monitor.serverurl, e)
+
+    def saveHistory(self):
+        try:
+            with instrumentation().phase("history save"):
+                self.historyStore.save(self.monitors)
+        except (IOError, OSError), e:
+            print "Failed to save job histories to %s: %s" % (self.historyStore.filename, e)
+
+    def isFlaky(self, monitor, job):
+        """
+        Whether the state of job changes more often than flakyFlipsPerDay.
+        """
+        return self.flakyFlipsPerDay is not None and monitor.history.isFlaky(job.name, self.flakyFlipsPerDay)
+
+    def applyJobEvent(self, event):
+        """
+        Shows the state of a job reported by the webhook right away, unless
+        its monitor is being refreshed in the background.
+        """
+        if self.refreshing:
+            self.pendingEvents.append(event)
+            return
+        monitor = self.monitorForEvent(event)
+        if monitor is None:
+            return
+        changes = monitor.applyEvent(event)
+        if changes:
+            self.updateUiFromMonitors([], [(monitor, changes)])
+        instrumentation().record("event to icon", time.time() - event.received)
+
+    def monitorForEvent(self, event):
+        """
+        The monitor of the server the job of event belongs to, by the url of
+        its build or, if that is missing, by the job name.
+        """
+        if event.jobUrl is not None:
+            for monitor in self.monitors:
+                if event.jobUrl.startswith(monitor.serverurl.rstrip("/") + "/"):
+                    return monitor
+            return None
+        for monitor in self.monitors:
+            if monitor.findJob(event.name) is not None:
+                return monitor
+        return None
+
+    def updateWebhookReceiver(self, settings):
+        """
+        Starts, moves or stops the webhook receiver as configured by
+        webhookPort and webhookBind.
+        """
+        port = settings.get("webhookPort")
+        address = (settings.get("webhookBind", "localhost"), port) if port is not None else None
+        if address == self.webhookAddress:
+            return
+        self.stopWebhookReceiver()
+        if address is not None:
+            try:
+                self.webhookReceiver = WebhookReceiver(self.jobEventReceived.emit, address)
+            except IOError, e:
+                print "Failed to listen for job events on %s:%s - %s" % (address[0], address[1], e)
+                return
+            self.webhookReceiver.start()
+            self.webhookAddress = address
+
+    def stopWebhookReceiver(self):
+        if self.webhookReceiver is not None:
+            self.webhookReceiver.stop()
+            self.webhookReceiver = None
+        self.webhookAddress = None
+
+    def scheduleRefresh(self):
+        # the running refresh schedules the next one from refreshCycleFinished
+        if self.refreshing:
+            return
+        nextDueIn = self.scheduler.nextDueIn()
+        if nextDueIn is not None:
+            self.timer.start(int(nextDueIn * 1000))
 
     def aboutApp(self):
         QtGui.QMessageBox.about(None,
@@ -102,123 +334,146 @@ class JenkinsTray(QtCore.QObject):
         QtGui.QMessageBox.aboutQt(None, "About Qt")
 
     def updateFromSettings(self, settings):
-        self.timer.setInterval(settings["refreshInterval"] * 1000)
+        """
+        Configures the monitors from settings. Must not run while the
+        monitors refresh in the background, as it changes their jobs and
+        setAutoMonitor drops jobs from the lists the refresh updates, see
+        applySettings.
+        """
+        assert not self.refreshing, "settings applied during a refresh"
+        self.settings = settings
+        self.updateWebhookReceiver(settings)
+        interval = settings["refreshInterval"]
+        if self.webhookReceiver is not None:
+            # job events keep the states current, polls only catch up with missed ones
+            interval = max(interval, settings.get("reconcileInterval", DEFAULT_RECONCILE_INTERVAL))
+        self.scheduler.configure(interval, settings.get("maxRefreshInterval"), settings.get("refreshJitter", DEFAULT_JITTER))
         self.notificationTimeout = settings["notificationTimeout"] * 1000
+        self.flakyFlipsPerDay = settings.get("flakyFlipsPerDay")
+        self.refreshEngine.timeout = settings.get("serverTimeout", DEFAULT_TIMEOUT)
         for server in settings["servers"]:
-            match = filter(lambda monitor: monitor.serverurl == server["url"], self.monitors)
-            monitor = None
-            if match:
-                monitor = match[0]
-            else:
+            monitor = self.monitorForUrl(server["url"])
+            if monitor is None:
                 monitor = JenkinsMonitor(server["url"])
                 self.monitors.append(monitor)
-            for job in server["jobs"]:
-                monitorjobmatches = filter(lambda monitorjob: monitorjob.name == job["name"], monitor.allJobs())
-                if monitorjobmatches:
-                    monitorjob = monitorjobmatches[0]
+                self.monitorsByUrl[monitor.serverurl] = monitor
+            self.scheduler.add(monitor, server.get("refreshInterval"))
+            monitor.folderDepth = server.get("folderDepth", settings.get("folderDepth", DEFAULT_FOLDER_DEPTH))
+            monitored = set(server["monitored"])
+            for job in monitor.allJobs():
+                if job.name in monitored:
+                    job.enableMonitoring()
+                    if job.state != JenkinsState.Unknown:
+                        monitor.history.record(job.name, job.state)
                 else:
-                    monitorjob = JenkinsJob(job["name"], job["monitored"], "Unknown", JenkinsState.Unknown)
-                    monitor.jobs.append(monitorjob)
-                if job["monitored"]:
-                    monitorjob.enableMonitoring()
-                else:
-                    monitorjob.disableMonitoring()
+                    job.disableMonitoring()
+            for name in server["monitored"]:
+                if monitor.findJob(name) is None:
+                    monitor.jobs.append(JenkinsJob(name, True, "Unknown", JenkinsState.Unknown))
+                    monitor.invalidateCache()
+            rules = server.get("autoMonitor", settings.get("autoMonitor"))
+            if rules != self.autoMonitorRules.get(monitor.serverurl):
+                self.autoMonitorRules[monitor.serverurl] = rules
+                self.setAutoMonitor(monitor, rules)
+        serverUrls = set(server["url"] for server in settings["servers"])
         for monitor in list(self.monitors):
-            if len(filter(lambda server: monitor.serverurl == server["url"], settings["servers"])) == 0:
+            if monitor.serverurl not in serverUrls:
                 self.monitors.remove(monitor)
+                del self.monitorsByUrl[monitor.serverurl]
+                self.autoMonitorRules.pop(monitor.serverurl, None)
+                self.scheduler.remove(monitor)
+        self.scheduleRefresh()
 
-    def addCountToImage(self, number):
-        painter = QtGui.QPainter(self.image)
-        font = painter.font()
-        maxwidth = self.image.width() - round(self.image.width() * .3)
-        maxheight = self.image.height() - round(self.image.height() * .3)
-        metrics = QtGui.QFontMetrics(font)
-        text = str(number)
-        while metrics.width(text) < maxwidth and metrics.height() < maxheight:
-            font.setPointSize(font.pointSize() + 1)
-            metrics = QtGui.QFontMetrics(font)
-
-        painter.setFont(font)
-        painter.drawText(self.image.rect(), QtCore.Qt.AlignVCenter | QtCore.Qt.AlignCenter, text)
-        painter.end()
-
-    def clearJobActions(self, menu, jobActions):
-        for (_, (action, subActions)) in jobActions.iteritems():
-            if len(subActions) > 0:
-                self.clearJobActions(action.menu(), subActions)
-            menu.removeAction(action)
-
-    def buildJobActions(self, allJobs):
-        serverUrls = set(map(lambda jobAndServer: jobAndServer[0], allJobs))
-        allJobs.sort()
-        if len(serverUrls) > 1:
-            self.jobActionsTree = dict(map(lambda url: (url, (QtGui.QAction(url, self.menu), {})), serverUrls))
-            for jobinfo in allJobs:
-                serverAct = self.jobActionsTree[jobinfo[0]][0]
-                if serverAct.menu() is None:
-                    serverAct.setMenu(QtGui.QMenu(self.menu))
-                self.jobActionsTree[jobinfo[0]][1][jobinfo[1]] = (self.createAction(jobinfo[0], jobinfo[1], serverAct.menu()), {})
-        else:
-            for jobinfo in allJobs:
-                self.jobActionsTree[jobinfo[1]] = (self.createAction(jobinfo[0], jobinfo[1], self.menu), {})
-
-    def iconNameForJobState(self, jobState):
-        if jobState == JenkinsState.Failed:
-            return ":///images/jenkinstray_failed.png"
-        elif jobState == JenkinsState.Disabled:
-            return ":///images/jenkinstray_disabled.png"
-        elif jobState == JenkinsState.Unstable:
-            return ":///images/jenkinstray_unstable.png"
-        elif jobState == JenkinsState.Successful:
-            return ":///images/jenkinstray_success.png"
-        else:
-            return ":///images/jenkinstray.png"
+    def setAutoMonitor(self, monitor, rules):
+        """
+        Compiles the autoMonitor rules of a server. The rules only look at
+        jobs added by a refresh, so the unmonitored jobs are dropped to have
+        the next refresh add them again. Only called between refreshes.
+        """
+        try:
+            monitor.autoMonitor = ruleSetFromSettings(rules)
+        except ValueError, e:
+            print "Ignoring the autoMonitor rules of %s: %s" % (monitor.serverurl, e)
+            monitor.autoMonitor = None
+        if monitor.autoMonitor is not None:
+            monitor.jobs.retainNames(set(job.name for job in monitor.monitoredJobs()))
+            monitor.invalidateCache()
+            monitor.lastRefreshed = None
 
-    def createAction(self, serverurl, jobname, menu):
-        job = filter(lambda job: job.name == jobname, filter(lambda monitor: monitor.serverurl == serverurl, self.monitors)[0].jobs)[0]
-        action = QtGui.QAction(QtGui.QIcon(self.iconNameForJobState(job.state)), jobname, menu)
-        action.triggered.connect(lambda: self.activateJobAction(serverurl, jobname))
-        menu.insertAction(self.jobSeparator, action)
-        return action
+    def monitorForUrl(self, serverurl):
+        return self.monitorsByUrl.get(serverurl)
 
     def activateJobAction(self, serverurl, jobname):
-        monitorMatches = filter(lambda monitor: monitor.serverurl == serverurl, self.monitors)
-        if len(monitorMatches) > 0:
-            jobmatches = filter(lambda job: job.name == jobname, monitorMatches[0].monitoredJobs())
-            if len(jobmatches) > 0:
-                QtGui.QDesktopServices.openUrl(QtCore.QUrl.fromEncoded(jobmatches[0].url))
+        monitor = self.monitorForUrl(serverurl)
+        if monitor is not None:
+            job = monitor.findJob(jobname)
+            if job is not None and job.monitored:
+                QtGui.QDesktopServices.openUrl(QtCore.QUrl.fromEncoded(job.url))
 
-    def updateUiFromMonitors(self, errors):
+    def updateUiFromServerInfo(self, errors, changes):
+        """
+        Updates the ui after a refresh, profiled while --profile is active.
+        """
+        if self.profiler is not None:
+            self.profiler.runcall(self.updateUiFromMonitors, errors, changes)
+        else:
+            self.updateUiFromMonitors(errors, changes)
+
+    def updateUiFromMonitors(self, errors, changes):
+        """
+        Updates menu, icon and notifications from the (monitor, JobChanges)
+        tuples in changes. If changes is None, or a server had connectivity
+        problems, the menu is synchronized with all monitored jobs.
+        """
+        timings = instrumentation()
+        if changes:
+            self.snapshotDirty = True
+            if not self.snapshotTimer.isActive():
+                self.snapshotTimer.start()
         failCnt = 0
         unstableCnt = 0
         successfulCnt = 0
         failedjobs = []
         unstablejobs = []
         fixedjobs = []
-        self.clearJobActions(self.menu, self.jobActionsTree)
-        allJobNames = []
-        for monitor in self.monitors:
-            failCnt += monitor.numFailedMonitoredJobs()
-            unstableCnt += monitor.numUnstableMonitoredJobs()
-            successfulCnt += monitor.numSuccessfulMonitoredJobs()
-            for job in monitor.monitoredJobs():
-                allJobNames.append((monitor.serverurl, job.name))
-                if job.lastState != job.state:
-                    if job.state == JenkinsState.Failed and job.lastState in [JenkinsState.Unstable, JenkinsState.Successful]:
+        autoMonitored = False
+        with timings.phase("count"):
+            for monitor in self.monitors:
+                histogram = monitor.monitoredStateHistogram()
+                failCnt += histogram[JenkinsState.Failed]
+                unstableCnt += histogram[JenkinsState.Unstable]
+                successfulCnt += histogram[JenkinsState.Successful]
+        with timings.phase("menu"):
+            if changes is None or len(errors) > 0:
+                self.jobMenu.update((monitor.serverurl, job.name, job.state) for monitor in self.monitors for job in monitor.monitoredJobs())
+            for (monitor, monitorChanges) in changes or []:
+                for job in monitorChanges.removed:
+                    self.jobMenu.removeJob(monitor.serverurl, job.name)
+                for job in monitorChanges.added:
+                    if job.monitored:
+                        self.jobMenu.updateJob(monitor.serverurl, job.name, job.state)
+                        autoMonitored = True
+                for (job, oldState, newState) in monitorChanges.transitions:
+                    if not job.monitored:
+                        continue
+                    self.jobMenu.updateJob(monitor.serverurl, job.name, job.state)
+                    if self.isFlaky(monitor, job):
+                        # flaky jobs would notify about every flip
+                        continue
+                    if newState == JenkinsState.Failed and oldState in [JenkinsState.Unstable, JenkinsState.Successful]:
                         failedjobs.append(job.name)
-                    elif job.state == JenkinsState.Unstable and job.lastState in [JenkinsState.Failed, JenkinsState.Successful]:
+                    elif newState == JenkinsState.Unstable and oldState in [JenkinsState.Failed, JenkinsState.Successful]:
                         unstablejobs.append(job.name)
-                    elif job.state == JenkinsState.Successful and job.lastState in [JenkinsState.Failed, JenkinsState.Unstable]:
+                    elif newState == JenkinsState.Successful and oldState in [JenkinsState.Failed, JenkinsState.Unstable]:
                         fixedjobs.append(job.name)
-        self.buildJobActions(allJobNames)
         if failCnt > 0:
-            self.image = QtGui.QImage(":///images/jenkinstray_failed.png")
+            trayState = JenkinsState.Failed
         elif unstableCnt > 0:
-            self.image = QtGui.QImage(":///images/jenkinstray_unstable.png")
+            trayState = JenkinsState.Unstable
         elif successfulCnt > 0:
-            self.image = QtGui.QImage(":///images/jenkinstray_success.png")
+            trayState = JenkinsState.Successful
         else:
-            self.image = QtGui.QImage(":///images/jenkinstray.png")
+            trayState = JenkinsState.Unknown
         if len(errors) > 0:
             self.trayicon.showMessage("Connectivity Problems", "\n".join(errors), QtGui.QSystemTrayIcon.Critical, self.notificationTimeout)
         elif len(failedjobs) > 0:
@@ -227,11 +482,17 @@ class JenkinsTray(QtCore.QObject):
             self.trayicon.showMessage("Fixed Jobs", "\n".join(fixedjobs), QtGui.QSystemTrayIcon.Information, self.notificationTimeout)
         elif len(unstablejobs) > 0:
             self.trayicon.showMessage("Unstable Jobs", "\n".join(unstablejobs), QtGui.QSystemTrayIcon.Warning, self.notificationTimeout)
-        if failCnt > 0 or unstableCnt > 0:
-            self.addCountToImage(failCnt + unstableCnt)
-        self.trayicon.setIcon(QtGui.QIcon(QtGui.QPixmap.fromImage(self.image)))
+        with timings.phase("icon"):
+            trayIconKey = (trayState, failCnt + unstableCnt)
+            if trayIconKey != self.trayIconKey:
+                self.trayIconKey = trayIconKey
+                self.trayicon.setIcon(self.iconCache.trayIcon(*trayIconKey))
         self.trayicon.setToolTip("%s failed jobs\n%s unstable jobs\n%s successful jobs" % (failCnt, unstableCnt, successfulCnt))
+        if autoMonitored:
+            # jobs monitored by the rules are saved like the ones checked in the settings
+            self.writeSettings(self.createSettingsFromMonitors())
         if "--debug-memory" in sys.argv:
+            import mem
             global last_histogram
             if last_histogram is None:
                 last_histogram = mem.gc_histogram()
@@ -241,17 +502,16 @@ class JenkinsTray(QtCore.QObject):
                 last_histogram = new_histogram
 
     def readSettings(self):
-        try:
-            return json.load(open(os.path.join(self.cfgDir, CONFIG_FILENAME), "r"))
-        except:
-            return {"refreshInterval": 60, "servers": [], "notificationTimeout": 10}
+        return self.settingsStore.settings()
 
     def openSettings(self):
+        # the dialog and uic are only loaded once they are needed
+        from settings import SettingsWidget
         dialog = QtGui.QDialog()
         layout = QtGui.QVBoxLayout(dialog)
         dialog.setWindowTitle("Jenkins Tray Settings")
-        settingsdata = self.createSettingsFromMonitors()
-        settingswidget = SettingsWidget(dialog, settingsdata)
+        settingsdata = self.createDialogSettings()
+        settingswidget = SettingsWidget(dialog, settingsdata, self.freshJobNames())
         layout.addWidget(settingswidget)
         buttonbox = QtGui.QDialogButtonBox(QtGui.QDialogButtonBox.StandardButtons(QtGui.QDialogButtonBox.Ok | QtGui.QDialogButtonBox.Cancel), QtCore.Qt.Horizontal, dialog)
         layout.addWidget(buttonbox)
@@ -259,25 +519,57 @@ class JenkinsTray(QtCore.QObject):
         buttonbox.rejected.connect(dialog.reject)
         dialog.setModal(True)
         if dialog.exec_() == QtGui.QDialog.Accepted:
-            self.writeSettings(settingsdata)
-            self.updateFromSettings(settingsdata)
+            settings = compactSettings(settingsdata)
+            self.writeSettings(settings)
+            self.applySettings(settings)
+
+    def applySettings(self, settings):
+        """
+        Applies settings from the settings dialog, held back until the
+        running refresh finished as they change the monitors and their jobs.
+        """
+        if self.refreshing:
+            self.pendingSettings = settings
+            return
+        self.updateFromSettings(settings)
+        self.updateUiFromMonitors([], None)
 
     def writeSettings(self, settings):
-        if not os.path.exists(self.cfgDir):
-            os.makedirs(self.cfgDir)
-        json.dump(settings, open(os.path.join(self.cfgDir, CONFIG_FILENAME), "w"), indent=4, separators=(",", ": "))
+        """
+        Saves settings once no further changes followed for SAVE_DELAY.
+        """
+        self.settingsStore.requestSave(settings)
+        self.saveTimer.start()
 
     def createSettingsFromMonitors(self):
-        return {
-                "refreshInterval": int(self.timer.interval() / 1000),
-                "notificationTimeout": int(self.notificationTimeout / 1000),
-                "servers": map(lambda monitor: {
-                                                "url": monitor.serverurl,
-                                                "jobs": map(lambda job: {
-                                                                         "name": job.name,
-                                                                         "monitored": job.monitored
-                                                                        },
-                                                            monitor.allJobs())
-                                               },
-                               self.monitors)
-               }
+        """
+        Settings as read from the configuration, with the monitored jobs
+        taken from the monitors.
+        """
+        settings = dict(self.settings)
+        serverSettings = dict((server["url"], server) for server in self.settings["servers"])
+        settings["servers"] = [dict(serverSettings.get(monitor.serverurl, {}),
+                                    url=monitor.serverurl,
+                                    monitored=[job.name for job in monitor.monitoredJobs()])
+                               for monitor in self.monitors]
+        return settings
+
+    def freshJobNames(self):
+        """
+        Returns a dict of server url -> job names for the servers refreshed
+        within their current polling interval.
+        """
+        now = time.time()
+        return dict((monitor.serverurl, [job.name for job in monitor.allJobs()]) for monitor in self.monitors
+                    if monitor.lastRefreshed is not None and now - monitor.lastRefreshed < self.scheduler.currentInterval(monitor))
+
+    def createDialogSettings(self):
+        """
+        Settings for the settings dialog, listing every known job of each
+        server with its monitoring flag.
+        """
+        settings = self.createSettingsFromMonitors()
+        for server in settings["servers"]:
+            del server["monitored"]
+            server["jobs"] = [{"name": job.name, "monitored": job.monitored} for job in self.monitorForUrl(server["url"]).allJobs()]
+        return settings
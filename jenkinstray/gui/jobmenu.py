@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from PyQt4 import QtGui
+import bisect
+
+class JobMenu(object):
+    """
+    Maintains one action per monitored (serverurl, jobname) in the tray menu.
+    update() synchronizes the menu with all monitored jobs, updateJob() and
+    removeJob() apply single changes. Only the actions whose job appeared,
+    vanished or changed its state are created, removed or get a new icon.
+    With jobs from more than one server the actions are grouped into a
+    submenu per server.
+    """
+    def __init__(self, menu, separator, iconForState, activate):
+        self.menu = menu
+        self.separator = separator
+        self.iconForState = iconForState
+        self.activate = activate
+        self.grouped = False
+        # (serverurl, jobname) -> [action, state]
+        self.jobActions = {}
+        # serverurl -> (action, sorted list of keys in its submenu)
+        self.serverActions = {}
+        # sorted keys of the actions in the top-level menu, (serverurl, jobname)
+        # tuples or serverurls if grouped
+        self.topLevelKeys = []
+        # serverurl -> number of job actions
+        self.jobsPerServer = {}
+        self.actionsCreated = 0
+        self.actionsRemoved = 0
+
+    def update(self, jobs):
+        """
+        Updates the menu from an iterable of (serverurl, jobname, state) for
+        all monitored jobs.
+        """
+        states = dict(((serverurl, jobname), state) for (serverurl, jobname, state) in jobs)
+        self._setGrouped(len(set(serverurl for (serverurl, _) in states)) > 1)
+        for key in [key for key in self.jobActions if key not in states]:
+            self._removeJobAction(key)
+        for (key, state) in states.iteritems():
+            self._updateJobAction(key, state)
+
+    def updateJob(self, serverurl, jobname, state):
+        """
+        Adds the action for a job or updates its state.
+        """
+        key = (serverurl, jobname)
+        if key not in self.jobActions and serverurl not in self.jobsPerServer:
+            self._setGrouped(len(self.jobsPerServer) > 0)
+        self._updateJobAction(key, state)
+
+    def removeJob(self, serverurl, jobname):
+        key = (serverurl, jobname)
+        if key in self.jobActions:
+            self._removeJobAction(key)
+            self._setGrouped(len(self.jobsPerServer) > 1)
+
+    def clear(self):
+        for key in list(self.jobActions):
+            self._removeJobAction(key)
+
+    def _setGrouped(self, grouped):
+        if grouped != self.grouped:
+            states = dict((key, state) for (key, (_, state)) in self.jobActions.iteritems())
+            self.clear()
+            self.grouped = grouped
+            for (key, state) in states.iteritems():
+                self._addJobAction(key, state)
+
+    def _updateJobAction(self, key, state):
+        entry = self.jobActions.get(key)
+        if entry is None:
+            self._addJobAction(key, state)
+        elif entry[1] != state:
+            entry[0].setIcon(self.iconForState(state))
+            entry[1] = state
+
+    def _addJobAction(self, key, state):
+        (serverurl, jobname) = key
+        if self.grouped:
+            if serverurl not in self.serverActions:
+                serverAction = QtGui.QAction(serverurl, self.menu)
+                serverAction.setMenu(QtGui.QMenu(self.menu))
+                self.actionsCreated += 1
+                self.serverActions[serverurl] = (serverAction, [])
+                self._insertSorted(self.menu, self.topLevelKeys, serverurl, serverAction, self.separator, self.serverActions)
+            (serverAction, keys) = self.serverActions[serverurl]
+            menu = serverAction.menu()
+        else:
+            (menu, keys) = (self.menu, self.topLevelKeys)
+        action = QtGui.QAction(self.iconForState(state), jobname, menu)
+        action.triggered.connect(lambda: self.activate(serverurl, jobname))
+        self.actionsCreated += 1
+        self.jobActions[key] = [action, state]
+        self.jobsPerServer[serverurl] = self.jobsPerServer.get(serverurl, 0) + 1
+        self._insertSorted(menu, keys, key, action, self.separator if menu is self.menu else None, self.jobActions)
+
+    def _removeJobAction(self, key):
+        (action, _) = self.jobActions.pop(key)
+        serverurl = key[0]
+        self.jobsPerServer[serverurl] -= 1
+        if self.jobsPerServer[serverurl] == 0:
+            del self.jobsPerServer[serverurl]
+        if self.grouped:
+            (serverAction, keys) = self.serverActions[serverurl]
+            self._removeSorted(serverAction.menu(), keys, key, action)
+            if len(keys) == 0:
+                del self.serverActions[serverurl]
+                self._removeSorted(self.menu, self.topLevelKeys, serverurl, serverAction)
+                serverAction.menu().deleteLater()
+        else:
+            self._removeSorted(self.menu, self.topLevelKeys, key, action)
+
+    def _insertSorted(self, menu, keys, key, action, fallback, actions):
+        idx = bisect.bisect_left(keys, key)
+        before = actions[keys[idx]][0] if idx < len(keys) else fallback
+        keys.insert(idx, key)
+        if before is None:
+            menu.addAction(action)
+        else:
+            menu.insertAction(before, action)
+
+    def _removeSorted(self, menu, keys, key, action):
+        del keys[bisect.bisect_left(keys, key)]
+        menu.removeAction(action)
+        action.deleteLater()
+        self.actionsRemoved += 1
@@ -13,16 +13,15 @@ You can pass a number to memory and it will be subtracted from the returned
 value.
 '''
 
-import gc, os
+import gc, os, sys
 
 
 def get_memory():
     'Return memory usage in bytes'
-    from calibre.constants import iswindows, islinux
     import psutil
     p = psutil.Process(os.getpid())
-    mem = p.get_ext_memory_info()
-    attr = 'wset' if iswindows else 'data' if islinux else 'rss'
+    mem = p.memory_info() if hasattr(p, 'memory_info') else p.get_ext_memory_info()
+    attr = 'wset' if sys.platform.startswith('win') else 'data' if sys.platform.startswith('linux') else 'rss'
     return getattr(mem, attr)
 
 def memory(since=0.0):
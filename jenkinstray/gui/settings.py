@@ -24,86 +24,168 @@
 
 from PyQt4 import QtCore, QtGui, uic
 from PyQt4.Qt import QProgressDialog
-from threading import Thread
-import traceback
-from ..jenkinsmonitor import JenkinsMonitor
+from ..discovery import JobDiscovery, mergeJobs
+from ..refreshengine import DEFAULT_TIMEOUT
+from ..crawler import DEFAULT_FOLDER_DEPTH
 
 class ServerListModel(QtGui.QStringListModel):
     pass
 
-class JobListModel(QtGui.QStringListModel):
-    def __init__(self, jobs, parent):
-        QtGui.QStringListModel.__init__(self, map(lambda x: x["name"], jobs), parent)
+# rows handed to the job list view at once while it is scrolled
+FETCH_BATCH_SIZE = 256
+
+class JobListModel(QtCore.QAbstractListModel):
+    """
+    Lists the {"name": ..., "monitored": ...} dicts of the jobs of a server
+    with a check box each, working on the dicts directly. Only jobs whose
+    name contains the filter text are listed, and the rows are handed to the
+    view in batches as it is scrolled.
+    """
+    def __init__(self, parent, jobs=None):
+        QtCore.QAbstractListModel.__init__(self, parent)
+        self.jobs = []
+        self.lowerNames = []
+        self.filterText = ""
+        # indexes of the jobs matching the filter
+        self.rows = []
+        self.fetched = 0
+        self.setJobs(jobs or [])
+
+    def setJobs(self, jobs):
+        self.beginResetModel()
         self.jobs = jobs
+        self.lowerNames = [job["name"].lower() for job in jobs]
+        self._applyFilter()
+        self.endResetModel()
+
+    def setFilter(self, text):
+        self.beginResetModel()
+        self.filterText = text.lower()
+        self._applyFilter()
+        self.endResetModel()
+
+    def _applyFilter(self):
+        if self.filterText:
+            self.rows = [idx for (idx, name) in enumerate(self.lowerNames) if self.filterText in name]
+        else:
+            self.rows = range(len(self.jobs))
+        self.fetched = min(FETCH_BATCH_SIZE, len(self.rows))
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self.fetched
 
-    def data(self, idx, role):
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self.fetched < len(self.rows)
+
+    def fetchMore(self, parent):
+        count = min(FETCH_BATCH_SIZE, len(self.rows) - self.fetched)
+        if parent.isValid() or count <= 0:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), self.fetched, self.fetched + count - 1)
+        self.fetched += count
+        self.endInsertRows()
+
+    def job(self, idx):
+        return self.jobs[self.rows[idx.row()]]
+
+    def data(self, idx, role=QtCore.Qt.DisplayRole):
         """
         :type idx: QtCore.QModelIndex
         :type role: QtCore.Qt.ItemDataRole
         """
-        if role == QtCore.Qt.CheckStateRole:
-            return QtCore.Qt.Checked if self.jobs[idx.row()]["monitored"] else QtCore.Qt.Unchecked
-        else:
-            return QtGui.QStringListModel.data(self, idx, role)
+        if not idx.isValid():
+            return None
+        if role == QtCore.Qt.DisplayRole:
+            return self.job(idx)["name"]
+        elif role == QtCore.Qt.CheckStateRole:
+            return QtCore.Qt.Checked if self.job(idx)["monitored"] else QtCore.Qt.Unchecked
+        return None
 
-    def setData(self, idx, data, role):
+    def setData(self, idx, data, role=QtCore.Qt.EditRole):
         """
         :type idx: QtCore.QModelIndex
         :type data: QtCore.QVariant
         :type role: QtCore.Qt.ItemDataRole
         """
-        if role == QtCore.Qt.CheckStateRole:
-            self.jobs[idx.row()]["monitored"] = True if data == QtCore.Qt.Checked else False
+        if role == QtCore.Qt.CheckStateRole and idx.isValid():
+            self.job(idx)["monitored"] = data == QtCore.Qt.Checked
+            self.dataChanged.emit(idx, idx)
             return True
-        else:
-            return QtGui.QStringListModel.setData(self, idx, data, role)
+        return False
+
+    def setAllMonitored(self, monitored):
+        """
+        Sets the monitoring flag of all jobs matching the filter, including
+        the ones not fetched by the view yet.
+        """
+        jobs = self.jobs
+        for row in self.rows:
+            jobs[row]["monitored"] = monitored
+        if self.fetched > 0:
+            self.dataChanged.emit(self.index(0), self.index(self.fetched - 1))
 
     def flags(self, idx):
         return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsUserCheckable
 
-def loadJobs(settingsWidget, serverurl):
-    try:
-        monitor = JenkinsMonitor(serverurl)
-        monitor.refreshFromServer()
-        settingsWidget.jobsReceived.emit(serverurl, map(lambda job: {"name": job.name,
-                                                                     "monitored": False}, monitor.jobs))
-    except Exception, e:
-        settingsWidget.jobLoadFailed.emit(serverurl, traceback.format_exc())
+_settingsFormClass = None
+
+def settingsFormClass():
+    """
+    The form class generated from settings.ui, compiled on first use and
+    shared by all settings dialogs.
+    """
+    global _settingsFormClass
+    if _settingsFormClass is None:
+        uiFile = QtCore.QFile(":///gui/settings.ui")
+        uiFile.open(QtCore.QIODevice.ReadOnly)
+        try:
+            (_settingsFormClass, baseClass) = uic.loadUiType(uiFile)
+        finally:
+            uiFile.close()
+    return _settingsFormClass
 
 class SettingsWidget(QtGui.QWidget):
 
-    jobsReceived = QtCore.pyqtSignal(str, list)
-    jobLoadFailed = QtCore.pyqtSignal(str, str)
+    # emitted from the discovery threads with the server url, the job names
+    # and an error message, which is empty if the job list was loaded
+    serverDiscovered = QtCore.pyqtSignal(str, list, str)
 
-    def __init__(self, parent, settingsobj):
+    def __init__(self, parent, settingsobj, freshJobs=None):
+        """
+        freshJobs maps server urls to the job names the tray fetched
+        recently, these servers are not asked again by Refresh All.
+        """
         QtGui.QWidget.__init__(self, parent)
         self.settings = settingsobj
-        self.uiFile = QtCore.QFile(":///gui/settings.ui")
-        self.uiFile.open(QtCore.QIODevice.ReadOnly)
-        uic.loadUi(self.uiFile, self)
-        self.refreshInterval.setValue(self.settings["refreshInterval"])
-        self.refreshInterval.valueChanged.connect(self.updateRefreshInterval)
-        self.hideNotificationTimeout.setValue(self.settings["notificationTimeout"])
-        self.hideNotificationTimeout.valueChanged.connect(self.updateNotificationTimeout)
+        self.freshJobs = freshJobs or {}
+        self.ui = settingsFormClass()()
+        self.ui.setupUi(self)
+        self.ui.refreshInterval.setValue(self.settings["refreshInterval"])
+        self.ui.refreshInterval.valueChanged.connect(self.updateRefreshInterval)
+        self.ui.hideNotificationTimeout.setValue(self.settings["notificationTimeout"])
+        self.ui.hideNotificationTimeout.valueChanged.connect(self.updateNotificationTimeout)
+        self.jobModel = JobListModel(self)
+        self.ui.jobList.setUniformItemSizes(True)
+        self.ui.jobList.setModel(self.jobModel)
+        self.ui.jobFilter.textChanged.connect(self.jobModel.setFilter)
         self.refreshModel()
-        self.addServerBtn.clicked.connect(self.addServer)
-        self.removeServerBtn.clicked.connect(self.removeServer)
-        self.checkAllBtn.clicked.connect(lambda: self.changeAllJobsCheckState(QtCore.Qt.Checked))
-        self.checkNoneBtn.clicked.connect(lambda: self.changeAllJobsCheckState(QtCore.Qt.Unchecked))
+        self.ui.addServerBtn.clicked.connect(self.addServer)
+        self.ui.removeServerBtn.clicked.connect(self.removeServer)
+        self.ui.refreshAllBtn.clicked.connect(self.refreshAllServers)
+        self.ui.checkAllBtn.clicked.connect(lambda: self.changeAllJobsCheckState(QtCore.Qt.Checked))
+        self.ui.checkNoneBtn.clicked.connect(lambda: self.changeAllJobsCheckState(QtCore.Qt.Unchecked))
 
     def changeAllJobsCheckState(self, newCheckState):
-        model = self.jobList.model()
-        for i in range(0, model.rowCount(QtCore.QModelIndex())):
-            idx = model.index(i, 0, QtCore.QModelIndex())
-            model.setData(idx, newCheckState, QtCore.Qt.CheckStateRole)
-        model.dataChanged.emit(model.index(0, 0, QtCore.QModelIndex()), model.index(model.rowCount() - 1, 0, QtCore.QModelIndex()))
+        self.jobModel.setAllMonitored(newCheckState == QtCore.Qt.Checked)
 
-    def reportError(self, serverurl, error):
-        QtGui.QMessageBox.critical(self, "Error loading job list", "Failed to fetch job list for %s: %s." % (serverurl, error))
+    def reportErrors(self, errors):
+        QtGui.QMessageBox.critical(self, "Error loading job list", "Failed to fetch the job list of:\n%s" % "\n".join(errors))
 
-    def addJobs(self, serverurl, joblist):
-        server = filter(lambda server: server["url"] == serverurl, self.settings["servers"])[0]
-        server["jobs"] = joblist
+    def serverForUrl(self, serverurl):
+        for server in self.settings["servers"]:
+            if server["url"] == serverurl:
+                return server
+        return None
 
     def addServer(self):
         dlg = QtGui.QInputDialog(self)
@@ -118,42 +200,79 @@ class SettingsWidget(QtGui.QWidget):
             self.refreshModel(serverurl)
 
     def fetchJobs(self, serverurl):
+        if not self.discoverJobs([serverurl]):
+            self.settings["servers"].remove(self.serverForUrl(serverurl))
+
+    def refreshAllServers(self):
+        selection = self.ui.serverList.selectionModel().selectedRows()
+        selectedServer = selection[0].data() if len(selection) > 0 else None
+        self.discoverJobs([server["url"] for server in self.settings["servers"]], self.freshJobs)
+        self.refreshModel(selectedServer)
+
+    def discoverJobs(self, serverurls, knownJobs=None):
+        """
+        Loads the job lists of serverurls concurrently while showing the
+        progress per server and merges them into the settings. Servers in
+        knownJobs are taken from there. Returns False if it was cancelled.
+        """
+        servers = dict((server["url"], server) for server in self.settings["servers"])
+        # the jobs of the same folders the tray monitors are listed
+        folderDepths = dict((server["url"], server.get("folderDepth", self.settings.get("folderDepth", DEFAULT_FOLDER_DEPTH)))
+                            for server in self.settings["servers"])
         dlg = QProgressDialog(self)
-        dlg.setLabelText("Loading job information from server %s" % serverurl)
-        dlg.setMaximum(0)
-        self.jobsReceived.connect(self.addJobs)
-        self.jobLoadFailed.connect(self.reportError)
-        self.jobsReceived.connect(dlg.accept)
-        self.jobLoadFailed.connect(dlg.accept)
-        thread = Thread(target=lambda: loadJobs(self, serverurl))
-        thread.start()
-        dlg.exec_()
-        self.jobLoadFailed.disconnect()
-        self.jobsReceived.disconnect()
-        if dlg.wasCanceled():
-            server = filter(lambda server: server["url"] == serverurl, self.settings["servers"])[0]
-            self.settings["servers"].remove(server)
+        dlg.setWindowTitle("Loading Jobs")
+        dlg.setLabelText("Loading the job lists of %d servers" % len(serverurls))
+        dlg.setAutoClose(False)
+        dlg.setAutoReset(False)
+        dlg.setMinimumDuration(0)
+        dlg.setMaximum(len(serverurls))
+        dlg.setValue(0)
+        errors = []
+        def serverDone(serverurl, names, error):
+            if error:
+                errors.append("%s: %s" % (serverurl, error))
+            else:
+                server = servers[serverurl]
+                server["jobs"] = mergeJobs(server["jobs"], names)
+            dlg.setValue(dlg.value() + 1)
+            dlg.setLabelText("Loaded %d of %d job lists, last from %s" % (dlg.value(), len(serverurls), serverurl))
+            if dlg.value() == len(serverurls):
+                dlg.accept()
+        self.serverDiscovered.connect(serverDone)
+        discovery = JobDiscovery(serverurls,
+                                 lambda serverurl, names, error: self.serverDiscovered.emit(serverurl, names or [], "" if error is None else str(error)),
+                                 knownJobs, folderDepths, timeout=self.settings.get("serverTimeout", DEFAULT_TIMEOUT))
+        dlg.canceled.connect(discovery.cancel)
+        discovery.start()
+        if dlg.value() < len(serverurls):
+            dlg.exec_()
+        # job lists still being loaded are dropped
+        discovery.cancel()
+        self.serverDiscovered.disconnect(serverDone)
+        if len(errors) > 0:
+            self.reportErrors(errors)
+        return not dlg.wasCanceled()
 
     def removeServer(self):
-        selection = self.serverList.selectionModel().selectedRows()
+        selection = self.ui.serverList.selectionModel().selectedRows()
         for idx in selection:
             del self.settings["servers"][idx.row()]
             self.refreshModel()
             self.enableSelectionBasedButtons(False)
 
     def refreshModel(self, selectServer=None):
-        self.serverList.setModel(ServerListModel(map(lambda x: x["url"], self.settings["servers"]), self.serverList))
-        self.serverList.selectionModel().selectionChanged.connect(self.serverSelected)
+        self.ui.serverList.setModel(ServerListModel(map(lambda x: x["url"], self.settings["servers"]), self.ui.serverList))
+        self.ui.serverList.selectionModel().selectionChanged.connect(self.serverSelected)
         if selectServer is not None:
             row = -1
             for i in range(len(self.settings["servers"])):
                 if self.settings["servers"][i]["url"] == selectServer:
                     row = i
             if row != -1:
-                model = self.serverList.model()
-                self.serverList.selectionModel().select(model.index(row, 0, QtCore.QModelIndex()), QtGui.QItemSelectionModel.ClearAndSelect)
+                model = self.ui.serverList.model()
+                self.ui.serverList.selectionModel().select(model.index(row, 0, QtCore.QModelIndex()), QtGui.QItemSelectionModel.ClearAndSelect)
         else:
-            self.jobList.setModel(None)
+            self.jobModel.setJobs([])
 
     def updateRefreshInterval(self, val):
         self.settings["refreshInterval"] = val
@@ -169,14 +288,13 @@ class SettingsWidget(QtGui.QWidget):
         if len(selected.indexes()) > 0:
             idx = selected.indexes()[0]
             self.enableSelectionBasedButtons(True)
-            serverUrl = idx.data()
-            server = filter(lambda x: x["url"] == serverUrl, self.settings["servers"])[0]
-            self.jobList.setModel(JobListModel(server["jobs"], self.jobList))
+            # the rows of the server list are the servers of the settings
+            self.jobModel.setJobs(self.settings["servers"][idx.row()]["jobs"])
         else:
             self.enableSelectionBasedButtons(False)
-            self.jobList.setModel(None)
+            self.jobModel.setJobs([])
 
     def enableSelectionBasedButtons(self, enable):
-            self.removeServerBtn.setEnabled(enable)
-            self.checkAllBtn.setEnabled(enable)
-            self.checkNoneBtn.setEnabled(enable)
+            self.ui.removeServerBtn.setEnabled(enable)
+            self.ui.checkAllBtn.setEnabled(enable)
+            self.ui.checkNoneBtn.setEnabled(enable)
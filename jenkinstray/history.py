@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Bounded history of the states of the monitored jobs, used to tell flaky
+jobs from broken ones. The states and times of all jobs of a server share
+a few flat arrays with a fixed size ring per job, so the arrays of a server
+take at most maxJobs * (5 * capacity + 4) bytes no matter how long the tray
+runs.
+"""
+
+from jenkinsjob import JenkinsState
+from settingsstore import writeFileAtomically
+from array import array
+import base64
+import json
+import os
+import time
+import zlib
+
+# state changes remembered per job
+HISTORY_CAPACITY = 32
+# jobs per server with a history, the ones changed longest ago make room
+MAX_HISTORY_JOBS = 2048
+HISTORY_VERSION = 1
+SECONDS_PER_DAY = 24 * 60 * 60
+
+class StateHistory(object):
+    """
+    The last capacity state changes of up to maxJobs jobs. Slot i of the
+    states and times arrays holds entries i * capacity up to (i + 1) *
+    capacity - 1 of the ring of the job in names[i], heads[i] is the
+    position written next and counts[i] the number of entries. Times are
+    whole seconds.
+    """
+    def __init__(self, capacity=HISTORY_CAPACITY, maxJobs=MAX_HISTORY_JOBS):
+        assert capacity > 0 and maxJobs > 0
+        self.capacity = capacity
+        self.maxJobs = maxJobs
+        self.slots = {}
+        self.names = []
+        self.freeSlots = []
+        self.states = array("b")
+        self.times = array("I")
+        self.heads = array("H")
+        self.counts = array("H")
+
+    def record(self, name, state, when=None):
+        """
+        Appends state to the history of the job name unless it is the state
+        recorded last. Returns True if it was appended.
+        """
+        when = int(when if when is not None else time.time())
+        slot = self._slot(name)
+        capacity = self.capacity
+        base = slot * capacity
+        head = self.heads[slot]
+        count = self.counts[slot]
+        if count > 0 and self.states[base + (head - 1) % capacity] == int(state):
+            return False
+        self.states[base + head] = int(state)
+        self.times[base + head] = when
+        self.heads[slot] = (head + 1) % capacity
+        self.counts[slot] = min(count + 1, capacity)
+        return True
+
+    def entries(self, name):
+        """
+        Returns the (state, time) tuples of the job, oldest first.
+        """
+        slot = self.slots.get(name)
+        if slot is None:
+            return []
+        capacity = self.capacity
+        base = slot * capacity
+        head = self.heads[slot]
+        count = self.counts[slot]
+        positions = [base + (head - count + idx) % capacity for idx in range(count)]
+        return [(JenkinsState(self.states[pos]), self.times[pos]) for pos in positions]
+
+    def forget(self, name):
+        slot = self.slots.pop(name, None)
+        if slot is not None:
+            self.names[slot] = None
+            self.heads[slot] = 0
+            self.counts[slot] = 0
+            self.freeSlots.append(slot)
+
+    def flipsPerDay(self, name, now=None):
+        """
+        The number of state changes per day over the time covered by the
+        history of the job, but at least a day, so a job that just started
+        to be recorded is not flaky after its first change. 0 with less
+        than two entries.
+        """
+        entries = self.entries(name)
+        if len(entries) < 2:
+            return 0.0
+        span = max((now if now is not None else time.time()) - entries[0][1], SECONDS_PER_DAY)
+        return (len(entries) - 1) * float(SECONDS_PER_DAY) / span
+
+    def isFlaky(self, name, maxFlipsPerDay, now=None):
+        """
+        Whether the state of the job changed more often than maxFlipsPerDay.
+        """
+        return self.flipsPerDay(name, now) > maxFlipsPerDay
+
+    def timeInState(self, name, now=None):
+        """
+        Returns a dict of state -> seconds the job spent in it over the time
+        covered by its history.
+        """
+        entries = self.entries(name)
+        now = now if now is not None else time.time()
+        durations = {}
+        for (idx, (state, start)) in enumerate(entries):
+            end = entries[idx + 1][1] if idx + 1 < len(entries) else now
+            durations[state] = durations.get(state, 0) + max(end - start, 0)
+        return durations
+
+    def memoryUsage(self):
+        """
+        Bytes taken by the arrays.
+        """
+        return sum(values.itemsize * len(values) for values in (self.states, self.times, self.heads, self.counts))
+
+    def toDict(self):
+        def encode(values):
+            return base64.b64encode(values.tostring())
+        return {"capacity": self.capacity, "names": self.names, "states": encode(self.states), "times": encode(self.times),
+                "heads": encode(self.heads), "counts": encode(self.counts)}
+
+    def restore(self, dictobj):
+        """
+        Takes over a toDict() of an earlier run, if it was saved with the
+        same capacity. Slots beyond maxJobs are dropped.
+        """
+        if dictobj["capacity"] != self.capacity:
+            return
+        arrays = []
+        for (key, typecode) in [("states", "b"), ("times", "I"), ("heads", "H"), ("counts", "H")]:
+            values = array(typecode)
+            values.fromstring(base64.b64decode(dictobj[key]))
+            arrays.append(values)
+        (states, times, heads, counts) = arrays
+        names = dictobj["names"][:self.maxJobs]
+        numSlots = len(names)
+        if len(states) < numSlots * self.capacity or len(times) < numSlots * self.capacity or len(heads) < numSlots or len(counts) < numSlots:
+            raise ValueError("Truncated history")
+        if any(head >= self.capacity for head in heads) or any(count > self.capacity for count in counts):
+            raise ValueError("Corrupt history")
+        self.states = states[:numSlots * self.capacity]
+        self.times = times[:numSlots * self.capacity]
+        self.heads = heads[:numSlots]
+        self.counts = counts[:numSlots]
+        self.names = names
+        self.slots = dict((name, slot) for (slot, name) in enumerate(names) if name is not None)
+        self.freeSlots = [slot for (slot, name) in enumerate(names) if name is None]
+
+    def _slot(self, name):
+        slot = self.slots.get(name)
+        if slot is not None:
+            return slot
+        if self.freeSlots:
+            slot = self.freeSlots.pop()
+            self.names[slot] = name
+        elif len(self.names) < self.maxJobs:
+            slot = len(self.names)
+            self.names.append(name)
+            self.states.extend([0] * self.capacity)
+            self.times.extend([0] * self.capacity)
+            self.heads.append(0)
+            self.counts.append(0)
+        else:
+            slot = self._oldestSlot()
+            del self.slots[self.names[slot]]
+            self.names[slot] = name
+            self.heads[slot] = 0
+            self.counts[slot] = 0
+        self.slots[name] = slot
+        return slot
+
+    def _oldestSlot(self):
+        capacity = self.capacity
+        def lastChange(slot):
+            return self.times[slot * capacity + (self.heads[slot] - 1) % capacity]
+        return min(xrange(len(self.names)), key=lastChange)
+
+class HistoryStore(object):
+    """
+    Keeps the state histories of all monitors in a zlib compressed file
+    next to the settings.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.writes = 0
+
+    def load(self):
+        """
+        Returns a dict of server url -> StateHistory.toDict() of the saved
+        monitors, empty if there is no usable history.
+        """
+        if not os.path.exists(self.filename):
+            return {}
+        try:
+            with open(self.filename, "rb") as historyfile:
+                dictobj = json.loads(zlib.decompress(historyfile.read()))
+            if dictobj.get("version") != HISTORY_VERSION:
+                return {}
+            return dict((server["url"], server["history"]) for server in dictobj["servers"])
+        except (IOError, zlib.error, ValueError, KeyError, TypeError), e:
+            print "Failed to read job histories from %s: %s" % (self.filename, e)
+            return {}
+
+    def save(self, monitors):
+        servers = [{"url": monitor.serverurl, "history": monitor.history.toDict()} for monitor in monitors]
+        data = json.dumps({"version": HISTORY_VERSION, "servers": servers}, separators=(",", ":"))
+        writeFileAtomically(self.filename, zlib.compress(data))
+        self.writes += 1
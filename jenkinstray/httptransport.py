@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import base64
+import httplib
+import urllib
+import urlparse
+import socket
+import zlib
+import time
+from threading import Lock
+
+MAX_REDIRECTS = 5
+READ_CHUNK_SIZE = 64 * 1024
+
+class HttpError(IOError):
+    def __init__(self, url, code, reason):
+        IOError.__init__(self, "HTTP Error %s: %s (%s)" % (code, reason, url))
+        self.url = url
+        self.code = code
+        self.reason = reason
+
+class HttpResponse(object):
+    """
+    A response whose body is read through read(). Responses returned by
+    HttpTransport.request have the whole body in body already. The
+    connection goes back to the transport once the body was read
+    completely.
+    """
+    def __init__(self, transport, key, connection, url, response):
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.msg
+        self.body = None
+        self._transport = transport
+        self._key = key
+        self._connection = connection
+        self._response = response
+        gzipped = (response.getheader("content-encoding") or "").lower() == "gzip"
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+        self._pending = ""
+        self._finished = False
+
+    def getheader(self, name, default=None):
+        return self.headers.getheader(name, default)
+
+    def read(self, size=-1):
+        """
+        Reads up to size bytes of the decoded body, everything that is left
+        if size is negative. Returns an empty string at the end of the body.
+        """
+        if self._finished:
+            data = self._pending[:size] if size >= 0 else self._pending
+            self._pending = self._pending[len(data):]
+            return data
+        if size < 0:
+            data = self._pending + self._decode(self._response.read(), True)
+            self._pending = ""
+            self._finish()
+            return data
+        while len(self._pending) < size and not self._finished:
+            chunk = self._response.read(READ_CHUNK_SIZE)
+            if chunk:
+                self._pending += self._decode(chunk, False)
+            else:
+                self._pending += self._decode("", True)
+                self._finish()
+        data = self._pending[:size]
+        self._pending = self._pending[size:]
+        return data
+
+    def close(self):
+        """
+        Drops the rest of the body, the connection is closed instead of being
+        reused if the body was not read completely.
+        """
+        if not self._finished:
+            self._finished = True
+            self._connection.close()
+        self._pending = ""
+
+    def _decode(self, data, final):
+        if self._decompressor is None:
+            return data
+        try:
+            data = self._decompressor.decompress(data)
+            if final:
+                data += self._decompressor.flush()
+        except zlib.error, e:
+            self.close()
+            raise IOError("Invalid gzip encoded body from %s: %s" % (self.url, e))
+        return data
+
+    def _finish(self):
+        self._finished = True
+        self._transport._release(self._key, self._connection, self._response)
+
+class HostStats(object):
+    """
+    Number of requests and accumulated latency until the response headers
+    arrived for one host, separately for
+    requests on reused and on newly opened connections.
+    """
+    def __init__(self):
+        self.reusedRequests = 0
+        self.reusedLatency = 0.0
+        self.newRequests = 0
+        self.newLatency = 0.0
+
+    def record(self, reused, latency):
+        if reused:
+            self.reusedRequests += 1
+            self.reusedLatency += latency
+        else:
+            self.newRequests += 1
+            self.newLatency += latency
+
+    def averageLatency(self, reused):
+        if reused:
+            return self.reusedLatency / self.reusedRequests if self.reusedRequests else 0.0
+        return self.newLatency / self.newRequests if self.newRequests else 0.0
+
+    def __repr__(self):
+        return "HostStats(reused=%d/%.1fms, new=%d/%.1fms)" % (self.reusedRequests, self.averageLatency(True) * 1000,
+                                                              self.newRequests, self.averageLatency(False) * 1000)
+
+class HttpTransport(object):
+    """
+    Issues GET requests over persistent connections, keeping one idle
+    keep-alive connection per host. A request on a reused connection that
+    the server closed in the meantime is retried once on a new connection.
+    Responses are requested gzip-encoded and decoded transparently.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        # (scheme, netloc) -> idle connection
+        self.idleConnections = {}
+        # (scheme, netloc) -> HostStats
+        self.hostStats = {}
+
+    def request(self, url, headers=None, timeout=None):
+        """
+        Fetches url and returns a HttpResponse with the whole body read,
+        redirects are followed. Connection problems are passed on as
+        socket.error or httplib.HTTPException.
+        """
+        response = self.open(url, headers, timeout)
+        response.body = response.read()
+        return response
+
+    def open(self, url, headers=None, timeout=None):
+        """
+        Like request, but returns as soon as the response headers arrived,
+        the body has to be read from the returned HttpResponse.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self._open(url, headers, timeout)
+            if response.status not in (301, 302, 303, 307) or response.getheader("location") is None:
+                return response
+            response.read()
+            url = urlparse.urljoin(url, response.getheader("location"))
+        raise HttpError(url, response.status, "Too many redirects")
+
+    def stats(self):
+        """
+        Returns a dict of host -> HostStats.
+        """
+        with self.lock:
+            return dict(("%s://%s" % key, stats) for (key, stats) in self.hostStats.iteritems())
+
+    def close(self):
+        with self.lock:
+            connections = self.idleConnections.values()
+            self.idleConnections.clear()
+        for connection in connections:
+            connection.close()
+
+    def _open(self, url, headers, timeout):
+        parts = urlparse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        requestHeaders = dict(headers or {})
+        requestHeaders["Accept-Encoding"] = "gzip"
+        if parts.scheme == "http":
+            (proxy, proxyAuthorization) = self._proxy(key)
+            if proxy is not None:
+                path = url
+                if proxyAuthorization is not None:
+                    requestHeaders["Proxy-Authorization"] = proxyAuthorization
+        with self.lock:
+            connection = self.idleConnections.pop(key, None)
+        reused = connection is not None
+        start = time.time()
+        try:
+            (connection, response) = self._send(connection or self._connect(key, timeout), path, requestHeaders, timeout)
+        except socket.timeout:
+            raise
+        except (socket.error, httplib.HTTPException):
+            if not reused:
+                raise
+            # the server dropped the idle connection, start over with a new one
+            reused = False
+            start = time.time()
+            (connection, response) = self._send(self._connect(key, timeout), path, requestHeaders, timeout)
+        with self.lock:
+            self.hostStats.setdefault(key, HostStats()).record(reused, time.time() - start)
+        return HttpResponse(self, key, connection, url, response)
+
+    def _release(self, key, connection, response):
+        with self.lock:
+            if response.will_close or key in self.idleConnections:
+                connection.close()
+            else:
+                self.idleConnections[key] = connection
+
+    def _proxy(self, key):
+        """
+        Returns a (netloc, Proxy-Authorization header) tuple for the proxy
+        configured in the environment for the given host, (None, None) if
+        there is none. The header is None unless the proxy url contains
+        credentials.
+        """
+        (scheme, netloc) = key
+        proxy = urllib.getproxies().get(scheme)
+        if proxy is None or urllib.proxy_bypass(netloc.split(":")[0]):
+            return (None, None)
+        (credentials, _, proxy) = (urlparse.urlsplit(proxy).netloc or proxy).rpartition("@")
+        if not credentials:
+            return (proxy, None)
+        return (proxy, "Basic " + base64.b64encode(urllib.unquote(credentials)))
+
+    def _connect(self, key, timeout):
+        (scheme, netloc) = key
+        (proxy, proxyAuthorization) = self._proxy(key)
+        if scheme == "https":
+            if proxy is not None:
+                connection = httplib.HTTPSConnection(proxy, timeout=timeout)
+                connection.set_tunnel(netloc, headers={"Proxy-Authorization": proxyAuthorization} if proxyAuthorization is not None else None)
+                return connection
+            return httplib.HTTPSConnection(netloc, timeout=timeout)
+        elif scheme == "http":
+            return httplib.HTTPConnection(proxy or netloc, timeout=timeout)
+        raise ValueError("Unsupported url scheme: %s" % scheme)
+
+    def _send(self, connection, path, headers, timeout):
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+        except:
+            connection.close()
+            raise
+        return (connection, response)
+
+_sharedTransport = HttpTransport()
+
+def sharedTransport():
+    """
+    The transport used by all monitors unless told otherwise.
+    """
+    return _sharedTransport
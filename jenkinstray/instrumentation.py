@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+
+DEFAULT_WINDOW = 256
+
+class RollingStats(object):
+    """
+    Keeps the last size samples of a measurement.
+    """
+    def __init__(self, size=DEFAULT_WINDOW):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+
+    def percentile(self, percent):
+        """
+        Returns the nearest-rank percentile of the samples, None without
+        samples.
+        """
+        return _nearestRank(sorted(self.samples), percent)
+
+    def percentiles(self, percents=(50, 90, 99)):
+        samples = sorted(self.samples)
+        return dict((percent, _nearestRank(samples, percent)) for percent in percents)
+
+def _nearestRank(samples, percent):
+    if not samples:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(samples))) - 1
+    return samples[min(max(rank, 0), len(samples) - 1)]
+
+class Instrumentation(object):
+    """
+    Collects timings of the phases of a refresh and the latencies of the
+    servers in rolling windows. Recording costs two clock reads and a deque
+    append, so it is always enabled.
+    """
+    def __init__(self, windowSize=DEFAULT_WINDOW):
+        self.windowSize = windowSize
+        self.lock = Lock()
+        self.phases = {}
+        self.serverLatencies = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(name, time.time() - start)
+
+    def record(self, name, seconds):
+        with self.lock:
+            self._stats(self.phases, name).add(seconds)
+
+    def recordServerLatency(self, serverurl, seconds):
+        with self.lock:
+            self._stats(self.serverLatencies, serverurl).add(seconds)
+
+    def phaseCount(self, name):
+        """
+        Returns how often the phase was recorded.
+        """
+        with self.lock:
+            stats = self.phases.get(name)
+            return stats.count if stats is not None else 0
+
+    def phasePercentiles(self, percents=(50, 90, 99)):
+        """
+        Returns a dict of phase name -> {percent: seconds}.
+        """
+        with self.lock:
+            return dict((name, stats.percentiles(percents)) for (name, stats) in self.phases.iteritems())
+
+    def serverPercentiles(self, percents=(50, 90, 99)):
+        """
+        Returns a dict of server url -> {percent: seconds}.
+        """
+        with self.lock:
+            return dict((serverurl, stats.percentiles(percents)) for (serverurl, stats) in self.serverLatencies.iteritems())
+
+    def report(self):
+        lines = ["%-40s %8s %10s %10s %10s" % ("phase/server", "count", "p50", "p90", "p99")]
+        with self.lock:
+            for (title, statsByName) in [("phase", self.phases), ("server", self.serverLatencies)]:
+                for name in sorted(statsByName):
+                    stats = statsByName[name]
+                    percentiles = stats.percentiles()
+                    lines.append("%-40s %8d %8.2fms %8.2fms %8.2fms" % ("%s %s" % (title, name), stats.count,
+                                                                        percentiles[50] * 1000, percentiles[90] * 1000, percentiles[99] * 1000))
+        return "\n".join(lines)
+
+    def _stats(self, statsByName, name):
+        stats = statsByName.get(name)
+        if stats is None:
+            stats = RollingStats(self.windowSize)
+            statsByName[name] = stats
+        return stats
+
+class Profiler(object):
+    """
+    Profiles calls made from any thread with cProfile, every call gets its
+    own profile which are merged when the stats are dumped.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.profiles = []
+
+    def runcall(self, func, *args, **kwargs):
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            with self.lock:
+                self.profiles.append(profile)
+
+    def dump(self, filename, stream=None, limit=40):
+        """
+        Writes the merged stats to filename and prints the most expensive
+        functions to stream if given.
+        """
+        with self.lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            return
+        import pstats
+        stats = pstats.Stats(profiles[0], stream=stream)
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(filename)
+        if stream is not None:
+            stats.sort_stats("cumulative").print_stats(limit)
+
+_instrumentation = Instrumentation()
+
+def instrumentation():
+    """
+    The instrumentation shared by monitors and tray.
+    """
+    return _instrumentation
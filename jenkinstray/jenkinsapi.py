@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from jenkinsjob import JOB_API_FIELDS
+from httptransport import sharedTransport, HttpError
+import urllib
+import json
+import codecs
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def treeQuery(fields=JOB_API_FIELDS, depth=0):
+    """
+    Builds the value for the tree parameter of the jenkins json api that
+    selects only the given fields of each job. For depth > 0 the jobs of
+    folders are selected as well, up to depth levels below the top level.
+    """
+    selection = ",".join(fields)
+    for _ in range(depth):
+        selection = "%s,jobs[%s]" % (",".join(fields), selection)
+    return "jobs[%s]" % selection
+
+def apiUrl(serverurl, tree=None, depth=None):
+    params = []
+    if tree is not None:
+        params.append(("tree", tree))
+    if depth is not None:
+        params.append(("depth", depth))
+    url = serverurl.rstrip("/") + "/api/json"
+    if params:
+        url += "?" + urllib.urlencode(params)
+    return url
+
+def jobListUrl(serverurl, depth=0, since=None):
+    url = apiUrl(serverurl, tree=treeQuery(depth=depth))
+    if since is not None:
+        url += "&" + urllib.urlencode([("since", since)])
+    return url
+
+def openJobList(serverurl, depth=0, timeout=None, etag=None, lastModified=None, transport=None, since=None):
+    """
+    Requests the job list of a jenkins server, restricted to the fields in
+    JOB_API_FIELDS. If etag or lastModified are given the request is made
+    conditional on them. since is the generation of the job list known from
+    a polling daemon, which then answers with the changes made since (see
+    daemon.py), jenkins ignores it. Returns a (response, etag, lastModified)
+    tuple, response is None if the server reported the job list as not
+    modified, otherwise the body still needs to be read from it. Connection
+    problems are passed on to the caller as IOError or HTTPException.
+    """
+    headers = {}
+    if etag is not None:
+        headers["If-None-Match"] = etag
+    if lastModified is not None:
+        headers["If-Modified-Since"] = lastModified
+    response = (transport or sharedTransport()).open(jobListUrl(serverurl, depth, since), headers, timeout)
+    if response.status == 304:
+        response.read()
+        return (None, etag, lastModified)
+    elif response.status != 200:
+        response.close()
+        raise HttpError(response.url, response.status, response.reason)
+    return (response, response.getheader("ETag"), response.getheader("Last-Modified"))
+
+def fetchJobListBody(serverurl, depth=0, timeout=None, etag=None, lastModified=None, transport=None):
+    """
+    Like openJobList, but returns the whole body instead of the response.
+    """
+    (response, etag, lastModified) = openJobList(serverurl, depth, timeout, etag, lastModified, transport)
+    return (response.read() if response is not None else None, etag, lastModified)
+
+def fetchJobList(serverurl, depth=0, timeout=None, transport=None):
+    """
+    Fetches and decodes the job list of a jenkins server unconditionally.
+    """
+    return json.loads(fetchJobListBody(serverurl, depth, timeout, transport=transport)[0])
+
+def iterJobList(stream, chunkSize=STREAM_CHUNK_SIZE):
+    """
+    Decodes the json document read from stream, an object with a read(size)
+    method, incrementally and yields the entries of its top-level jobs array
+    one by one. Only a single entry is decoded at a time, the other values
+    of the top-level object are skipped. Raises ValueError for malformed
+    documents and documents without jobs.
+    """
+    return _JobListParser(stream, chunkSize).jobs()
+
+class _JobListParser(object):
+    def __init__(self, stream, chunkSize):
+        self.stream = stream
+        self.chunkSize = chunkSize
+        self.decoder = json.JSONDecoder()
+        self.textDecoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = u""
+        self.pos = 0
+        self.eof = False
+
+    def jobs(self):
+        self._expect("{")
+        if self._peek() == "}":
+            raise ValueError("No jobs in json document")
+        foundJobs = False
+        while True:
+            key = self._decode()
+            self._expect(":")
+            if key == "jobs":
+                foundJobs = True
+                self._expect("[")
+                if self._peek() == "]":
+                    self.pos += 1
+                else:
+                    while True:
+                        yield self._decode()
+                        if self._expect(",]") == "]":
+                            break
+            else:
+                self._decode()
+            if self._expect(",}") == "}":
+                break
+        if not foundJobs:
+            raise ValueError("No jobs in json document")
+
+    def _fill(self):
+        data = self.stream.read(self.chunkSize)
+        self.eof = not data
+        self.buffer = self.buffer[self.pos:] + self.textDecoder.decode(data, self.eof)
+        self.pos = 0
+        return not self.eof
+
+    def _peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of json document")
+
+    def _expect(self, chars):
+        char = self._peek()
+        if char not in chars:
+            raise ValueError("Expected one of '%s' at '%s'" % (chars, self.buffer[self.pos:self.pos + 20]))
+        self.pos += 1
+        return char
+
+    def _decode(self):
+        self._peek()
+        while True:
+            try:
+                (value, end) = self.decoder.raw_decode(self.buffer, self.pos)
+                # a number might continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self._fill()
@@ -24,18 +24,9 @@
 
 from enum import IntEnum
 
-def colorToJenkinsState(colorstr):
-    assert(len(filter(lambda color: color in colorstr, ["blue", "yellow", "red", "disabled", "notbuilt", "aborted"])) == 1)
-    if colorstr.startswith("blue"):
-        return JenkinsState.Successful
-    elif colorstr.startswith("yellow"):
-        return JenkinsState.Unstable
-    elif colorstr.startswith("disabled") or colorstr.startswith("notbuilt") or colorstr.startswith("aborted"):
-        return JenkinsState.Disabled
-    elif colorstr.startswith("red"):
-        return JenkinsState.Failed
-    else:
-        return JenkinsState.Unknown
+# Fields of a job entry in the jenkins json api that are used by JenkinsJob,
+# only these are requested from the server.
+JOB_API_FIELDS = ("name", "url", "color")
 
 class JenkinsState(IntEnum):
     Unstable = 0
@@ -44,17 +35,83 @@ class JenkinsState(IntEnum):
     Unknown = 3
     Disabled = 4
 
+# state of every color of the jenkins BallColor, the _anime variants are
+# shown while a build is running
+_BASE_COLOR_STATES = {"blue": JenkinsState.Successful,
+                      "yellow": JenkinsState.Unstable,
+                      "red": JenkinsState.Failed,
+                      "grey": JenkinsState.Disabled,
+                      "disabled": JenkinsState.Disabled,
+                      "notbuilt": JenkinsState.Disabled,
+                      "aborted": JenkinsState.Disabled}
+
+# color -> (state, building), precomputed so parsing a job costs a dict lookup
+COLOR_STATES = dict([(color, (state, False)) for (color, state) in _BASE_COLOR_STATES.iteritems()] +
+                    [(color + "_anime", (state, True)) for (color, state) in _BASE_COLOR_STATES.iteritems()])
+UNKNOWN_COLOR_STATE = (JenkinsState.Unknown, False)
+
+def parseColor(colorstr):
+    """
+    Returns the (state, building) tuple of a jenkins color.
+    """
+    return COLOR_STATES.get(colorstr, UNKNOWN_COLOR_STATE)
+
+def colorToJenkinsState(colorstr):
+    return COLOR_STATES.get(colorstr, UNKNOWN_COLOR_STATE)[0]
+
+# a color for each state, jenkins has no color for an unknown state
+_STATE_COLORS = {JenkinsState.Successful: "blue",
+                 JenkinsState.Unstable: "yellow",
+                 JenkinsState.Failed: "red",
+                 JenkinsState.Disabled: "disabled",
+                 JenkinsState.Unknown: "unknown"}
+
+def stateToColor(state, building=False):
+    """
+    Returns a jenkins color that parseColor maps to state and building.
+    """
+    color = _STATE_COLORS[state]
+    return color + "_anime" if building and state != JenkinsState.Unknown else color
+
 class JenkinsJob(object):
+    # there is one instance per job on every server, slots keep them small
+    __slots__ = ("name", "url", "_state", "_monitored", "lastState", "building", "_owner")
+
     def __init__(self, name, monitored, url, state):
         assert name is not None
         self.name = name
         assert url is not None
         self.url = url
         assert state in JenkinsState
-        self.state = state
+        self._state = state
         assert monitored is not None 
-        self.monitored = monitored
+        self._monitored = monitored
         self.lastState = JenkinsState.Unknown
+        # whether a build was running during the last refresh
+        self.building = False
+        # the JobList containing this job, informed about changes of the
+        # state or monitoring flag to keep its counters up-to-date
+        self._owner = None
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        if self._owner is not None and self._monitored:
+            self._owner._monitoredStateChanged(self._state, state)
+        self._state = state
+
+    @property
+    def monitored(self):
+        return self._monitored
+
+    @monitored.setter
+    def monitored(self, monitored):
+        if self._owner is not None and monitored != self._monitored:
+            self._owner._monitoringChanged(self._state, monitored)
+        self._monitored = monitored
 
     def __ne__(self, other):
         return self.name != other.name or self.url != other.url or self.monitored != other.monitored or self.state != other.state
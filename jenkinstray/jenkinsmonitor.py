@@ -22,45 +22,452 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from jenkinsjob import JenkinsState, JenkinsJob, colorToJenkinsState
-import urllib2
+from jenkinsjob import JenkinsState, JenkinsJob, COLOR_STATES, UNKNOWN_COLOR_STATE
+from jenkinsapi import openJobList, iterJobList
+from instrumentation import instrumentation
+from history import StateHistory
+from crawler import DEFAULT_FOLDER_DEPTH, FULL_REFRESH_EVERY, FolderCrawler, flattenJobs, planCrawl, ancestorPaths
+import httplib
+import hashlib
 import json
+import time
+
+# headers of job lists served by a polling daemon, see daemon.py
+GENERATION_HEADER = "X-Jenkinstray-Generation"
+DELTA_HEADER = "X-Jenkinstray-Delta"
+
+class JobList(object):
+    """
+    Ordered list of jobs that keeps an index of the jobs by name and the
+    number of monitored jobs in each state, job names are expected to be
+    unique.
+    """
+    def __init__(self, jobs=()):
+        self._jobs = []
+        self._jobsByName = {}
+        self._monitoredCounts = [0] * len(JenkinsState)
+        for job in jobs:
+            self.append(job)
+
+    def append(self, job):
+        self._jobs.append(job)
+        self._jobsByName[job.name] = job
+        job._owner = self
+        if job.monitored:
+            self._monitoredCounts[job.state] += 1
+
+    def remove(self, job):
+        for idx in range(len(self._jobs)):
+            if self._jobs[idx] is job:
+                del self._jobs[idx]
+                break
+        else:
+            raise ValueError("JobList.remove(job): job not in list")
+        self._forget(job)
+
+    def retainNames(self, names):
+        """
+        Removes all jobs whose name is not contained in names and returns
+        the removed jobs.
+        """
+        removed = [job for job in self._jobs if job.name not in names]
+        if removed:
+            self._jobs = [job for job in self._jobs if job.name in names]
+            for job in removed:
+                self._forget(job)
+        return removed
+
+    def removeNames(self, names):
+        """
+        Removes all jobs whose name is contained in names and returns the
+        removed jobs.
+        """
+        removed = [job for job in self._jobs if job.name in names]
+        if removed:
+            self._jobs = [job for job in self._jobs if job.name not in names]
+            for job in removed:
+                self._forget(job)
+        return removed
+
+    def _forget(self, job):
+        if self._jobsByName.get(job.name) is job:
+            del self._jobsByName[job.name]
+        job._owner = None
+        if job.monitored:
+            self._monitoredCounts[job.state] -= 1
+
+    def _monitoredStateChanged(self, oldState, newState):
+        self._monitoredCounts[oldState] -= 1
+        self._monitoredCounts[newState] += 1
+
+    def _monitoringChanged(self, state, monitored):
+        self._monitoredCounts[state] += 1 if monitored else -1
+
+    def numMonitoredJobs(self, state):
+        return self._monitoredCounts[state]
+
+    def monitoredStateHistogram(self):
+        """
+        Returns a dict with the number of monitored jobs for each JenkinsState.
+        """
+        return dict((state, self._monitoredCounts[state]) for state in JenkinsState)
+
+    def find(self, name):
+        return self._jobsByName.get(name)
+
+    def __iter__(self):
+        return iter(self._jobs)
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def __getitem__(self, idx):
+        return self._jobs[idx]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+class JobChanges(object):
+    """
+    The changes a refresh made to the jobs of a monitor: the added and
+    removed jobs and the state transitions as (job, oldState, newState)
+    tuples. Evaluates to False if nothing changed.
+    """
+    def __init__(self, added=None, removed=None, transitions=None):
+        self.added = added if added is not None else []
+        self.removed = removed if removed is not None else []
+        self.transitions = transitions if transitions is not None else []
+
+    def __nonzero__(self):
+        return len(self.added) > 0 or len(self.removed) > 0 or len(self.transitions) > 0
+
+    def __eq__(self, other):
+        return self.added == other.added and self.removed == other.removed and self.transitions == other.transitions
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "JobChanges(added=%s, removed=%s, transitions=%s)" % ([job.name for job in self.added],
+                                                                    [job.name for job in self.removed],
+                                                                    [(job.name, oldState, newState) for (job, oldState, newState) in self.transitions])
+
+class _HashingReader(object):
+    """
+    Passes reads through to stream and hashes the data read.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.hash = hashlib.sha1()
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.hash.update(data)
+        return data
+
+    def digest(self):
+        return self.hash.digest()
+
+class _PrefixedReader(object):
+    """
+    Reads prefix first and then the rest of stream.
+    """
+    def __init__(self, prefix, stream):
+        self.prefix = prefix
+        self.stream = stream
+
+    def read(self, size=-1):
+        if not self.prefix:
+            return self.stream.read(size)
+        if size < 0:
+            data = self.prefix + self.stream.read()
+            self.prefix = ""
+            return data
+        data = self.prefix[:size]
+        self.prefix = self.prefix[size:]
+        return data
 
 class JenkinsMonitor(object):
+    # job lists with more decoded bytes than this are streamed, None disables streaming
+    streamingThreshold = 1024 * 1024
+
     def __init__(self, serverurl=None):
         self.serverurl = serverurl
-        self.jobs = []
+        self.jobs = JobList()
+        self.etag = None
+        self.lastModified = None
+        self.bodyHash = None
+        self.pollsSkipped = 0
+        self.pollsProcessed = 0
+        self.buildingMonitoredJobs = 0
+        # time.time() of the last successful refresh
+        self.lastRefreshed = None
+        # number of folder levels below the top level that are looked into
+        self.folderDepth = DEFAULT_FOLDER_DEPTH
+        # full path -> crawler.Container of the folders found by the last refresh
+        self.containers = {}
+        self.crawlsSinceFullRefresh = 0
+        # generation of the job list of a polling daemon, None for jenkins
+        self.generation = None
+        # rules.RuleSet monitoring added jobs, None to leave them unmonitored
+        self.autoMonitor = None
+        # state changes of the monitored jobs
+        self.history = StateHistory()
 
-    def refreshFromServer(self):
+    def refreshFromServer(self, timeout=None):
+        """
+        Fetches the job list from the server and updates the jobs from it.
+        Returns the JobChanges of the refresh, if the job list did not change
+        since the last refresh the jobs are left untouched and the changes
+        are empty. Job lists turning out larger than streamingThreshold
+        bytes once decompressed are decoded and applied incrementally
+        while the rest is downloaded, whatever the server announced as
+        their length. Malformed job lists are reported like connection
+        problems.
+
+        Jobs in folders are fetched with the job list up to folderDepth
+        levels deep, unless the folders found by the last refresh make
+        crawling only the folders with monitored jobs cheaper.
+        """
+        timings = instrumentation()
+        start = time.time()
         try:
-            self._refreshFromDict(json.load(urllib2.urlopen(self.serverurl + "/api/json")))
-        except (urllib2.HTTPError, urllib2.URLError), e:
+            skipped = None
+            if self.containers and self.crawlsSinceFullRefresh < FULL_REFRESH_EVERY - 1:
+                skipped = planCrawl(self.containers, [job.name for job in self.monitoredJobs()], self.folderDepth)
+            if skipped is not None:
+                changes = self._refreshByCrawling(timeout)
+                self._recordFetch(timings, start, "crawl")
+                self.crawlsSinceFullRefresh += 1
+                bodyHash = None
+            else:
+                self.crawlsSinceFullRefresh = 0
+                (response, self.etag, self.lastModified) = openJobList(self.serverurl, self.folderDepth, timeout, self.etag, self.lastModified, since=self.generation)
+                if response is None:
+                    self._recordFetch(timings, start)
+                    self.pollsSkipped += 1
+                    self.lastRefreshed = time.time()
+                    return JobChanges()
+                try:
+                    # only taken over once the job list was applied, deltas are relative to it
+                    generation = response.getheader(GENERATION_HEADER)
+                    if response.getheader(DELTA_HEADER) is not None:
+                        body = response.read()
+                        self._recordFetch(timings, start)
+                        bodyHash = None
+                        with timings.phase("refresh"):
+                            changes = self._applyDelta(json.loads(body))
+                    else:
+                        # gzip and chunked responses tell nothing about the decoded size,
+                        # so a prefix is read to find out whether the job list is large
+                        threshold = self.streamingThreshold
+                        body = response.read(threshold + 1) if threshold is not None else response.read()
+                        if threshold is not None and len(body) > threshold:
+                            reader = _HashingReader(_PrefixedReader(body, response))
+                            body = None
+                            changes = self._refreshFromJobs(iterJobList(reader))
+                            bodyHash = reader.digest()
+                            self._recordFetch(timings, start, "stream")
+                        else:
+                            self._recordFetch(timings, start)
+                            bodyHash = hashlib.sha1(body).digest()
+                            if bodyHash == self.bodyHash:
+                                self.generation = generation
+                                self.pollsSkipped += 1
+                                self.lastRefreshed = time.time()
+                                return JobChanges()
+                            with timings.phase("decode"):
+                                dictobj = json.loads(body)
+                            with timings.phase("refresh"):
+                                changes = self._refreshFromDict(dictobj)
+                    self.generation = generation
+                finally:
+                    response.close()
+        except (IOError, ValueError, KeyError, TypeError, httplib.HTTPException), e:
             for job in self.jobs:
-                job.state = JenkinsState.Unknown
+                if job.state != JenkinsState.Unknown:
+                    job.lastState = job.state
+                    job.state = JenkinsState.Unknown
+            self.invalidateCache()
             raise RuntimeError("Failed to fetch jenkins data from: %s - %s" %(self.serverurl, e))
+        if changes.added and self.autoMonitor is not None:
+            self.autoMonitor.fetchViews(self.serverurl, timeout)
+            self._autoMonitorJobs(changes.added)
+        self._recordHistory(changes)
+        self.bodyHash = bodyHash
+        self.pollsProcessed += 1
+        self.lastRefreshed = time.time()
+        return changes
+
+    def _recordFetch(self, timings, start, phase="fetch"):
+        elapsed = time.time() - start
+        timings.record(phase, elapsed)
+        timings.recordServerLatency(self.serverurl, elapsed)
+
+    def invalidateCache(self):
+        """
+        Forgets about the last fetched job list so the next refresh processes
+        the data from the server even if it did not change.
+        """
+        self.etag = None
+        self.lastModified = None
+        self.bodyHash = None
+        self.generation = None
 
     def _refreshFromDict(self, dictobj):
-        knownjobnames = []
+        if "jobs" not in dictobj:
+            # fail like iterJobList does for streamed job lists
+            raise ValueError("No jobs in json document")
+        return self._refreshFromJobs(dictobj["jobs"])
+
+    def _refreshByCrawling(self, timeout):
+        """
+        Refreshes the jobs of the top level and of the folders holding
+        monitored jobs, keeping what is known about the skipped folders.
+        """
+        crawler = FolderCrawler(self.serverurl, self.folderDepth, [job.name for job in self.monitoredJobs()], timeout)
+        jobinfos = crawler.crawl()
+        skipped = set(crawler.skipped)
+        def inSkippedFolder(name):
+            for path in ancestorPaths(name):
+                if path in skipped:
+                    return True
+            return False
+        keptjobnames = [job.name for job in self.jobs if "/" in job.name and inSkippedFolder(job.name)]
+        containers = crawler.containers
+        for (path, container) in self.containers.iteritems():
+            if path in skipped or inSkippedFolder(path):
+                containers[path] = container
+        changes = self._refreshFromJobs(jobinfos, keptjobnames)
+        self.containers = containers
+        # the job list cached for conditional requests is outdated now
+        self.invalidateCache()
+        return changes
+
+    def _refreshFromJobs(self, jobinfos, keptjobnames=()):
+        """
+        Updates the jobs from the entries of a job list, jobs not listed are
+        removed unless their names are in keptjobnames. Jobs in folders are
+        named by their full path.
+        """
+        changes = JobChanges()
+        knownjobnames = set(keptjobnames)
+        buildingMonitoredJobs = 0
+        colorStates = COLOR_STATES
+        containers = {}
+        for jobinfo in flattenJobs(jobinfos, containers):
+            job = self.findJob(jobinfo["name"])
+            (state, building) = colorStates.get(jobinfo["color"], UNKNOWN_COLOR_STATE)
+            if job is None:
+                job = JenkinsJob(jobinfo["name"], False, jobinfo["url"], state)
+                self.jobs.append(job)
+                changes.added.append(job)
+            else:
+                if job.state != state:
+                    changes.transitions.append((job, job.state, state))
+                    job.lastState = job.state
+                    job.state = state
+                if job.url != jobinfo["url"]:
+                    job.url = jobinfo["url"]
+            job.building = building
+            if building and job.monitored:
+                buildingMonitoredJobs += 1
+            knownjobnames.add(jobinfo["name"])
+        changes.removed = self.jobs.retainNames(knownjobnames)
+        self.buildingMonitoredJobs = buildingMonitoredJobs
+        self.containers = containers
+        return changes
+
+    def _applyDelta(self, dictobj):
+        """
+        Updates the jobs from the changes since the last refresh served by a
+        polling daemon, listing the added or changed jobs in jobs and the
+        names of the removed ones in removed.
+        """
+        changes = JobChanges()
+        colorStates = COLOR_STATES
         for jobinfo in dictobj["jobs"]:
-            job = self._findJobByName(jobinfo["name"])
-            color = colorToJenkinsState(jobinfo["color"])
-            if not job:
-                self.jobs.append(JenkinsJob(jobinfo["name"], False, jobinfo["url"], color))
+            job = self.findJob(jobinfo["name"])
+            (state, building) = colorStates.get(jobinfo["color"], UNKNOWN_COLOR_STATE)
+            if job is None:
+                job = JenkinsJob(jobinfo["name"], False, jobinfo["url"], state)
+                self.jobs.append(job)
+                changes.added.append(job)
             else:
-                job.lastState = job.state
-                job.state = color
-                job.url = jobinfo["url"]
-            knownjobnames.append(jobinfo["name"])
-        for job in list(self.jobs):
-            if job.name not in knownjobnames:
-                self.jobs.remove(job)
-
-    def _findJobByName(self, name):
-        candidates = filter(lambda job: job.name == name, self.jobs)
-        assert(len(candidates) < 2)
-        if len(candidates) > 0:
-            return candidates[0]
-        return None
+                if job.state != state:
+                    changes.transitions.append((job, job.state, state))
+                    job.lastState = job.state
+                    job.state = state
+                if job.url != jobinfo["url"]:
+                    job.url = jobinfo["url"]
+            job.building = building
+        changes.removed = self.jobs.removeNames(set(dictobj["removed"]))
+        # monitoring may have changed since the last refresh, unlike the delta
+        self.buildingMonitoredJobs = sum(1 for job in self.jobs if job.monitored and job.building)
+        return changes
+
+    def applyEvent(self, event):
+        """
+        Updates a job from a webhook.JobEvent received between refreshes,
+        jobs not known yet are added. Returns the JobChanges. If the event
+        changed a job the cache is invalidated, so the next refresh
+        processes the job list even if the server reports it as unchanged
+        and corrects what missed events left behind.
+        """
+        changes = JobChanges()
+        job = self.findJob(event.name)
+        state = event.state
+        if job is None:
+            job = JenkinsJob(event.name, False, event.jobUrl or "Unknown", state if state is not None else JenkinsState.Unknown)
+            self.jobs.append(job)
+            changes.added.append(job)
+        elif state is not None and job.state != state:
+            changes.transitions.append((job, job.state, state))
+            job.lastState = job.state
+            job.state = state
+        if job.building != event.building:
+            if job.monitored:
+                self.buildingMonitoredJobs += 1 if event.building else -1
+            job.building = event.building
+            self.invalidateCache()
+        elif changes:
+            self.invalidateCache()
+        if changes.added and self.autoMonitor is not None:
+            self._autoMonitorJobs(changes.added)
+        self._recordHistory(changes)
+        return changes
+
+    def _autoMonitorJobs(self, jobs):
+        """
+        Monitors the jobs among jobs matched by the autoMonitor rules, only
+        jobs new to the monitor are passed so the rules never run over the
+        whole job list.
+        """
+        for job in self.autoMonitor.apply(jobs):
+            if job.building:
+                self.buildingMonitoredJobs += 1
+
+    def _recordHistory(self, changes):
+        """
+        Records the states of the monitored jobs that were added or changed
+        in the history, unknown states tell nothing about a job.
+        """
+        now = time.time()
+        history = self.history
+        for job in changes.added:
+            if job.monitored and job.state != JenkinsState.Unknown:
+                history.record(job.name, job.state, now)
+        for (job, oldState, newState) in changes.transitions:
+            if job.monitored and newState != JenkinsState.Unknown:
+                history.record(job.name, newState, now)
+        for job in changes.removed:
+            history.forget(job.name)
+
+    def findJob(self, name):
+        return self.jobs.find(name)
 
     def allJobs(self):
         for job in self.jobs:
@@ -79,14 +486,42 @@ class JenkinsMonitor(object):
     def toDict(self):
         return {"jobs": [job.toDict() for job in self.jobs]}
 
+    def restoreState(self, dictobj, addJobs=True):
+        """
+        Takes the urls and states of the jobs from a toDict() of an earlier
+        run, jobs that are not known yet are added without monitoring them
+        if addJobs is set and skipped otherwise. Changes found by the next
+        refresh are reported relative to these states.
+        """
+        for jobobj in dictobj["jobs"]:
+            state = JenkinsState(jobobj["state"])
+            job = self.findJob(jobobj["name"])
+            if job is None:
+                if not addJobs:
+                    continue
+                job = JenkinsJob(jobobj["name"], False, jobobj["url"], state)
+                self.jobs.append(job)
+            else:
+                job.url = jobobj["url"]
+                job.state = state
+
+    def monitoredStateHistogram(self):
+        return self.jobs.monitoredStateHistogram()
+
+    def numBuildingMonitoredJobs(self):
+        """
+        Number of monitored jobs that were building during the last refresh.
+        """
+        return self.buildingMonitoredJobs
+
     def numFailedMonitoredJobs(self):
-        return reduce(lambda cnt, job: cnt + 1 if job.state == JenkinsState.Failed else cnt, self.monitoredJobs(), 0)
+        return self.jobs.numMonitoredJobs(JenkinsState.Failed)
 
     def numSuccessfulMonitoredJobs(self):
-        return reduce(lambda cnt, job: cnt + 1 if job.state == JenkinsState.Successful else cnt, self.monitoredJobs(), 0)
+        return self.jobs.numMonitoredJobs(JenkinsState.Successful)
 
     def numUnstableMonitoredJobs(self):
-        return reduce(lambda cnt, job: cnt + 1 if job.state == JenkinsState.Unstable else cnt, self.monitoredJobs(), 0)
+        return self.jobs.numMonitoredJobs(JenkinsState.Unstable)
 
     def monitoredJobs(self):
         for job in self.jobs:
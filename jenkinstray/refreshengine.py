@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from threading import Thread, Lock
+from Queue import Queue, Empty
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_TIMEOUT = 30
+
+class RefreshEngine(object):
+    """
+    Refreshes a set of JenkinsMonitor objects concurrently on a bounded pool
+    of worker threads, so one slow server does not hold up the others.
+    """
+    def __init__(self, maxWorkers=DEFAULT_MAX_WORKERS, timeout=DEFAULT_TIMEOUT):
+        assert maxWorkers > 0
+        self.maxWorkers = maxWorkers
+        self.timeout = timeout
+        self.lock = Lock()
+        self.thread = None
+        # an instrumentation.Profiler to run the refreshes with, if set
+        self.profiler = None
+
+    def refresh(self, monitors):
+        """
+        Refreshes all monitors and blocks until each of them finished or ran
+        into its timeout. Returns a list of (monitor, changes, error) tuples in
+        the order of the given monitors, where changes are the JobChanges
+        returned by JenkinsMonitor.refreshFromServer. For failed refreshes
+        changes is None and error the exception, otherwise error is None.
+        """
+        monitors = list(monitors)
+        results = [None] * len(monitors)
+        pending = Queue()
+        for (idx, monitor) in enumerate(monitors):
+            pending.put((idx, monitor))
+        workers = [Thread(target=self._work, args=(pending, results)) for _ in range(min(self.maxWorkers, len(monitors)))]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return results
+
+    def refreshAsync(self, monitors, callback):
+        """
+        Runs refresh() in a background thread and hands the results to
+        callback from that thread. The refresh counts as finished when
+        callback is invoked, so callback may start the next one. Returns
+        False without doing anything if the previous refresh is still
+        running.
+        """
+        with self.lock:
+            if self.isRefreshing():
+                return False
+            self.thread = Thread(target=self._refreshAsync, args=(monitors, callback), name="JenkinsRefresh")
+            self.thread.daemon = True
+            self.thread.start()
+            return True
+
+    def isRefreshing(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def _refreshAsync(self, monitors, callback):
+        results = self.refresh(monitors)
+        with self.lock:
+            self.thread = None
+        callback(results)
+
+    def _work(self, pending, results):
+        while True:
+            try:
+                (idx, monitor) = pending.get_nowait()
+            except Empty:
+                return
+            try:
+                if self.profiler is not None:
+                    changes = self.profiler.runcall(monitor.refreshFromServer, timeout=self.timeout)
+                else:
+                    changes = monitor.refreshFromServer(timeout=self.timeout)
+                results[idx] = (monitor, changes, None)
+            except Exception, e:
+                results[idx] = (monitor, None, e)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Rules that monitor new jobs automatically. A rule is a glob matching the
+whole job name like release-*, a regular expression searched in the name
+like re:^pr-\\d+, or the jobs of a view like view:Nightly. A job is
+monitored if an include rule and no exclude rule matches it.
+"""
+
+from jenkinsapi import fetchJobList
+from crawler import ancestorPaths
+import httplib
+import re
+import urllib
+
+REGEX_PREFIX = "re:"
+VIEW_PREFIX = "view:"
+
+def translateGlob(pattern):
+    """
+    Returns a regular expression matching the whole names matched by the
+    glob pattern, where * matches any text, ? a single character and
+    [...] one of the enclosed characters.
+    """
+    parts = []
+    idx = 0
+    while idx < len(pattern):
+        char = pattern[idx]
+        idx += 1
+        if char == "*":
+            parts.append(".*")
+        elif char == "?":
+            parts.append(".")
+        elif char == "[" and "]" in pattern[idx + 1:]:
+            end = pattern.index("]", idx + 1)
+            chars = pattern[idx:end].replace("\\", "\\\\")
+            if chars.startswith("!"):
+                parts.append("[^%s]" % chars[1:])
+            else:
+                parts.append("[\\%s]" % chars if chars.startswith("^") else "[%s]" % chars)
+            idx = end + 1
+        else:
+            parts.append(re.escape(char))
+    return "".join(parts) + r"\Z"
+
+class NameMatcher(object):
+    """
+    Matches job names against globs and regular expressions. The globs are
+    compiled into a single expression, so a name is scanned once instead of
+    once per glob. The regular expressions are compiled one by one, as their
+    inline flags and group numbers would change meaning in a joined one.
+    """
+    def __init__(self, globs, regexes):
+        globPatterns = ["^(?:%s)" % translateGlob(glob) for glob in globs]
+        self.combined = None
+        self.patterns = [re.compile(regex, re.DOTALL) for regex in regexes]
+        if not globPatterns:
+            return
+        try:
+            self.combined = re.compile("|".join(globPatterns), re.DOTALL)
+        except (re.error, AssertionError, OverflowError):
+            # too large for a single expression
+            self.patterns.extend(re.compile(pattern, re.DOTALL) for pattern in globPatterns)
+
+    def matches(self, name):
+        if self.combined is not None and self.combined.search(name) is not None:
+            return True
+        for pattern in self.patterns:
+            if pattern.search(name) is not None:
+                return True
+        return False
+
+class RuleSet(object):
+    """
+    The compiled include and exclude rules of a server. The jobs of the
+    views the rules refer to are fetched by fetchViews().
+    """
+    def __init__(self, include=(), exclude=()):
+        (self.include, self.includeViews) = _compile(include)
+        (self.exclude, self.excludeViews) = _compile(exclude)
+        # view name -> set of the job and folder names of the view
+        self.viewJobs = {}
+
+    def views(self):
+        return sorted(set(self.includeViews) | set(self.excludeViews))
+
+    def fetchViews(self, serverurl, timeout=None):
+        """
+        Fetches the jobs of the views used by the rules. Views that cannot
+        be fetched keep the jobs known from before.
+        """
+        for view in self.views():
+            viewurl = "%s/view/%s" % (serverurl.rstrip("/"), urllib.quote(view, safe=""))
+            try:
+                self.viewJobs[view] = frozenset(job["name"] for job in fetchJobList(viewurl, timeout=timeout)["jobs"])
+            except (IOError, ValueError, KeyError, httplib.HTTPException), e:
+                print "Failed to fetch the jobs of view %s from %s: %s" % (view, serverurl, e)
+
+    def matches(self, name):
+        return ((self.include.matches(name) or self._inViews(name, self.includeViews)) and
+                not (self.exclude.matches(name) or self._inViews(name, self.excludeViews)))
+
+    def apply(self, jobs):
+        """
+        Monitors the jobs among jobs the rules match and returns them.
+        """
+        matched = []
+        for job in jobs:
+            if not job.monitored and self.matches(job.name):
+                job.enableMonitoring()
+                matched.append(job)
+        return matched
+
+    def _inViews(self, name, views):
+        for view in views:
+            viewJobs = self.viewJobs.get(view)
+            if viewJobs is None:
+                continue
+            if name in viewJobs:
+                return True
+            # jobs of a folder listed in a view belong to the view as well
+            for path in ancestorPaths(name):
+                if path in viewJobs:
+                    return True
+        return False
+
+def _compile(rules):
+    globs = []
+    regexes = []
+    views = []
+    for rule in rules:
+        if rule.startswith(REGEX_PREFIX):
+            regex = rule[len(REGEX_PREFIX):]
+            try:
+                re.compile(regex)
+            except re.error, e:
+                raise ValueError("Invalid regular expression in rule %s: %s" % (rule, e))
+            regexes.append(regex)
+        elif rule.startswith(VIEW_PREFIX):
+            views.append(rule[len(VIEW_PREFIX):])
+        else:
+            globs.append(rule)
+    return (NameMatcher(globs, regexes), views)
+
+def ruleSetFromSettings(rules):
+    """
+    Compiles the autoMonitor entry of the settings, a dict with include and
+    exclude lists of rules. Returns None without include rules. Raises
+    ValueError for invalid rules.
+    """
+    if not rules or not rules.get("include"):
+        return None
+    return RuleSet(rules["include"], rules.get("exclude", ()))
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import random
+import time
+from threading import Lock
+
+DEFAULT_JITTER = 0.1
+# factor applied to the interval of servers with building or recently
+# changed jobs
+ACTIVE_FACTOR = 0.5
+# factor applied to the interval for every poll that found nothing new or
+# failed, until maxInterval is reached
+BACKOFF_FACTOR = 2.0
+
+class ServerSchedule(object):
+    def __init__(self, interval, nextDue):
+        # the configured interval for this server, None for the default one
+        self.interval = interval
+        self.currentInterval = None
+        self.nextDue = nextDue
+
+class PollScheduler(object):
+    """
+    Keeps a next due time per monitor. Servers with building or changed
+    monitored jobs are polled more often, servers without changes or with
+    connectivity problems are backed off exponentially up to maxInterval.
+    All intervals are spread by a random jitter. Times are in seconds.
+    """
+    def __init__(self, interval=60, maxInterval=None, jitter=DEFAULT_JITTER, clock=time.time, rng=random.random):
+        self.lock = Lock()
+        self.schedules = {}
+        self.clock = clock
+        self.rng = rng
+        self.configure(interval, maxInterval, jitter)
+
+    def configure(self, interval, maxInterval=None, jitter=DEFAULT_JITTER):
+        """
+        Sets the default interval, maxInterval defaults to four times the
+        interval.
+        """
+        assert interval > 0
+        with self.lock:
+            self.interval = interval
+            self.maxInterval = maxInterval if maxInterval is not None else interval * 4
+            self.jitter = jitter
+
+    def add(self, monitor, interval=None):
+        """
+        Adds a monitor that is due immediately, or changes the interval of a
+        known monitor. interval overrides the default interval.
+        """
+        with self.lock:
+            schedule = self.schedules.get(monitor)
+            if schedule is None:
+                self.schedules[monitor] = ServerSchedule(interval, self.clock())
+            elif schedule.interval != interval:
+                schedule.interval = interval
+                schedule.currentInterval = None
+                schedule.nextDue = min(schedule.nextDue, self.clock() + self._baseInterval(schedule))
+
+    def remove(self, monitor):
+        with self.lock:
+            self.schedules.pop(monitor, None)
+
+    def configuredInterval(self, monitor):
+        """
+        Returns the interval the monitor was added with, None if it uses the
+        default interval.
+        """
+        with self.lock:
+            return self.schedules[monitor].interval
+
+    def currentInterval(self, monitor):
+        with self.lock:
+            schedule = self.schedules[monitor]
+            return schedule.currentInterval or self._baseInterval(schedule)
+
+    def dueMonitors(self):
+        now = self.clock()
+        with self.lock:
+            return [monitor for (monitor, schedule) in self.schedules.iteritems() if schedule.nextDue <= now]
+
+    def nextDueIn(self):
+        """
+        Returns the number of seconds until the next monitor is due, None if
+        there are no monitors.
+        """
+        with self.lock:
+            if not self.schedules:
+                return None
+            return max(0, min(schedule.nextDue for schedule in self.schedules.itervalues()) - self.clock())
+
+    def reschedule(self, monitor, changes, error):
+        """
+        Computes the next due time of monitor from the outcome of its last
+        refresh, changes are its JobChanges and error is None if the refresh
+        succeeded.
+        """
+        with self.lock:
+            schedule = self.schedules.get(monitor)
+            if schedule is None:
+                return
+            baseInterval = self._baseInterval(schedule)
+            if error is None and (changes or monitor.numBuildingMonitoredJobs() > 0):
+                interval = baseInterval * ACTIVE_FACTOR
+            elif schedule.currentInterval is None or schedule.currentInterval < baseInterval:
+                interval = baseInterval if error is None else baseInterval * BACKOFF_FACTOR
+            else:
+                interval = min(schedule.currentInterval * BACKOFF_FACTOR, max(self.maxInterval, baseInterval))
+            schedule.currentInterval = interval
+            schedule.nextDue = self.clock() + interval * (1 + self.jitter * (2 * self.rng() - 1))
+
+    def _baseInterval(self, schedule):
+        return schedule.interval if schedule.interval is not None else self.interval
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import json
+import os
+import tempfile
+
+DEFAULT_SETTINGS = {"refreshInterval": 60, "servers": [], "notificationTimeout": 10}
+
+def compactSettings(settings):
+    """
+    Returns settings with the job list of every server reduced to the names
+    of the monitored jobs. Server entries with a "jobs" list of
+    {"name": ..., "monitored": ...} dicts, as written by older versions and
+    edited by the settings dialog, are converted, others are kept.
+    """
+    settings = dict(settings)
+    servers = []
+    for server in settings["servers"]:
+        if "jobs" in server:
+            server = dict(server)
+            server["monitored"] = [job["name"] for job in server.pop("jobs") if job["monitored"]]
+        servers.append(server)
+    settings["servers"] = servers
+    return settings
+
+class SettingsStore(object):
+    """
+    Reads and writes the settings file. The file is only parsed when the
+    settings are first asked for and saves requested in short succession are
+    written once on flush(), always replacing the file atomically.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._settings = None
+        self.pending = None
+        self.writes = 0
+
+    def settings(self):
+        if self._settings is None:
+            self._settings = self._load()
+        return self._settings
+
+    def requestSave(self, settings):
+        """
+        Remembers settings to be written on the next flush().
+        """
+        self._settings = settings
+        self.pending = settings
+
+    def hasPendingSave(self):
+        return self.pending is not None
+
+    def flush(self):
+        if self.pending is not None:
+            (settings, self.pending) = (self.pending, None)
+            self._write(compactSettings(settings))
+
+    def save(self, settings):
+        self.requestSave(settings)
+        self.flush()
+
+    def _load(self):
+        if not os.path.exists(self.filename):
+            return dict(DEFAULT_SETTINGS)
+        try:
+            with open(self.filename, "r") as settingsfile:
+                return compactSettings(json.load(settingsfile))
+        except (IOError, ValueError, KeyError, TypeError), e:
+            print "Failed to read settings from %s, using defaults: %s" % (self.filename, e)
+            return dict(DEFAULT_SETTINGS)
+
+    def _write(self, settings):
+        writeFileAtomically(self.filename, json.dumps(settings, separators=(",", ":")))
+        self.writes += 1
+
+def writeFileAtomically(filename, data):
+    """
+    Writes data to a temporary file next to filename and renames it to
+    filename, so readers see either the old or the new content.
+    """
+    directory = os.path.dirname(filename) or "."
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    (fd, tmpname) = tempfile.mkstemp(prefix=".%s." % os.path.basename(filename), dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as tmpfile:
+            tmpfile.write(data)
+            tmpfile.flush()
+            os.fsync(tmpfile.fileno())
+        if os.name == "nt" and os.path.exists(filename):
+            # rename does not replace existing files on windows
+            os.remove(filename)
+        os.rename(tmpname, filename)
+    finally:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import json
+import os
+import zlib
+from settingsstore import writeFileAtomically
+
+SNAPSHOT_VERSION = 1
+
+class StateSnapshot(object):
+    """
+    Keeps the states of the monitored jobs of all monitors in a zlib
+    compressed json file, so a restarted tray can show the last known
+    states before the servers answered.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.writes = 0
+
+    def load(self):
+        """
+        Returns a dict of server url -> JenkinsMonitor.toDict() of the saved
+        monitors, empty if there is no usable snapshot.
+        """
+        if not os.path.exists(self.filename):
+            return {}
+        try:
+            with open(self.filename, "rb") as snapshotfile:
+                dictobj = json.loads(zlib.decompress(snapshotfile.read()))
+            if dictobj.get("version") != SNAPSHOT_VERSION:
+                return {}
+            return dict((server["url"], server) for server in dictobj["servers"])
+        except (IOError, zlib.error, ValueError, KeyError, TypeError), e:
+            print "Failed to read job states from %s: %s" % (self.filename, e)
+            return {}
+
+    def save(self, monitors):
+        servers = [{"url": monitor.serverurl, "jobs": [job.toDict() for job in monitor.monitoredJobs()]} for monitor in monitors]
+        data = json.dumps({"version": SNAPSHOT_VERSION, "servers": servers}, separators=(",", ":"))
+        writeFileAtomically(self.filename, zlib.compress(data))
+        self.writes += 1
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+from jenkinstray.crawler import FolderCrawler, Container, flattenJobs, planCrawl, monitoredAncestors
+from jenkinstray.jenkinsmonitor import JenkinsMonitor
+
+import json
+import urlparse
+from threading import Thread
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+class TestCrawler(unittest.TestCase):
+    class FolderRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            (path, query) = self.path.split("?", 1)
+            self.server.requested.append(path)
+            folder = path[:-len("/api/json")]
+            deep = ",jobs[" in urlparse.parse_qs(query)["tree"][0]
+            data = json.dumps({"jobs": self.server.crawlTest.jobsOf(self.server.url + folder + "/", deep)})
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    def setUp(self):
+        server = HTTPServer(("localhost", 0), TestCrawler.FolderRequestHandler)
+        server.url = "http://localhost:%s" % server.server_address[1]
+        server.requested = []
+        server.crawlTest = self
+        thread = Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+        url = server.url
+        self.tree = [{"name": "top", "url": url + "/job/top/", "color": "blue"},
+                     {"name": "f1", "url": url + "/job/f1/", "jobs": [
+                         {"name": "a", "url": url + "/job/f1/job/a/", "color": "red"},
+                         {"name": "sub", "url": url + "/job/f1/job/sub/", "jobs": [
+                             {"name": "b", "url": url + "/job/f1/job/sub/job/b/", "color": "blue_anime"}]}]},
+                     {"name": "f2", "url": url + "/job/f2/", "jobs": [
+                         {"name": "job%03d" % idx, "url": url + "/job/f2/job/job%03d/" % idx, "color": "blue"} for idx in range(500)]}]
+
+    def jobsOf(self, url, deep):
+        def find(jobs):
+            for job in jobs:
+                if job["url"] == url:
+                    return job["jobs"]
+                found = find(job.get("jobs", []))
+                if found is not None:
+                    return found
+            return None
+        jobs = self.tree if url == self.server.url + "/" else find(self.tree)
+        if deep:
+            return jobs
+        return [dict((key, value) for (key, value) in job.iteritems() if key != "jobs") for job in jobs]
+
+    def testFlattenJobs(self):
+        containers = {}
+        names = [job["name"] for job in flattenJobs(self.tree, containers)]
+        self.assertEqual(names[:3], ["top", "f1/a", "f1/sub/b"], "Jobs are named by their full path")
+        self.assertEqual(len(names), 503, "All jobs are found")
+        self.assertEqual(dict((path, container.numJobs) for (path, container) in containers.iteritems()),
+                         {"f1": 2, "f1/sub": 1, "f2": 500}, "Folders are found with the number of jobs below them")
+
+    def testMonitoredAncestors(self):
+        self.assertEqual(monitoredAncestors(["top", "f1/sub/b"]), set(["f1", "f1/sub"]), "Folders holding the jobs")
+
+    def testPlanCrawl(self):
+        containers = {"f1": Container("f1", 2), "f1/sub": Container("f1/sub", 1), "f2": Container("f2", 500)}
+        self.assertEqual(planCrawl(containers, ["f1/sub/b"], 2), ["f2"], "Skipping the large folder is cheaper")
+        self.assertEqual(planCrawl(containers, ["f1/sub/b"], 0), None, "Folders are not crawled without depth")
+        self.assertEqual(planCrawl(containers, ["f2/job001", "f1/sub/b"], 2), None, "A single request is cheaper if nothing can be skipped")
+        self.assertEqual(planCrawl({}, ["top"], 2), None, "A single request without known folders")
+
+    def testCrawl(self):
+        crawler = FolderCrawler(self.server.url, 2, ["f1/sub/b"])
+        jobs = crawler.crawl()
+        self.assertEqual([job["name"] for job in jobs], ["top", "f1/a", "f1/sub/b"], "Jobs of the crawled folders")
+        self.assertEqual(sorted(self.server.requested), ["/api/json", "/job/f1/api/json", "/job/f1/job/sub/api/json"], "Only folders with monitored jobs are requested")
+        self.assertEqual(crawler.skipped, ["f2"], "Folders without monitored jobs are skipped")
+        self.assertEqual(crawler.containers["f1"].numJobs, 2, "Jobs in crawled folders are counted")
+
+        del self.server.requested[:]
+        self.assertEqual([job["name"] for job in FolderCrawler(self.server.url, 1, ["f1/sub/b"]).crawl()], ["top", "f1/a"], "Folders deeper than the depth are left out")
+        self.assertEqual(sorted(self.server.requested), ["/api/json", "/job/f1/api/json"], "Folders deeper than the depth are not requested")
+
+    def testCrawlError(self):
+        self.tree[1]["jobs"].append({"name": 5, "url": self.server.url + "/job/f1/job/5/", "color": "blue"})
+        crawler = FolderCrawler(self.server.url, 2, ["f1/sub/b"])
+        self.assertRaises(TypeError, crawler.crawl)
+
+    def testMonitorCrawling(self):
+        monitor = JenkinsMonitor(self.server.url)
+        changes = monitor.refreshFromServer()
+        self.assertEqual(len(changes.added), 503, "The whole tree is fetched initially")
+        self.assertEqual(self.server.requested, ["/api/json"], "With a single request")
+        monitor.findJob("f1/sub/b").enableMonitoring()
+        self.assertEqual(monitor.numBuildingMonitoredJobs(), 0, "Monitoring starts with the next refresh")
+
+        del self.server.requested[:]
+        self.tree[1]["jobs"][0]["color"] = "blue"
+        changes = monitor.refreshFromServer()
+        self.assertEqual(sorted(self.server.requested), ["/api/json", "/job/f1/api/json", "/job/f1/job/sub/api/json"], "The large folder is skipped")
+        self.assertEqual([(job.name, newState) for (job, oldState, newState) in changes.transitions], [("f1/a", monitor.findJob("top").state)], "Changes in crawled folders are found")
+        self.assertEqual(changes.removed, [], "Jobs in skipped folders are kept")
+        self.assertEqual(len(list(monitor.allJobs())), 503, "All jobs are still known")
+        self.assertEqual(monitor.numBuildingMonitoredJobs(), 1, "Building jobs in folders are counted")
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+from jenkinstray.daemon import PollingDaemon, ServerCache, parseServer
+from jenkinstray.jenkinsmonitor import JenkinsMonitor
+from jenkinstray.jenkinsjob import JenkinsState, JenkinsJob
+from jenkinstray.httptransport import sharedTransport
+
+import json
+from threading import Thread
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+class TestDaemon(unittest.TestCase):
+    class UpstreamRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            upstream = self.server
+            upstream.requests += 1
+            if upstream.status != 200:
+                self.send_error(upstream.status)
+                return
+            data = json.dumps({"jobs": [{"name": name, "url": "Url" + name, "color": color} for (name, color) in upstream.jobs]})
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    def startUpstream(self, jobs):
+        upstream = HTTPServer(("localhost", 0), TestDaemon.UpstreamRequestHandler)
+        upstream.jobs = jobs
+        upstream.status = 200
+        upstream.requests = 0
+        thread = Thread(target=upstream.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(upstream.server_close)
+        self.addCleanup(upstream.shutdown)
+        return upstream
+
+    def startDaemon(self, upstream):
+        daemon = PollingDaemon([("main", "http://localhost:%s" % upstream.server_address[1])], address=("localhost", 0))
+        daemon.start(polling=False)
+        self.addCleanup(daemon.stop)
+        self.addCleanup(sharedTransport().close)
+        return daemon
+
+    def testFullAndDelta(self):
+        jobs = [("Job%d" % idx, "blue") for idx in range(10)]
+        upstream = self.startUpstream(jobs)
+        daemon = self.startDaemon(upstream)
+        daemon.poll(force=True)
+        monitor = JenkinsMonitor(daemon.url() + "/main")
+        changes = monitor.refreshFromServer(timeout=5)
+        self.assertEqual([job.name for job in changes.added], [name for (name, _) in jobs], "All jobs are added from the daemon")
+        self.assertEqual(monitor.findJob("Job0").url, "UrlJob0", "Urls are passed on")
+        self.assertIsNotNone(monitor.generation, "The generation of the job list is known")
+        jobs[1] = ("Job1", "red_anime")
+        del jobs[2]
+        jobs.append(("Job10", "yellow"))
+        daemon.poll(force=True)
+        changes = monitor.refreshFromServer(timeout=5)
+        self.assertEqual([job.name for job in changes.added], ["Job10"], "The new job is added")
+        self.assertEqual([job.name for job in changes.removed], ["Job2"], "The vanished job is removed")
+        self.assertEqual([(job.name, oldState, newState) for (job, oldState, newState) in changes.transitions],
+                         [("Job1", JenkinsState.Successful, JenkinsState.Failed)], "The changed job transitions")
+        self.assertTrue(monitor.findJob("Job1").building, "The building flag is passed on")
+        self.assertEqual(len(list(monitor.allJobs())), 10, "The delta keeps the unchanged jobs")
+        monitor.refreshFromServer(timeout=5)
+        self.assertEqual(monitor.pollsSkipped, 1, "An unchanged job list is not sent again")
+        self.assertEqual(upstream.requests, 2, "Upstream is only asked by the daemon")
+
+    def testUpstreamError(self):
+        upstream = self.startUpstream([("Job0", "blue")])
+        daemon = self.startDaemon(upstream)
+        monitor = JenkinsMonitor(daemon.url() + "/main")
+        self.assertRaises(RuntimeError, monitor.refreshFromServer, 5)
+        daemon.poll(force=True)
+        monitor.refreshFromServer(timeout=5)
+        upstream.status = 500
+        daemon.poll(force=True)
+        self.assertRaises(RuntimeError, monitor.refreshFromServer, 5)
+        self.assertEqual(monitor.findJob("Job0").state, JenkinsState.Unknown, "Jobs become unknown when upstream fails")
+        unknown = JenkinsMonitor(daemon.url() + "/other")
+        self.assertRaises(RuntimeError, unknown.refreshFromServer, 5)
+
+    def testDeltaWindow(self):
+        monitor = JenkinsMonitor("http://upstream")
+        for idx in range(10):
+            monitor.jobs.append(JenkinsJob("Job%d" % idx, False, "Url", JenkinsState.Successful))
+        cache = ServerCache("main", monitor, "epoch")
+        self.assertIsNone(cache.document(), "Nothing is served before the first poll")
+        cache.publish()
+        self.assertTrue(all(job.monitored for job in monitor.allJobs()), "The daemon monitors all jobs")
+        first = cache.token()
+        self.assertFalse(cache.publish(), "An unchanged job list keeps its generation")
+        monitor.findJob("Job0").state = JenkinsState.Failed
+        self.assertTrue(cache.publish(), "A changed job starts a new generation")
+        (token, body, isDelta) = cache.document(first)
+        self.assertTrue(isDelta, "Known generations get a delta")
+        self.assertEqual(json.loads(body), {"jobs": [{"name": "Job0", "url": "Url", "color": "red"}], "removed": []}, "The delta lists the changed job")
+        self.assertFalse(cache.document("other-1")[2], "Tokens of another daemon get the whole job list")
+        for job in list(monitor.allJobs())[1:7]:
+            job.state = JenkinsState.Unstable
+        cache.publish()
+        self.assertFalse(cache.document(first)[2], "Large deltas are sent as the whole job list")
+
+    def testParseServer(self):
+        self.assertEqual(parseServer("main=http://jenkins:8080"), ("main", "http://jenkins:8080"), "Named server")
+        self.assertEqual(parseServer("http://jenkins:8080"), ("jenkins", "http://jenkins:8080"), "Servers are named by their host")
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+from jenkinstray.discovery import JobDiscovery, mergeJobs, fetchJobNames
+from jenkinstray.jenkinsapi import jobListUrl
+from jenkinstray.crawler import DEFAULT_FOLDER_DEPTH
+
+import json
+import socket
+from threading import Thread, Lock
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+class TestDiscovery(unittest.TestCase):
+    class JobListRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.server.requested.append(self.path)
+            data = json.dumps({"jobs": [{"name": name, "url": "Url", "color": "blue"} for name in self.server.jobNames]})
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    def startServer(self, jobNames):
+        server = HTTPServer(("localhost", 0), TestDiscovery.JobListRequestHandler)
+        server.jobNames = jobNames
+        server.requested = []
+        self.servers[server.server_address[1]] = server
+        thread = Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return "http://localhost:%s" % server.server_address[1]
+
+    def setUp(self):
+        self.servers = {}
+
+    def unusedUrl(self):
+        sock = socket.socket()
+        sock.bind(("localhost", 0))
+        url = "http://localhost:%s" % sock.getsockname()[1]
+        sock.close()
+        return url
+
+    def testMergeJobs(self):
+        jobs = [{"name": "Name1", "monitored": True}, {"name": "Name2", "monitored": False}, {"name": "Name3", "monitored": True}]
+        self.assertEqual(mergeJobs(jobs, ["Name3", "Name2", "Name4"]),
+                         [{"name": "Name3", "monitored": True}, {"name": "Name2", "monitored": False}, {"name": "Name4", "monitored": False}],
+                         "Monitoring flags are kept, new jobs are not monitored and vanished jobs are dropped")
+
+    def testFetchJobNames(self):
+        self.assertEqual(fetchJobNames(self.startServer(["Name1", "Name2"])), ["Name1", "Name2"], "Job names are fetched")
+
+    def testDiscovery(self):
+        urls = [self.startServer(["Name1"]), self.startServer(["Name2", "Name3"]), self.unusedUrl(), "http://known"]
+        reports = {}
+        lock = Lock()
+        def serverDone(serverurl, names, error):
+            with lock:
+                reports[serverurl] = (names, error)
+        discovery = JobDiscovery(urls, serverDone, {"http://known": ["Known"]}, maxWorkers=2, timeout=5)
+        discovery.start()
+        discovery.wait()
+        self.assertEqual(sorted(reports), sorted(urls), "Every server is reported")
+        self.assertEqual(reports[urls[0]], (["Name1"], None), "Jobs of the first server")
+        self.assertEqual(reports[urls[1]], (["Name2", "Name3"], None), "Jobs of the second server")
+        self.assertEqual(reports[urls[2]][0], None, "No jobs of the unreachable server")
+        self.assertIsInstance(reports[urls[2]][1], IOError, "Error of the unreachable server")
+        self.assertEqual(reports["http://known"], (["Known"], None), "Known jobs are reported without asking")
+
+    def testUnexpectedError(self):
+        url = self.startServer([None])
+        reports = []
+        discovery = JobDiscovery([url], lambda *args: reports.append(args), timeout=5)
+        discovery.start()
+        discovery.wait()
+        self.assertEqual(len(reports), 1, "Servers are reported whatever went wrong")
+        self.assertEqual(reports[0][:2], (url, None), "No jobs of the server")
+        self.assertIsInstance(reports[0][2], TypeError, "Error of the server")
+
+    def testFolderDepths(self):
+        urls = [self.startServer(["Name1"]), self.startServer(["Name2"])]
+        discovery = JobDiscovery(urls, lambda *args: None, folderDepths={urls[0]: 4}, timeout=5)
+        discovery.start()
+        discovery.wait()
+        for (url, depth) in [(urls[0], 4), (urls[1], DEFAULT_FOLDER_DEPTH)]:
+            server = self.servers[int(url.rsplit(":", 1)[1])]
+            self.assertEqual(server.requested, [jobListUrl(url, depth)[len(url):]], "Folders of %s are looked into %d levels deep" % (url, depth))
+
+    def testCancel(self):
+        reports = []
+        discovery = JobDiscovery([self.startServer(["Name1"])], lambda *args: reports.append(args))
+        discovery.cancel()
+        discovery.start()
+        discovery.wait()
+        self.assertEqual(reports, [], "Nothing is reported after cancelling")
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
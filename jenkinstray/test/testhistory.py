@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+from jenkinstray.history import StateHistory, HistoryStore, SECONDS_PER_DAY
+from jenkinstray.jenkinsmonitor import JenkinsMonitor
+from jenkinstray.jenkinsjob import JenkinsJob, JenkinsState
+
+import os
+import shutil
+import tempfile
+
+class TestStateHistory(unittest.TestCase):
+
+    def testRing(self):
+        history = StateHistory(capacity=3)
+        self.assertEqual(history.entries("Name1"), [], "No history of unknown jobs")
+        self.assertTrue(history.record("Name1", JenkinsState.Successful, 10), "First state")
+        self.assertFalse(history.record("Name1", JenkinsState.Successful, 20), "Repeated states are not recorded")
+        for (when, state) in [(30, JenkinsState.Failed), (40, JenkinsState.Successful), (50, JenkinsState.Unstable)]:
+            history.record("Name1", state, when)
+        self.assertEqual(history.entries("Name1"), [(JenkinsState.Failed, 30), (JenkinsState.Successful, 40), (JenkinsState.Unstable, 50)],
+                         "The oldest entries are overwritten")
+
+    def testStatistics(self):
+        history = StateHistory()
+        history.record("Name1", JenkinsState.Successful, 0)
+        history.record("Name1", JenkinsState.Failed, SECONDS_PER_DAY / 4)
+        history.record("Name1", JenkinsState.Successful, SECONDS_PER_DAY / 2)
+        self.assertEqual(history.flipsPerDay("Name1", SECONDS_PER_DAY), 2.0, "Two flips in a day")
+        self.assertEqual(history.flipsPerDay("Name2", SECONDS_PER_DAY), 0.0, "No flips without history")
+        self.assertFalse(history.isFlaky("Name1", 2, SECONDS_PER_DAY), "Flipping exactly as often as allowed is not flaky")
+        self.assertTrue(history.isFlaky("Name1", 1.5, SECONDS_PER_DAY), "Flipping more often than allowed is flaky")
+        history.record("Name3", JenkinsState.Successful, 0)
+        history.record("Name3", JenkinsState.Failed, 60 * 60)
+        self.assertEqual(history.flipsPerDay("Name3", 60 * 60), 1.0, "A flip soon after the first record counts over a whole day")
+        self.assertEqual(history.timeInState("Name1", SECONDS_PER_DAY),
+                         {JenkinsState.Successful: SECONDS_PER_DAY * 3 / 4, JenkinsState.Failed: SECONDS_PER_DAY / 4}, "Time in each state")
+
+    def testMemoryBudget(self):
+        history = StateHistory(capacity=4, maxJobs=10)
+        for idx in range(100):
+            history.record("Name%d" % idx, JenkinsState.Successful, idx)
+            history.record("Name%d" % idx, JenkinsState.Failed, idx)
+        self.assertEqual(history.memoryUsage(), history.maxJobs * (5 * history.capacity + 4), "The arrays stay within the budget")
+        self.assertEqual(history.entries("Name0"), [], "The jobs changed longest ago make room")
+        self.assertEqual(len(history.entries("Name99")), 2, "Recent jobs are kept")
+        history.forget("Name99")
+        history.record("Other", JenkinsState.Failed, 200)
+        self.assertEqual(history.entries("Other"), [(JenkinsState.Failed, 200)], "Forgotten slots are reused")
+        self.assertEqual(history.memoryUsage(), history.maxJobs * (5 * history.capacity + 4), "Reusing slots takes no memory")
+
+    def testRoundtrip(self):
+        history = StateHistory(capacity=4)
+        history.record("Name1", JenkinsState.Successful, 10)
+        history.record("Name2", JenkinsState.Failed, 20)
+        history.forget("Name1")
+        restored = StateHistory(capacity=4)
+        restored.restore(history.toDict())
+        self.assertEqual(restored.entries("Name2"), [(JenkinsState.Failed, 20)], "Entries are restored")
+        self.assertEqual(restored.entries("Name1"), [], "Forgotten jobs stay forgotten")
+        other = StateHistory(capacity=8)
+        other.restore(history.toDict())
+        self.assertEqual(other.entries("Name2"), [], "Histories of another capacity are dropped")
+
+    def testMonitorHistory(self):
+        monitor = JenkinsMonitor()
+        monitor.jobs.append(JenkinsJob("Name1", True, "Url1", JenkinsState.Unknown))
+        monitor._recordHistory(monitor._refreshFromDict({"jobs": [{"name": "Name1", "url": "Url1", "color": "blue"},
+                                                                  {"name": "Name2", "url": "Url2", "color": "red"}]}))
+        monitor._recordHistory(monitor._refreshFromDict({"jobs": [{"name": "Name1", "url": "Url1", "color": "red"}]}))
+        self.assertEqual([state for (state, _) in monitor.history.entries("Name1")], [JenkinsState.Successful, JenkinsState.Failed],
+                         "States of monitored jobs are recorded")
+        self.assertEqual(monitor.history.entries("Name2"), [], "Unmonitored jobs have no history")
+
+class TestHistoryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.filename = os.path.join(self.directory, "jenkinstray.history")
+
+    def testRoundtrip(self):
+        monitor = JenkinsMonitor("http://server1")
+        monitor.history.record("Name1", JenkinsState.Failed, 10)
+        store = HistoryStore(self.filename)
+        self.assertEqual(store.load(), {}, "Nothing is restored without a history")
+        store.save([monitor])
+        restored = JenkinsMonitor("http://server1")
+        restored.history.restore(HistoryStore(self.filename).load()["http://server1"])
+        self.assertEqual(restored.history.entries("Name1"), [(JenkinsState.Failed, 10)], "Histories are saved per server")
+
+    def testBrokenFile(self):
+        with open(self.filename, "wb") as historyfile:
+            historyfile.write("not compressed")
+        self.assertEqual(HistoryStore(self.filename).load(), {}, "Broken histories are ignored")
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+from jenkinstray.httptransport import HttpTransport
+
+import base64
+import gzip
+import os
+from StringIO import StringIO
+from threading import Thread
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+class TestHttpTransport(unittest.TestCase):
+    class KeepAliveRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        body = "{}"
+        def do_GET(self):
+            body = self.server.body
+            self.server.proxyAuthorization = self.headers.getheader("Proxy-Authorization")
+            if self.server.redirect is not None:
+                self.send_response(302)
+                self.send_header("location", self.server.redirect)
+                self.server.redirect = None
+            else:
+                self.send_response(200)
+            self.send_header("content-type", "application/json")
+            if self.server.gzip is True and "gzip" in self.headers.getheader("Accept-Encoding", ""):
+                compressed = StringIO()
+                gzipfile = gzip.GzipFile(fileobj=compressed, mode="wb")
+                gzipfile.write(body)
+                gzipfile.close()
+                body = compressed.getvalue()
+                self.send_header("content-encoding", "gzip")
+            elif self.server.gzip == "broken":
+                self.send_header("content-encoding", "gzip")
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            self.server.connections.add(self.client_address)
+            if self.server.dropConnections:
+                # close the connection without telling the client
+                self.close_connection = 1
+
+        def log_message(self, *args):
+            pass
+
+    def startServer(self, body, gzip=False, dropConnections=False, redirect=None):
+        server = HTTPServer(("localhost", 0), TestHttpTransport.KeepAliveRequestHandler)
+        server.body = body
+        server.gzip = gzip
+        server.dropConnections = dropConnections
+        server.redirect = redirect
+        server.connections = set()
+        thread = Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return (server, "http://localhost:%s" % server.server_address[1])
+
+    def testConnectionReuse(self):
+        (server, url) = self.startServer("content")
+        transport = HttpTransport()
+        self.addCleanup(transport.close)
+        for _ in range(3):
+            response = transport.request(url + "/api/json")
+            self.assertEqual((response.status, response.body), (200, "content"), "Response received")
+        self.assertEqual(len(server.connections), 1, "One connection used for all requests")
+        stats = transport.stats()[url]
+        self.assertEqual((stats.newRequests, stats.reusedRequests), (1, 2), "Connection reuse is counted")
+
+    def testStaleConnection(self):
+        (server, url) = self.startServer("content", dropConnections=True)
+        transport = HttpTransport()
+        self.addCleanup(transport.close)
+        for _ in range(3):
+            response = transport.request(url + "/api/json")
+            self.assertEqual((response.status, response.body), (200, "content"), "Response received after reconnecting")
+        self.assertEqual(len(server.connections), 3, "New connection for each request")
+        stats = transport.stats()[url]
+        self.assertEqual((stats.newRequests, stats.reusedRequests), (3, 0), "Only new connections counted")
+
+    def testGzipEncoding(self):
+        (_, url) = self.startServer("compressed content", gzip=True)
+        transport = HttpTransport()
+        self.addCleanup(transport.close)
+        self.assertEqual(transport.request(url).body, "compressed content", "Gzip encoded response is decoded")
+
+    def testBrokenGzipEncoding(self):
+        (_, url) = self.startServer("not compressed", gzip="broken")
+        transport = HttpTransport()
+        self.addCleanup(transport.close)
+        self.assertRaises(IOError, transport.request, url)
+
+    def testProxyCredentials(self):
+        (server, url) = self.startServer("proxied")
+        for name in ["http_proxy", "HTTP_PROXY", "no_proxy", "NO_PROXY"]:
+            self.addCleanup(self.restoreEnvironment, name, os.environ.pop(name, None))
+        os.environ["http_proxy"] = url.replace("http://", "http://user:secret@")
+        transport = HttpTransport()
+        self.addCleanup(transport.close)
+        self.assertEqual(transport.request("http://jenkins.invalid/api/json").body, "proxied", "Request sent through the proxy")
+        self.assertEqual(server.proxyAuthorization, "Basic " + base64.b64encode("user:secret"), "Proxy credentials sent as Proxy-Authorization")
+
+    def restoreEnvironment(self, name, value):
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
+    def testRedirect(self):
+        (_, url) = self.startServer("content", redirect="/redirected")
+        transport = HttpTransport()
+        self.addCleanup(transport.close)
+        response = transport.request(url)
+        self.assertEqual((response.status, response.body, response.url), (200, "content", url + "/redirected"), "Redirect is followed")
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+from jenkinstray.instrumentation import RollingStats, Instrumentation, Profiler
+
+import os
+import pstats
+import tempfile
+from threading import Thread
+
+class TestInstrumentation(unittest.TestCase):
+
+    def testPercentiles(self):
+        stats = RollingStats(100)
+        self.assertIsNone(stats.percentile(50), "No percentile without samples")
+        for value in range(1, 101):
+            stats.add(value)
+        self.assertEqual(stats.percentiles(), {50: 50, 90: 90, 99: 99}, "Nearest rank percentiles")
+        self.assertEqual((stats.percentile(0), stats.percentile(100)), (1, 100), "Minimum and maximum")
+
+    def testRollingWindow(self):
+        stats = RollingStats(10)
+        for value in range(100):
+            stats.add(value)
+        self.assertEqual(stats.count, 100, "All samples are counted")
+        self.assertEqual(list(stats.samples), range(90, 100), "Only the last samples are kept")
+        self.assertEqual(stats.percentile(50), 94, "Percentiles of the kept samples")
+
+    def testPhasesAndServers(self):
+        instrumentation = Instrumentation()
+        with instrumentation.phase("fetch"):
+            pass
+        instrumentation.record("fetch", 2.0)
+        instrumentation.recordServerLatency("http://server", 0.5)
+        self.assertEqual(instrumentation.phasePercentiles((100,)), {"fetch": {100: 2.0}}, "Phase timings recorded")
+        self.assertEqual(instrumentation.serverPercentiles((50,)), {"http://server": {50: 0.5}}, "Server latencies recorded")
+        self.assertIn("phase fetch", instrumentation.report(), "Phases are reported")
+        self.assertIn("server http://server", instrumentation.report(), "Servers are reported")
+
+    def testProfiler(self):
+        profiler = Profiler()
+        def work(count):
+            return sum(range(count))
+        threads = [Thread(target=lambda: profiler.runcall(work, 1000)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(profiler.runcall(work, 10), 45, "Result of the profiled call is returned")
+        (fd, filename) = tempfile.mkstemp(suffix=".prof")
+        os.close(fd)
+        self.addCleanup(os.remove, filename)
+        profiler.dump(filename)
+        calls = [stat[1] for (func, stat) in pstats.Stats(filename).stats.iteritems() if func[2] == "work"]
+        self.assertEqual(calls, [4], "Profiles of all threads are merged")
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+from jenkinstray.jenkinsapi import treeQuery, apiUrl, jobListUrl, fetchJobList, iterJobList
+
+import json
+import urllib
+from StringIO import StringIO
+from threading import Thread
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+class TestJenkinsApi(unittest.TestCase):
+    class RecordingRequestHandler(BaseHTTPRequestHandler):
+        paths = []
+        jsonData = json.dumps({"jobs": [{"name": "Name1", "color": "blue", "url": "Url1"}]})
+        def do_GET(self):
+            TestJenkinsApi.RecordingRequestHandler.paths.append(self.path)
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(TestJenkinsApi.RecordingRequestHandler.jsonData)))
+            self.end_headers()
+            self.wfile.write(TestJenkinsApi.RecordingRequestHandler.jsonData)
+
+        def log_message(self, *args):
+            pass
+
+    def testTreeQuery(self):
+        self.assertEqual(treeQuery(), "jobs[name,url,color]", "Only the job fields are selected")
+        self.assertEqual(treeQuery(("name",)), "jobs[name]", "Custom field selection")
+        self.assertEqual(treeQuery(depth=2), "jobs[name,url,color,jobs[name,url,color,jobs[name,url,color]]]", "Nested folder selection")
+
+    def testApiUrl(self):
+        self.assertEqual(apiUrl("http://jenkins"), "http://jenkins/api/json", "Plain api url")
+        self.assertEqual(apiUrl("http://jenkins/"), "http://jenkins/api/json", "Trailing slash is ignored")
+        self.assertEqual(apiUrl("http://jenkins", depth=1), "http://jenkins/api/json?depth=1", "Depth parameter")
+        self.assertEqual(urllib.unquote(jobListUrl("http://jenkins")), "http://jenkins/api/json?tree=jobs[name,url,color]", "Job list url uses the tree parameter")
+
+    def testFetchJobList(self):
+        server = HTTPServer(("localhost", 0), TestJenkinsApi.RecordingRequestHandler)
+        thread = Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            dictobj = fetchJobList("http://localhost:%s" % server.server_address[1])
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        self.assertEqual(dictobj, json.loads(TestJenkinsApi.RecordingRequestHandler.jsonData), "Job list is fetched")
+        self.assertEqual(map(urllib.unquote, TestJenkinsApi.RecordingRequestHandler.paths), ["/api/json?tree=jobs[name,url,color]"], "Only the needed fields are requested")
+
+    def testIterJobList(self):
+        document = {"_class": "hudson.model.Hudson",
+                    "numExecutors": 12345,
+                    "views": [{"name": "all", "jobs": [{"name": "ignored"}]}],
+                    "jobs": [{"name": u"N\u00e4me1", "url": "Url1", "color": "blue", "jobs": [{"name": "Nested"}]},
+                             {"name": "Name2", "url": "Url2", "color": "red", "number": 1.5e3},
+                             {"name": "Name3", "url": "Url3", "color": "yellow", "flags": [True, False, None]}],
+                    "useSecurity": True}
+        payload = json.dumps(document, ensure_ascii=False).encode("utf-8")
+        for chunkSize in [1, 7, 64, len(payload)]:
+            self.assertEqual(list(iterJobList(StringIO(payload), chunkSize)), document["jobs"], "Jobs decoded in chunks of %s bytes" % chunkSize)
+        self.assertEqual(list(iterJobList(StringIO(' { "jobs" : [ ] } '), 3)), [], "Empty job list")
+        self.assertRaises(ValueError, lambda: list(iterJobList(StringIO('{"primaryView": {"name": "all"}}'), 3)))
+        self.assertRaises(ValueError, lambda: list(iterJobList(StringIO('{}'), 3)))
+
+    def testIterJobListMalformed(self):
+        for payload in ['{"jobs": [{"name": "Name1"}', '{"jobs": [{"name": "Name1"} {"name": "Name2"}]}', '["jobs"]', '']:
+            self.assertRaises(ValueError, lambda: list(iterJobList(StringIO(payload), 4)))
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
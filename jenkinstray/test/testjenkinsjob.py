@@ -23,7 +23,7 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import unittest
-from jenkinstray.jenkinsjob import JenkinsJob, JenkinsState
+from jenkinstray.jenkinsjob import JenkinsJob, JenkinsState, parseColor, colorToJenkinsState, stateToColor
 
 class TestJenkinsJob(unittest.TestCase):
 
@@ -41,6 +41,27 @@ class TestJenkinsJob(unittest.TestCase):
         self.assertEqual(dictobj, {"name": "Name", "monitored": True, "url": "URL", "state": int(JenkinsState.Failed)}, "Verify dict conversion")
         self.assertEqual(JenkinsJob.fromDict(dictobj), job, "Conversion roundtrip generates 'same' object")
 
+    def testCompactRepresentation(self):
+        job = JenkinsJob("Name", True, "URL", JenkinsState.Failed)
+        self.assertFalse(hasattr(job, "__dict__"), "Jobs do not carry a per-instance dict")
+        self.assertRaises(AttributeError, lambda: setattr(job, "color", "red"))
+
+    def testColorParsing(self):
+        states = {"blue": JenkinsState.Successful, "yellow": JenkinsState.Unstable, "red": JenkinsState.Failed,
+                  "grey": JenkinsState.Disabled, "disabled": JenkinsState.Disabled, "notbuilt": JenkinsState.Disabled,
+                  "aborted": JenkinsState.Disabled}
+        for (color, state) in states.iteritems():
+            self.assertEqual(parseColor(color), (state, False), "State of %s" % color)
+            self.assertEqual(parseColor(color + "_anime"), (state, True), "State of %s while building" % color)
+            self.assertEqual(colorToJenkinsState(color + "_anime"), state, "Building does not change the state of %s" % color)
+        self.assertEqual(parseColor("purple"), (JenkinsState.Unknown, False), "Unknown colors")
+
+    def testStateToColor(self):
+        for state in JenkinsState:
+            for building in (False, True):
+                expected = (state, building and state != JenkinsState.Unknown)
+                self.assertEqual(parseColor(stateToColor(state, building)), expected, "Color of %s, building %s" % (state, building))
+
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
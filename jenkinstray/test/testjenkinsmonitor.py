@@ -23,10 +23,15 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import unittest
-from jenkinstray.jenkinsmonitor import JenkinsMonitor
+from jenkinstray.jenkinsmonitor import JenkinsMonitor, JobList, JobChanges, GENERATION_HEADER, DELTA_HEADER
 from jenkinstray.jenkinsjob import JenkinsJob, JenkinsState
+from jenkinstray.webhook import JobEvent
+from jenkinstray.rules import RuleSet
+from jenkinstray.instrumentation import instrumentation
 
+import gzip
 import json
+from StringIO import StringIO
 from threading import Thread
 from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
 
@@ -40,6 +45,71 @@ class TestJenkinsMonitor(unittest.TestCase):
             self.end_headers()
             self.wfile.write(TestJenkinsMonitor.FixedRequestHandler.jsonData)
 
+    class ChunkedGzipRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        jsonData = ""
+        def do_GET(self):
+            compressed = StringIO()
+            gzipfile = gzip.GzipFile(fileobj=compressed, mode="wb")
+            gzipfile.write(TestJenkinsMonitor.ChunkedGzipRequestHandler.jsonData)
+            gzipfile.close()
+            body = compressed.getvalue()
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-encoding", "gzip")
+            self.send_header("transfer-encoding", "chunked")
+            self.send_header("connection", "close")
+            self.end_headers()
+            for idx in range(0, len(body), 256):
+                chunk = body[idx:idx + 256]
+                self.wfile.write("%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write("0\r\n\r\n")
+
+        def log_message(self, *args):
+            pass
+
+    class DeltaRequestHandler(BaseHTTPRequestHandler):
+        jsonData = ""
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(TestJenkinsMonitor.DeltaRequestHandler.jsonData)))
+            self.send_header(GENERATION_HEADER, "daemon-2")
+            self.send_header(DELTA_HEADER, "1")
+            self.end_headers()
+            self.wfile.write(TestJenkinsMonitor.DeltaRequestHandler.jsonData)
+
+        def log_message(self, *args):
+            pass
+
+    class ETagRequestHandler(BaseHTTPRequestHandler):
+        jsonData = ""
+        etag = None
+        def do_GET(self):
+            if self.headers.getheader("If-None-Match") == TestJenkinsMonitor.ETagRequestHandler.etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(TestJenkinsMonitor.ETagRequestHandler.jsonData)))
+            self.send_header("etag", TestJenkinsMonitor.ETagRequestHandler.etag)
+            self.end_headers()
+            self.wfile.write(TestJenkinsMonitor.ETagRequestHandler.jsonData)
+
+        def log_message(self, *args):
+            pass
+
+    def startServer(self, handler):
+        server = HTTPServer(("localhost", 0), handler)
+        thread = Thread(target=server.serve_forever, name=str("localhost:%s" % server.server_address[1]),)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return "http://localhost:%s" % server.server_address[1]
+
     def testDictConversion(self):
         monitor = JenkinsMonitor()
         jobs = [JenkinsJob("Name1", True, "Url1", JenkinsState.Successful), JenkinsJob("Name2", False, "Url2", JenkinsState.Failed)]
@@ -72,6 +142,29 @@ class TestJenkinsMonitor(unittest.TestCase):
         monitor.jobs.append(JenkinsJob("Name7", False, "Url7", JenkinsState.Unstable))
         self.assertEqual(monitor.numUnstableMonitoredJobs(), 2, "Still Two monitored job unstable")
 
+    def testMonitoredStateHistogram(self):
+        monitor = JenkinsMonitor()
+        monitor._refreshFromDict({"jobs": [{"name":"Name1", "url": "Url1", "color": "yellow"},
+                                          {"name":"Name2", "url": "Url2", "color": "blue"},
+                                          {"name":"Name3", "url": "Url3", "color": "red"}]})
+        histogram = dict((state, 0) for state in JenkinsState)
+        self.assertEqual(monitor.monitoredStateHistogram(), histogram, "No jobs monitored initially")
+        monitor.findJob("Name1").enableMonitoring()
+        monitor.findJob("Name2").enableMonitoring()
+        monitor.findJob("Name2").enableMonitoring()
+        histogram.update({JenkinsState.Unstable: 1, JenkinsState.Successful: 1})
+        self.assertEqual(monitor.monitoredStateHistogram(), histogram, "Enabling monitoring is counted")
+
+        monitor._refreshFromDict({"jobs": [{"name":"Name2", "url": "Url2", "color": "red"},
+                                          {"name":"Name3", "url": "Url3", "color": "blue"}]})
+        histogram.update({JenkinsState.Unstable: 0, JenkinsState.Successful: 0, JenkinsState.Failed: 1})
+        self.assertEqual(monitor.monitoredStateHistogram(), histogram, "State changes and removed jobs are counted")
+        self.assertEqual((monitor.numFailedMonitoredJobs(), monitor.numUnstableMonitoredJobs(), monitor.numSuccessfulMonitoredJobs()), (1, 0, 0), "Counts per state")
+
+        monitor.findJob("Name2").disableMonitoring()
+        histogram[JenkinsState.Failed] = 0
+        self.assertEqual(monitor.monitoredStateHistogram(), histogram, "Disabling monitoring is counted")
+
     def testMonitoredJobs(self):
         monitor = JenkinsMonitor()
         jobs = [JenkinsJob("Name1", True, "Url1", JenkinsState.Successful), JenkinsJob("Name2", False, "Url2", JenkinsState.Failed)]
@@ -99,6 +192,86 @@ class TestJenkinsMonitor(unittest.TestCase):
         self.assertEqual(list(monitor.monitoredJobs()), [updatedJob1], "Only one job is monitored")
         self.assertEqual(list(monitor.allJobs()), [updatedJob1, JenkinsJob("Name3", False, "Url3", JenkinsState.Successful)], "two jobs alltogether")
 
+    def testJobIndex(self):
+        jobs = [JenkinsJob("Name1", True, "Url1", JenkinsState.Successful),
+                JenkinsJob("Name2", False, "Url2", JenkinsState.Failed),
+                JenkinsJob("Name3", True, "Url3", JenkinsState.Unstable)]
+        joblist = JobList(jobs)
+        self.assertEqual(list(joblist), jobs, "Jobs keep their order")
+        self.assertIs(joblist.find("Name2"), jobs[1], "Job found by name")
+        self.assertIsNone(joblist.find("Name4"), "Unknown job not found")
+        joblist.remove(jobs[1])
+        self.assertIsNone(joblist.find("Name2"), "Removed job not found anymore")
+        self.assertRaises(ValueError, lambda: joblist.remove(jobs[1]))
+        self.assertEqual(joblist.retainNames(set(["Name3"])), [jobs[0]], "Removed jobs are returned")
+        self.assertEqual(list(joblist), [jobs[2]], "Only retained job left")
+        self.assertIsNone(joblist.find("Name1"), "Removed job not found anymore")
+        self.assertIs(joblist.find("Name3"), jobs[2], "Retained job found by name")
+
+        monitor = JenkinsMonitor()
+        monitor._refreshFromDict({"jobs": [{"name":"Name1", "url": "Url1", "color": "yellow"},
+                                          {"name":"Name2", "url": "Url2", "color": "blue"}]})
+        self.assertEqual(monitor.findJob("Name2"), JenkinsJob("Name2", False, "Url2", JenkinsState.Successful), "Refreshed jobs are indexed")
+        monitor._refreshFromDict({"jobs": [{"name":"Name2", "url": "Url2", "color": "red"}]})
+        self.assertIsNone(monitor.findJob("Name1"), "Jobs removed on the server are not indexed anymore")
+        self.assertIs(JenkinsMonitor.fromDict(monitor.toDict()).findJob("Name2").state, JenkinsState.Failed, "Restored jobs are indexed")
+
+    def testChangesFromData(self):
+        monitor = JenkinsMonitor()
+        changes = monitor._refreshFromDict({"jobs": [{"name":"Name1", "url": "Url1", "color": "yellow"},
+                                                    {"name":"Name2", "url": "Url2", "color": "blue"}]})
+        (job1, job2) = list(monitor.allJobs())
+        self.assertEqual(changes, JobChanges(added=[job1, job2]), "All jobs added initially")
+
+        changes = monitor._refreshFromDict({"jobs": [{"name":"Name1", "url": "Url1", "color": "yellow"},
+                                                    {"name":"Name2", "url": "Url2", "color": "blue"}]})
+        self.assertFalse(changes, "Nothing changed")
+
+        changes = monitor._refreshFromDict({"jobs": [{"name":"Name2", "url": "Url2", "color": "red"},
+                                                    {"name":"Name3", "url": "Url3", "color": "blue"}]})
+        job3 = monitor.findJob("Name3")
+        self.assertEqual(changes, JobChanges(added=[job3], removed=[job1], transitions=[(job2, JenkinsState.Successful, JenkinsState.Failed)]), "Job added, removed and changed")
+        self.assertEqual(job2.lastState, JenkinsState.Successful, "Last state is remembered")
+
+        changes = monitor._refreshFromDict({"jobs": [{"name":"Name2", "url": "Url2", "color": "red"},
+                                                    {"name":"Name3", "url": "Url3", "color": "blue"}]})
+        self.assertFalse(changes, "Nothing changed")
+        self.assertEqual(job2.lastState, JenkinsState.Successful, "Last state is kept if the state did not change")
+
+    def testRestoreState(self):
+        monitor = JenkinsMonitor()
+        monitor.jobs.append(JenkinsJob("Name1", True, "Unknown", JenkinsState.Unknown))
+        monitor.restoreState({"jobs": [JenkinsJob("Name1", False, "Url1", JenkinsState.Successful).toDict(),
+                                       JenkinsJob("Name2", True, "Url2", JenkinsState.Failed).toDict()]})
+        (job1, job2) = list(monitor.allJobs())
+        self.assertEqual((job1.url, job1.state, job1.monitored), ("Url1", JenkinsState.Successful, True), "State of known jobs is restored")
+        self.assertEqual((job2.url, job2.state, job2.monitored), ("Url2", JenkinsState.Failed, False), "Unknown jobs are added unmonitored")
+        self.assertEqual(monitor.numSuccessfulMonitoredJobs(), 1, "Restored states are counted")
+        changes = monitor._refreshFromDict({"jobs": [{"name":"Name1", "url": "Url1", "color": "red"},
+                                                    {"name":"Name2", "url": "Url2", "color": "red"}]})
+        self.assertEqual(changes, JobChanges(transitions=[(job1, JenkinsState.Successful, JenkinsState.Failed)]), "Changes relative to the restored states")
+
+        monitor = JenkinsMonitor()
+        monitor.jobs.append(JenkinsJob("Name1", True, "Unknown", JenkinsState.Unknown))
+        monitor.restoreState({"jobs": [JenkinsJob("Name1", True, "Url1", JenkinsState.Successful).toDict(),
+                                       JenkinsJob("Name2", False, "Url2", JenkinsState.Failed).toDict()]}, addJobs=False)
+        self.assertEqual([(job.name, job.state) for job in monitor.allJobs()], [("Name1", JenkinsState.Successful)], "Unknown jobs are skipped if asked to")
+
+    def testBuildingJobs(self):
+        monitor = JenkinsMonitor()
+        monitor._refreshFromDict({"jobs": [{"name":"Name1", "url": "Url1", "color": "red_anime"},
+                                          {"name":"Name2", "url": "Url2", "color": "blue_anime"}]})
+        monitor.findJob("Name1").enableMonitoring()
+        changes = monitor._refreshFromDict({"jobs": [{"name":"Name1", "url": "Url1", "color": "red_anime"},
+                                                    {"name":"Name2", "url": "Url2", "color": "blue_anime"}]})
+        self.assertFalse(changes, "Building does not change the state")
+        self.assertEqual([job.building for job in monitor.allJobs()], [True, True], "Building jobs are flagged")
+        self.assertEqual(monitor.numBuildingMonitoredJobs(), 1, "Only monitored jobs are counted")
+        monitor._refreshFromDict({"jobs": [{"name":"Name1", "url": "Url1", "color": "red"},
+                                          {"name":"Name2", "url": "Url2", "color": "blue_anime"}]})
+        self.assertEqual([job.building for job in monitor.allJobs()], [False, True], "Finished builds are not flagged")
+        self.assertEqual(monitor.numBuildingMonitoredJobs(), 0, "Finished builds are not counted")
+
     def testUpdatingFromServer(self):
         TestJenkinsMonitor.FixedRequestHandler.jsonData = json.dumps(
                     {"jobs":[{"name": "Name1", "color": "blue", "url": "Url1"},
@@ -113,7 +286,9 @@ class TestJenkinsMonitor(unittest.TestCase):
         monitor = JenkinsMonitor("http://localhost:%s" % server.server_address[1])
 
         self.assertEqual(list(monitor.allJobs()), [], "No jobs registered initially")
+        self.assertIsNone(monitor.lastRefreshed, "Not refreshed initially")
         monitor.refreshFromServer()
+        self.assertIsNotNone(monitor.lastRefreshed, "Time of the refresh is remembered")
 
         joblist1 = [JenkinsJob("Name1", False, "Url1", JenkinsState.Successful),
                     JenkinsJob("Name2", False, "Url2", JenkinsState.Failed),
@@ -142,6 +317,128 @@ class TestJenkinsMonitor(unittest.TestCase):
 
         thread.join()
 
+    def testSkipUnchangedContent(self):
+        TestJenkinsMonitor.FixedRequestHandler.jsonData = json.dumps({"jobs":[{"name": "Name1", "color": "blue", "url": "Url1"}]})
+        monitor = JenkinsMonitor(self.startServer(TestJenkinsMonitor.FixedRequestHandler))
+        self.assertTrue(monitor.refreshFromServer(), "First refresh processes the data")
+        monitor.jobs[0].enableMonitoring()
+        self.assertFalse(monitor.refreshFromServer(), "Unchanged data is skipped")
+        self.assertEqual((monitor.pollsProcessed, monitor.pollsSkipped), (1, 1), "Poll counters")
+
+        TestJenkinsMonitor.FixedRequestHandler.jsonData = json.dumps({"jobs":[{"name": "Name1", "color": "red", "url": "Url1"}]})
+        self.assertTrue(monitor.refreshFromServer(), "Changed data is processed")
+        self.assertEqual(list(monitor.allJobs()), [JenkinsJob("Name1", True, "Url1", JenkinsState.Failed)], "Job updated")
+        monitor.invalidateCache()
+        self.assertFalse(monitor.refreshFromServer(), "No changes in the data")
+        self.assertEqual((monitor.pollsProcessed, monitor.pollsSkipped), (3, 1), "Data is processed again after invalidating the cache")
+
+    def testStreamingRefresh(self):
+        TestJenkinsMonitor.FixedRequestHandler.jsonData = json.dumps({"jobs":[{"name": "Name1", "color": "blue", "url": "Url1"},
+                                                                             {"name": "Name2", "color": "red", "url": "Url2"}]})
+        monitor = JenkinsMonitor(self.startServer(TestJenkinsMonitor.FixedRequestHandler))
+        monitor.streamingThreshold = 0
+        changes = monitor.refreshFromServer()
+        self.assertEqual(list(monitor.allJobs()), [JenkinsJob("Name1", False, "Url1", JenkinsState.Successful),
+                                                   JenkinsJob("Name2", False, "Url2", JenkinsState.Failed)], "Jobs streamed from the server")
+        self.assertEqual(changes, JobChanges(added=list(monitor.allJobs())), "Changes of streamed refresh")
+
+        TestJenkinsMonitor.FixedRequestHandler.jsonData = json.dumps({"jobs":[{"name": "Name2", "color": "blue", "url": "Url2"}]})
+        changes = monitor.refreshFromServer()
+        job2 = monitor.findJob("Name2")
+        self.assertEqual(list(monitor.allJobs()), [job2], "Removed job is gone after streamed refresh")
+        self.assertEqual(changes.transitions, [(job2, JenkinsState.Failed, JenkinsState.Successful)], "Transition of streamed refresh")
+        self.assertEqual((monitor.pollsProcessed, monitor.pollsSkipped), (2, 0), "Streamed polls are processed")
+
+    def testStreamingDecidedByDecodedSize(self):
+        jobs = [{"name": "Name%d" % idx, "color": "blue", "url": "Url%d" % idx} for idx in range(200)]
+        TestJenkinsMonitor.ChunkedGzipRequestHandler.jsonData = json.dumps({"jobs": jobs})
+        monitor = JenkinsMonitor(self.startServer(TestJenkinsMonitor.ChunkedGzipRequestHandler))
+        monitor.streamingThreshold = 4096
+        streamed = instrumentation().phaseCount("stream")
+        self.assertEqual(len(monitor.refreshFromServer().added), 200, "All jobs of the chunked gzip response are added")
+        self.assertEqual(instrumentation().phaseCount("stream"), streamed + 1, "Job list larger than the threshold once decoded is streamed")
+        self.assertIsNotNone(monitor.bodyHash, "Streamed job list is hashed")
+
+        TestJenkinsMonitor.ChunkedGzipRequestHandler.jsonData = json.dumps({"jobs": jobs[:2]})
+        monitor.streamingThreshold = len(TestJenkinsMonitor.ChunkedGzipRequestHandler.jsonData)
+        self.assertEqual(len(monitor.refreshFromServer().removed), 198, "Small job list is processed")
+        self.assertFalse(monitor.refreshFromServer(), "Unchanged small job list is skipped")
+        self.assertEqual(instrumentation().phaseCount("stream"), streamed + 1, "Job list up to the threshold is not streamed")
+        self.assertEqual((monitor.pollsProcessed, monitor.pollsSkipped), (2, 1), "Poll counters")
+
+    def testMalformedJobList(self):
+        monitor = JenkinsMonitor(self.startServer(TestJenkinsMonitor.FixedRequestHandler))
+        monitor.jobs.append(JenkinsJob("Name1", True, "Url1", JenkinsState.Successful))
+        for streamingThreshold in [None, 0]:
+            monitor.streamingThreshold = streamingThreshold
+            for jsonData in ['{"jobs": [{"name": "Name1", "color": "red", "url": "Url1"}, {"name": ', '{"primaryView": {}}']:
+                TestJenkinsMonitor.FixedRequestHandler.jsonData = jsonData
+                monitor.findJob("Name1").state = JenkinsState.Successful
+                monitor.bodyHash = "hash"
+                self.assertRaises(RuntimeError, monitor.refreshFromServer)
+                self.assertEqual(list(monitor.allJobs()), [JenkinsJob("Name1", True, "Url1", JenkinsState.Unknown)], "Jobs kept in unknown state")
+                self.assertIsNone(monitor.bodyHash, "Cache invalidated")
+
+    def testMalformedDelta(self):
+        monitor = JenkinsMonitor(self.startServer(TestJenkinsMonitor.DeltaRequestHandler))
+        monitor.generation = "daemon-1"
+        for jsonData in ['{"removed": []}', '{"jobs": [', '[]']:
+            TestJenkinsMonitor.DeltaRequestHandler.jsonData = jsonData
+            self.assertRaises(RuntimeError, monitor.refreshFromServer)
+            self.assertIsNone(monitor.generation, "Generation of a delta that was not applied is not taken over")
+        TestJenkinsMonitor.DeltaRequestHandler.jsonData = json.dumps({"jobs": [], "removed": []})
+        monitor.refreshFromServer()
+        self.assertEqual(monitor.generation, "daemon-2", "Generation of an applied delta is taken over")
+
+    def testConditionalRefresh(self):
+        TestJenkinsMonitor.ETagRequestHandler.jsonData = json.dumps({"jobs":[{"name": "Name1", "color": "blue", "url": "Url1"}]})
+        TestJenkinsMonitor.ETagRequestHandler.etag = '"1"'
+        monitor = JenkinsMonitor(self.startServer(TestJenkinsMonitor.ETagRequestHandler))
+        self.assertTrue(monitor.refreshFromServer(), "First refresh processes the data")
+        self.assertEqual(monitor.etag, '"1"', "ETag is remembered")
+        self.assertFalse(monitor.refreshFromServer(), "Not modified response is skipped")
+        self.assertEqual(list(monitor.allJobs()), [JenkinsJob("Name1", False, "Url1", JenkinsState.Successful)], "Jobs kept on not modified response")
+
+        TestJenkinsMonitor.ETagRequestHandler.jsonData = json.dumps({"jobs":[{"name": "Name1", "color": "yellow", "url": "Url1"}]})
+        TestJenkinsMonitor.ETagRequestHandler.etag = '"2"'
+        self.assertTrue(monitor.refreshFromServer(), "Modified data is processed")
+        self.assertEqual(monitor.etag, '"2"', "New ETag is remembered")
+        self.assertEqual(list(monitor.allJobs()), [JenkinsJob("Name1", False, "Url1", JenkinsState.Unstable)], "Job updated")
+        self.assertEqual((monitor.pollsProcessed, monitor.pollsSkipped), (2, 1), "Poll counters")
+
+    def testAutoMonitor(self):
+        TestJenkinsMonitor.FixedRequestHandler.jsonData = json.dumps(
+                    {"jobs":[{"name": "main", "color": "blue", "url": "Url1"},
+                             {"name": "pr-1", "color": "red_anime", "url": "Url2"}]})
+        monitor = JenkinsMonitor(self.startServer(TestJenkinsMonitor.FixedRequestHandler))
+        monitor.autoMonitor = RuleSet(["pr-*"])
+        monitor.refreshFromServer(timeout=5)
+        self.assertEqual([job.name for job in monitor.monitoredJobs()], ["pr-1"], "Added jobs matching the rules are monitored")
+        self.assertEqual(monitor.numBuildingMonitoredJobs(), 1, "Building jobs monitored by the rules are counted")
+        monitor.findJob("pr-1").disableMonitoring()
+        monitor.refreshFromServer(timeout=5)
+        self.assertEqual(list(monitor.monitoredJobs()), [], "Known jobs are left alone")
+        changes = monitor.applyEvent(JobEvent("pr-2", "Url3", JenkinsState.Successful, False, 0))
+        self.assertTrue(changes.added[0].monitored, "Jobs added by events are monitored by the rules")
+
+    def testApplyEvent(self):
+        monitor = JenkinsMonitor("http://jenkins")
+        monitor.jobs.append(JenkinsJob("Job1", True, "Url1", JenkinsState.Successful))
+        (monitor.etag, monitor.bodyHash, monitor.generation) = ('"1"', "hash", "daemon-1")
+        changes = monitor.applyEvent(JobEvent("Job1", "Url1", None, True, 0))
+        self.assertFalse(changes, "A started build changes no state")
+        self.assertEqual(monitor.numBuildingMonitoredJobs(), 1, "The job is building")
+        self.assertEqual((monitor.etag, monitor.bodyHash, monitor.generation), (None, None, None), "The next refresh checks the changed job")
+        monitor.bodyHash = "hash"
+        monitor.applyEvent(JobEvent("Job1", "Url1", None, True, 0))
+        self.assertEqual(monitor.bodyHash, "hash", "Events changing nothing keep the cache")
+        changes = monitor.applyEvent(JobEvent("Job1", "Url1", JenkinsState.Failed, False, 0))
+        self.assertEqual(changes.transitions, [(monitor.findJob("Job1"), JenkinsState.Successful, JenkinsState.Failed)], "The finished build changes the state")
+        self.assertEqual(monitor.numBuildingMonitoredJobs(), 0, "The job finished building")
+        changes = monitor.applyEvent(JobEvent("Job2", "Url2", JenkinsState.Successful, False, 0))
+        self.assertEqual([job.name for job in changes.added], ["Job2"], "Jobs of events are added")
+        self.assertFalse(monitor.findJob("Job2").monitored, "Added jobs are not monitored")
+
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
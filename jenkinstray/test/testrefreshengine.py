@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+from jenkinstray.jenkinsmonitor import JenkinsMonitor, JobChanges
+from jenkinstray.jenkinsjob import JenkinsJob, JenkinsState
+from jenkinstray.refreshengine import RefreshEngine
+
+import json
+import time
+from threading import Thread, Event
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+class TestRefreshEngine(unittest.TestCase):
+    class DelayedRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(self.server.delay)
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(self.server.jsonData)))
+            self.end_headers()
+            self.wfile.write(self.server.jsonData)
+
+        def log_message(self, *args):
+            pass
+
+    def setUp(self):
+        self.servers = []
+
+    def tearDown(self):
+        for (server, thread) in self.servers:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def startServer(self, delay, jobname):
+        server = HTTPServer(("localhost", 0), TestRefreshEngine.DelayedRequestHandler)
+        server.delay = delay
+        server.jsonData = json.dumps({"jobs": [{"name": jobname, "color": "blue", "url": "Url"}]})
+        thread = Thread(target=server.serve_forever, name=str("localhost:%s" % server.server_address[1]),)
+        thread.daemon = True
+        thread.start()
+        self.servers.append((server, thread))
+        return JenkinsMonitor("http://localhost:%s" % server.server_address[1])
+
+    def testConcurrentRefresh(self):
+        monitors = [self.startServer(0.5, "Name%s" % i) for i in range(4)]
+        engine = RefreshEngine(maxWorkers=4, timeout=5)
+        start = time.time()
+        results = engine.refresh(monitors)
+        elapsed = time.time() - start
+        self.assertLess(elapsed, 1.5, "Servers are polled concurrently, not one after another")
+        self.assertEqual(results, [(monitor, JobChanges(added=list(monitor.allJobs())), None) for monitor in monitors], "All servers refreshed without errors, in order")
+        for (i, monitor) in enumerate(monitors):
+            self.assertEqual(list(monitor.allJobs()), [JenkinsJob("Name%s" % i, False, "Url", JenkinsState.Successful)], "Jobs fetched from each server")
+
+    def testBoundedWorkers(self):
+        monitors = [self.startServer(0.3, "Name%s" % i) for i in range(4)]
+        engine = RefreshEngine(maxWorkers=2, timeout=5)
+        start = time.time()
+        results = engine.refresh(monitors)
+        elapsed = time.time() - start
+        self.assertGreaterEqual(elapsed, 0.6, "At most two servers are polled at the same time")
+        self.assertEqual(results, [(monitor, JobChanges(added=list(monitor.allJobs())), None) for monitor in monitors], "All servers refreshed without errors")
+
+    def testSlowServerTimesOut(self):
+        fast = self.startServer(0, "Fast")
+        slow = self.startServer(2, "Slow")
+        slow.jobs.append(JenkinsJob("Slow", True, "Url", JenkinsState.Successful))
+        engine = RefreshEngine(maxWorkers=2, timeout=0.5)
+        start = time.time()
+        results = engine.refresh([slow, fast])
+        elapsed = time.time() - start
+        self.assertLess(elapsed, 1.5, "Slow server does not stall the refresh beyond the timeout")
+        self.assertEqual(results[1], (fast, JobChanges(added=list(fast.allJobs())), None), "Fast server refreshed fine")
+        self.assertIs(results[0][0], slow)
+        self.assertIsInstance(results[0][2], RuntimeError, "Slow server reports an error")
+        self.assertEqual(list(slow.allJobs())[0].state, JenkinsState.Unknown, "Jobs of the unreachable server are in unknown state")
+
+    def testRefreshAsync(self):
+        monitors = [self.startServer(0.3, "Name%s" % i) for i in range(2)]
+        engine = RefreshEngine()
+        finished = Event()
+        received = []
+        refreshing = []
+        def callback(results):
+            refreshing.append(engine.isRefreshing())
+            received.extend(results)
+            finished.set()
+        self.assertTrue(engine.refreshAsync(monitors, callback), "Refresh started")
+        self.assertFalse(engine.refreshAsync(monitors, callback), "No overlapping refresh while the previous one is running")
+        self.assertTrue(finished.wait(5), "Callback invoked")
+        self.assertEqual(received, [(monitor, JobChanges(added=list(monitor.allJobs())), None) for monitor in monitors], "Results handed to the callback")
+        self.assertEqual(refreshing, [False], "Refresh is finished once the callback runs")
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+from jenkinstray.rules import RuleSet, NameMatcher, ruleSetFromSettings, translateGlob
+from jenkinstray.jenkinsjob import JenkinsJob, JenkinsState
+
+import fnmatch
+import json
+import re
+from threading import Thread
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+class TestRules(unittest.TestCase):
+    class ViewRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            names = self.server.views.get(self.path.partition("?")[0])
+            if names is None:
+                self.send_error(404)
+                return
+            data = json.dumps({"jobs": [{"name": name, "url": "Url", "color": "blue"} for name in names]})
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    def startServer(self, views):
+        server = HTTPServer(("localhost", 0), TestRules.ViewRequestHandler)
+        server.views = views
+        thread = Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return "http://localhost:%s" % server.server_address[1]
+
+    def testTranslateGlob(self):
+        names = ["release-1.0", "release", "pr-12", "Pr-1", "a]", "^x", "folder/job"]
+        for glob in ["release-*", "pr-??", "[pP]r-[0-9]", "[!p]*", "[]]*", "[^]x", "folder/*"]:
+            for name in names:
+                self.assertEqual(re.match(translateGlob(glob), name) is not None, fnmatch.fnmatchcase(name, glob),
+                                 "%s matches %s like fnmatch" % (glob, name))
+
+    def testNameMatcher(self):
+        matcher = NameMatcher(["release-*"], ["^pr-\\d+$", "nightly"])
+        self.assertEqual([name for name in ["release-1", "pr-12", "pr-x", "my-nightly-build", "main"] if matcher.matches(name)],
+                         ["release-1", "pr-12", "my-nightly-build"], "Globs match whole names, regexes anywhere")
+        self.assertFalse(NameMatcher([], []).matches("main"), "No rules match nothing")
+        many = NameMatcher([], ["^(job)(%d)$" % idx for idx in range(200)])
+        self.assertTrue(many.matches("job199"), "Rules with more groups than one expression allows")
+
+    def testRegexesKeepTheirMeaning(self):
+        self.assertFalse(RuleSet(["release-*", "re:(?i)nightly"]).matches("RELEASE-1"), "Inline flags only apply to their own rule")
+        self.assertTrue(RuleSet(["release-*", "re:(?i)nightly"]).matches("NIGHTLY"), "Inline flags apply to their rule")
+        self.assertTrue(RuleSet(["re:(a)\\1", "re:(b)\\1"]).matches("bb"), "Backreferences refer to the groups of their own rule")
+
+    def testRuleSet(self):
+        rules = RuleSet(["release-*", "re:^feature/"], ["*-wip"])
+        jobs = [JenkinsJob(name, False, "Url", JenkinsState.Unknown) for name in ["release-1", "release-2-wip", "feature/x", "main"]]
+        jobs.append(JenkinsJob("release-3", True, "Url", JenkinsState.Unknown))
+        self.assertEqual([job.name for job in rules.apply(jobs)], ["release-1", "feature/x"], "Included jobs that are not excluded")
+        self.assertEqual([job.name for job in jobs if job.monitored], ["release-1", "feature/x", "release-3"], "Matched jobs are monitored")
+
+    def testViews(self):
+        serverurl = self.startServer({"/view/Nightly%20Builds/api/json": ["nightly", "folder"], "/view/Broken/api/json": ["main"]})
+        rules = RuleSet(["view:Nightly Builds", "main"], ["view:Broken", "view:Missing"])
+        self.assertEqual(rules.views(), ["Broken", "Missing", "Nightly Builds"], "Views of the rules")
+        self.assertFalse(rules.matches("nightly"), "Views are not known before they are fetched")
+        rules.fetchViews(serverurl, 5)
+        self.assertEqual([name for name in ["nightly", "folder/job", "main", "other"] if rules.matches(name)],
+                         ["nightly", "folder/job"], "Jobs of views and of folders in views")
+
+    def testFromSettings(self):
+        self.assertIsNone(ruleSetFromSettings(None), "No rules")
+        self.assertIsNone(ruleSetFromSettings({"exclude": ["*"]}), "Nothing is monitored without include rules")
+        self.assertTrue(ruleSetFromSettings({"include": ["*"]}).matches("main"), "Include rules")
+        self.assertRaises(ValueError, ruleSetFromSettings, {"include": ["re:("]})
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+from jenkinstray.scheduler import PollScheduler
+from jenkinstray.jenkinsmonitor import JenkinsMonitor, JobChanges
+from jenkinstray.jenkinsjob import JenkinsJob, JenkinsState
+
+class TestPollScheduler(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.scheduler = PollScheduler(60, rng=lambda: 0.5, clock=lambda: self.now)
+
+    def testNewMonitorsAreDue(self):
+        monitors = [JenkinsMonitor("http://server1"), JenkinsMonitor("http://server2")]
+        self.assertIsNone(self.scheduler.nextDueIn(), "Nothing to schedule without monitors")
+        for monitor in monitors:
+            self.scheduler.add(monitor)
+        self.assertEqual(set(self.scheduler.dueMonitors()), set(monitors), "New monitors are due immediately")
+        self.assertEqual(self.scheduler.nextDueIn(), 0, "Refresh due now")
+        self.scheduler.reschedule(monitors[0], JobChanges(), None)
+        self.assertEqual(self.scheduler.dueMonitors(), [monitors[1]], "Refreshed monitor is not due anymore")
+        self.scheduler.remove(monitors[1])
+        self.assertEqual(self.scheduler.nextDueIn(), 60, "Next refresh after the interval")
+
+    def testBackoff(self):
+        monitor = JenkinsMonitor("http://server")
+        self.scheduler.add(monitor)
+        intervals = []
+        for _ in range(5):
+            self.scheduler.reschedule(monitor, JobChanges(), None)
+            intervals.append(self.scheduler.currentInterval(monitor))
+        self.assertEqual(intervals, [60, 120, 240, 240, 240], "Idle server is backed off up to the maximum interval")
+
+        self.scheduler.reschedule(monitor, JobChanges(transitions=[(None, JenkinsState.Successful, JenkinsState.Failed)]), None)
+        self.assertEqual(self.scheduler.currentInterval(monitor), 30, "Changed server is polled more often")
+        self.assertEqual(self.scheduler.nextDueIn(), 30, "Next due time follows the interval")
+
+        intervals = []
+        for _ in range(4):
+            self.scheduler.reschedule(monitor, None, RuntimeError())
+            intervals.append(self.scheduler.currentInterval(monitor))
+        self.assertEqual(intervals, [120, 240, 240, 240], "Unreachable server is backed off")
+
+    def testBuildingJobs(self):
+        monitor = JenkinsMonitor("http://server")
+        monitor.jobs.append(JenkinsJob("Name1", True, "Url1", JenkinsState.Successful))
+        monitor._refreshFromDict({"jobs": [{"name": "Name1", "url": "Url1", "color": "blue_anime"}]})
+        self.assertEqual(monitor.numBuildingMonitoredJobs(), 1, "Building job is counted")
+        self.scheduler.add(monitor)
+        self.scheduler.reschedule(monitor, JobChanges(), None)
+        self.assertEqual(self.scheduler.currentInterval(monitor), 30, "Server with building jobs is polled more often")
+
+    def testIntervalOverride(self):
+        monitor = JenkinsMonitor("http://server")
+        self.scheduler.add(monitor, 10)
+        self.assertEqual(self.scheduler.configuredInterval(monitor), 10, "Configured interval")
+        self.scheduler.reschedule(monitor, JobChanges(), None)
+        self.assertEqual(self.scheduler.currentInterval(monitor), 10, "Configured interval is used")
+        self.scheduler.add(monitor)
+        self.assertEqual(self.scheduler.nextDueIn(), 10, "Removing the override keeps the next due time")
+        self.scheduler.reschedule(monitor, JobChanges(), None)
+        self.assertEqual(self.scheduler.currentInterval(monitor), 60, "Default interval is used again")
+
+    def testJitter(self):
+        scheduler = PollScheduler(60, rng=lambda: 1.0, clock=lambda: self.now)
+        monitor = JenkinsMonitor("http://server")
+        scheduler.add(monitor)
+        scheduler.reschedule(monitor, JobChanges(), None)
+        self.assertAlmostEqual(scheduler.nextDueIn(), 66, msg="Next due time is spread by the jitter")
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
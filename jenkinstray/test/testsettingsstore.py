@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+from jenkinstray.settingsstore import SettingsStore, compactSettings, DEFAULT_SETTINGS
+
+import json
+import os
+import shutil
+import tempfile
+
+class TestSettingsStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.filename = os.path.join(self.directory, "config", "jenkinstray.json")
+        self.settings = {"refreshInterval": 30, "notificationTimeout": 5,
+                         "servers": [{"url": "http://server", "refreshInterval": 10, "monitored": ["Name1"]}]}
+
+    def testCompactSettings(self):
+        settings = {"refreshInterval": 30, "notificationTimeout": 5,
+                    "servers": [{"url": "http://server", "refreshInterval": 10,
+                                 "jobs": [{"name": "Name1", "monitored": True}, {"name": "Name2", "monitored": False}]}]}
+        self.assertEqual(compactSettings(settings), self.settings, "Only names of monitored jobs are kept")
+        self.assertIn("jobs", settings["servers"][0], "The given settings are not modified")
+        self.assertEqual(compactSettings(self.settings), self.settings, "Compact settings are kept")
+
+    def testDefaults(self):
+        store = SettingsStore(self.filename)
+        self.assertEqual(store.settings(), DEFAULT_SETTINGS, "Defaults without a settings file")
+        os.makedirs(os.path.dirname(self.filename))
+        with open(self.filename, "w") as settingsfile:
+            settingsfile.write("{\"servers\": [")
+        self.assertEqual(SettingsStore(self.filename).settings(), DEFAULT_SETTINGS, "Defaults for a broken settings file")
+
+    def testLazyLoading(self):
+        SettingsStore(self.filename).save(self.settings)
+        store = SettingsStore(self.filename)
+        os.remove(self.filename)
+        self.assertEqual(store.settings(), DEFAULT_SETTINGS, "The file is read on first access")
+        store.save(self.settings)
+        os.remove(self.filename)
+        self.assertEqual(store.settings(), self.settings, "The file is read only once")
+
+    def testSaving(self):
+        store = SettingsStore(self.filename)
+        store.save(self.settings)
+        with open(self.filename, "r") as settingsfile:
+            content = settingsfile.read()
+        self.assertEqual(json.loads(content), self.settings, "Settings are written")
+        self.assertNotIn(" ", content, "Settings are written compactly")
+        self.assertEqual(SettingsStore(self.filename).settings(), self.settings, "Settings are read back")
+        self.assertEqual(os.listdir(os.path.dirname(self.filename)), ["jenkinstray.json"], "No temporary files are left")
+
+    def testCoalescing(self):
+        store = SettingsStore(self.filename)
+        for interval in range(10, 20):
+            store.requestSave(dict(self.settings, refreshInterval=interval))
+        self.assertFalse(os.path.exists(self.filename), "Nothing is written before flushing")
+        self.assertEqual(store.settings()["refreshInterval"], 19, "The requested settings are used")
+        store.flush()
+        store.flush()
+        self.assertEqual(store.writes, 1, "Requested saves are written once")
+        self.assertEqual(SettingsStore(self.filename).settings()["refreshInterval"], 19, "The last settings are written")
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
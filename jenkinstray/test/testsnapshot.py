@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+from jenkinstray.snapshot import StateSnapshot
+from jenkinstray.jenkinsmonitor import JenkinsMonitor
+from jenkinstray.jenkinsjob import JenkinsJob, JenkinsState
+
+import os
+import shutil
+import tempfile
+
+class TestStateSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.filename = os.path.join(self.directory, "jenkinstray.state")
+
+    def testRoundtrip(self):
+        monitors = [JenkinsMonitor("http://server1"), JenkinsMonitor("http://server2")]
+        monitors[0].jobs.append(JenkinsJob("Name1", True, "Url1", JenkinsState.Failed))
+        monitors[1].jobs.append(JenkinsJob("Name2", True, "Url2", JenkinsState.Successful))
+        monitors[1].jobs.append(JenkinsJob("Name3", False, "Url3", JenkinsState.Failed))
+        snapshot = StateSnapshot(self.filename)
+        self.assertEqual(snapshot.load(), {}, "Nothing is restored without a snapshot")
+        snapshot.save(monitors)
+        states = StateSnapshot(self.filename).load()
+        self.assertEqual(sorted(states), ["http://server1", "http://server2"], "All servers are saved")
+        for monitor in monitors:
+            self.assertEqual(list(JenkinsMonitor.fromDict(states[monitor.serverurl]).allJobs()), list(monitor.monitoredJobs()),
+                             "Monitored jobs of %s are restored" % monitor.serverurl)
+
+    def testBrokenSnapshot(self):
+        with open(self.filename, "wb") as snapshotfile:
+            snapshotfile.write("not compressed")
+        self.assertEqual(StateSnapshot(self.filename).load(), {}, "Broken snapshots are ignored")
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
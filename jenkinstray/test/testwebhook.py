@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+from jenkinstray.webhook import WebhookReceiver, parseEvent, jobNameFromUrl
+from jenkinstray.jenkinsjob import JenkinsState
+from jenkinstray.bench.events import notification
+
+import httplib
+import json
+from Queue import Queue
+
+class TestWebhook(unittest.TestCase):
+    def startReceiver(self):
+        events = Queue()
+        receiver = WebhookReceiver(events.put, ("localhost", 0))
+        receiver.start()
+        self.addCleanup(receiver.stop)
+        return (receiver, events)
+
+    def post(self, receiver, body):
+        connection = httplib.HTTPConnection(*receiver.server.server_address[:2], timeout=5)
+        try:
+            connection.request("POST", "/", body, {"content-type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        finally:
+            connection.close()
+
+    def testJobNameFromUrl(self):
+        self.assertEqual(jobNameFromUrl("job/Job1/"), "Job1", "Top level job")
+        self.assertEqual(jobNameFromUrl("job/Folder/job/Job%201/"), "Folder/Job 1", "Job in a folder")
+
+    def testParseEvent(self):
+        event = parseEvent(notification("job/Folder/job/Job1/", "STARTED"), 42)
+        self.assertEqual((event.name, event.state, event.building, event.received), ("Folder/Job1", None, True, 42), "Started build")
+        self.assertEqual(event.jobUrl, "http://jenkins/job/Folder/job/Job1/", "Job url from the build url")
+        event = parseEvent(notification("job/Job1/", "COMPLETED", "UNSTABLE"))
+        self.assertEqual((event.state, event.building), (JenkinsState.Unstable, False), "Completed build")
+        self.assertIsNone(parseEvent(notification("job/Job1/", "QUEUED")), "Queued builds are ignored")
+        self.assertRaises(KeyError, parseEvent, {"name": "Job1"})
+
+    def testReceiver(self):
+        (receiver, events) = self.startReceiver()
+        self.assertEqual(self.post(receiver, json.dumps(notification("job/Job1/", "FINALIZED", "FAILURE"))), 204, "Events are accepted")
+        event = events.get(timeout=5)
+        self.assertEqual((event.name, event.state), ("Job1", JenkinsState.Failed), "The event is handed on")
+        self.assertEqual(self.post(receiver, "{"), 400, "Malformed events are rejected")
+        self.assertEqual(self.post(receiver, json.dumps(notification("job/Job1/", "QUEUED"))), 204, "Ignored events are accepted")
+        self.assertTrue(events.empty(), "Only events changing jobs are handed on")
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
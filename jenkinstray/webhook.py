@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Andreas Pakulat <apaku@gmx.de>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Receiver for the job events jenkins posts with the notification plugin, so
+state changes show up without waiting for the next poll. The plugin posts a
+json object per build phase like
+
+    {"name": "job", "url": "job/folder/job/job/",
+     "build": {"full_url": "http://jenkins/job/folder/job/job/7/",
+               "number": 7, "phase": "COMPLETED", "status": "FAILURE"}}
+
+to the url configured in the job, which is http://localhost:<webhookPort>/.
+"""
+
+from jenkinsjob import parseColor
+from threading import Thread
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+import json
+import time
+import urllib
+
+DEFAULT_WEBHOOK_PORT = 8091
+# seconds between the polls that catch up with missed events
+DEFAULT_RECONCILE_INTERVAL = 900
+# the largest event body that is accepted
+MAX_EVENT_SIZE = 64 * 1024
+
+# the color jenkins shows for a finished build with the given result
+_STATUS_COLORS = {"SUCCESS": "blue",
+                  "UNSTABLE": "yellow",
+                  "FAILURE": "red",
+                  "NOT_BUILT": "notbuilt",
+                  "ABORTED": "aborted"}
+
+class JobEvent(object):
+    """
+    A build phase of a job. state is None for started builds, whose job
+    keeps its state. jobUrl is None if the notification lacks the url of
+    the build. received is the time.time() the event arrived at.
+    """
+    __slots__ = ("name", "jobUrl", "state", "building", "received")
+
+    def __init__(self, name, jobUrl, state, building, received):
+        self.name = name
+        self.jobUrl = jobUrl
+        self.state = state
+        self.building = building
+        self.received = received
+
+    def __repr__(self):
+        return "JobEvent(%s, %s, %s, building=%s)" % (self.name, self.jobUrl, self.state, self.building)
+
+def jobNameFromUrl(url):
+    """
+    Returns the full name of a job from its url relative to the jenkins
+    root, like folder/job for job/folder/job/job/.
+    """
+    parts = url.strip("/").split("/")
+    return "/".join(urllib.unquote(parts[idx + 1]) for idx in range(0, len(parts) - 1, 2) if parts[idx] == "job")
+
+def parseEvent(dictobj, received=None):
+    """
+    Returns the JobEvent of a decoded notification, None for phases that do
+    not change the job like QUEUED. Raises KeyError or ValueError for
+    malformed notifications.
+    """
+    build = dictobj["build"]
+    phase = build["phase"]
+    if phase == "STARTED":
+        (state, building) = (None, True)
+    elif phase in ("COMPLETED", "FINALIZED"):
+        (state, building) = (parseColor(_STATUS_COLORS.get(build.get("status"), ""))[0], False)
+    else:
+        return None
+    name = jobNameFromUrl(dictobj["url"]) if dictobj.get("url") else dictobj["name"]
+    if not name:
+        raise ValueError("No job name in notification")
+    buildUrl = build.get("full_url")
+    jobUrl = buildUrl.rstrip("/").rpartition("/")[0] + "/" if buildUrl else None
+    return JobEvent(name, jobUrl, state, building, received if received is not None else time.time())
+
+class WebhookRequestHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        received = time.time()
+        try:
+            length = int(self.headers.getheader("content-length"))
+            if length > MAX_EVENT_SIZE:
+                raise ValueError("Notification too large")
+            event = parseEvent(json.loads(self.rfile.read(length)), received)
+        except (TypeError, ValueError, KeyError, AttributeError), e:
+            self.send_error(400, "Malformed notification: %s" % e)
+            return
+        if event is not None:
+            self.server.receiver.eventReceived(event)
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+class WebhookHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class WebhookReceiver(object):
+    """
+    Listens for notifications on address and hands each JobEvent to
+    eventReceived(event) from the thread that received it. Port 0 picks a
+    free port, see url().
+    """
+    def __init__(self, eventReceived, address=("localhost", DEFAULT_WEBHOOK_PORT)):
+        self.eventReceived = eventReceived
+        self.server = WebhookHTTPServer(address, WebhookRequestHandler)
+        self.server.receiver = self
+        self.thread = None
+
+    def url(self):
+        return "http://%s:%s/" % self.server.server_address[:2]
+
+    def start(self):
+        self.thread = Thread(target=self.server.serve_forever, name="WebhookReceiver")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.server.shutdown()
+            self.thread.join()
+            self.thread = None
+        self.server.server_close()
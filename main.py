@@ -29,15 +29,21 @@ from PyQt4 import QtGui
 from jenkinstray.gui.jenkinstray import JenkinsTray
 from jenkinstray import rcc_jenkinstray
 
-def main(args):
-    global app
-    global tray
+def createTray(args):
+    """
+    Creates the application and the tray icon, without running the event loop.
+    """
     app = QtGui.QApplication(args)
     app.setApplicationVersion("0.1")
     app.setApplicationName("Jenkins Tray")
     QtGui.QApplication.setWindowIcon(QtGui.QIcon(":///images/jenkinstray_success.png"))
     QtGui.QApplication.setQuitOnLastWindowClosed(False)
-    tray = JenkinsTray(app)
+    return (app, JenkinsTray(app))
+
+def main(args):
+    global app
+    global tray
+    (app, tray) = createTray(args)
     return app.exec_()
 
 if __name__ == '__main__':